@@ -0,0 +1,150 @@
+import itertools
+import multiprocessing
+import time
+import traceback
+
+import pandas as pd
+import tensorflow as tf
+
+import model_helper as model
+import data_set_helper as data_set
+import model_train
+import net_hparams
+from models import registry
+from utils import autotune
+
+tf.flags.DEFINE_string("mode", "train", "Graph to tune: train or infer")
+tf.flags.DEFINE_string("model_dir", None, "Tune the model saved in this directory. Defaults to the net_hparams model")
+tf.flags.DEFINE_string("intra_op_threads", "1,2,4,0", "Comma separated intra-op thread counts to try, 0 lets tensorflow decide")
+tf.flags.DEFINE_string("inter_op_threads", "1,2,0", "Comma separated inter-op thread counts to try, 0 lets tensorflow decide")
+tf.flags.DEFINE_string("reader_threads", "1,2", "Comma separated input reader thread counts to try")
+tf.flags.DEFINE_string("batch_sizes", "", "Comma separated batch sizes to try. Defaults to the batch size of the model")
+tf.flags.DEFINE_integer("warm_up_steps", 20, "Steps run before the timing of every configuration")
+tf.flags.DEFINE_integer("benchmark_steps", 100, "Steps timed for every configuration")
+tf.flags.DEFINE_string("autotune_file", autotune.AUTOTUNE_FILE, "File where the best configurations are saved")
+FLAGS = tf.flags.FLAGS
+
+MODES = {"train": tf.contrib.learn.ModeKeys.TRAIN,
+         "infer": tf.contrib.learn.ModeKeys.INFER}
+
+
+def parse_grid(values):
+    return [int(value) for value in values.split(",") if value.strip()]
+
+def create_grid(intra_op_threads, inter_op_threads, reader_threads, batch_sizes):
+    return [autotune.TuneConfig(*values)
+            for values in itertools.product(intra_op_threads, inter_op_threads, reader_threads, batch_sizes)]
+
+
+def benchmark(hparams, tune_config, mode, input_files, warm_up_steps, steps):
+    '''
+    time a short run of the model with the given thread configuration
+    :param hparams: hiper-parameters of the model
+    :param tune_config: TuneConfig to benchmark
+    :param mode: "train" or "infer"
+    :param input_files: TFRecords read by the input pipeline
+    :param warm_up_steps: steps run before the timing
+    :param steps: timed steps
+    :return: row of the benchmark table
+    '''
+    row = tune_config._asdict()
+    try:
+        with tf.Graph().as_default():
+            tf.contrib.framework.create_global_step()
+            input_fn = data_set.create_input_fn(
+                mode=MODES[mode],
+                input_files=input_files,
+                batch_size=tune_config.batch_size,
+                num_epochs=None,
+                h_params=hparams,
+                reader_num_threads=tune_config.reader_threads,
+                parser_num_threads=tune_config.reader_threads)
+            model_fn = model.create_model_fn(hparams, model_impl=registry.get_model(hparams.model_type))
+
+            if mode == "train":
+                features_map, target = input_fn()
+                fetch = model_fn(features_map, target, MODES[mode]).train_op
+            else:
+                features_map = input_fn()
+                fetch = model_fn(features_map, None, MODES[mode]).predictions
+
+            session_config = tf.ConfigProto(intra_op_parallelism_threads=tune_config.intra_op_threads,
+                                            inter_op_parallelism_threads=tune_config.inter_op_threads)
+            with tf.Session(config=session_config) as sess:
+                sess.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+                coord = tf.train.Coordinator()
+                threads = tf.train.start_queue_runners(sess=sess, coord=coord)
+                try:
+                    for _ in range(warm_up_steps):
+                        sess.run(fetch)
+                    start_time = time.time()
+                    for _ in range(steps):
+                        sess.run(fetch)
+                    elapsed_secs = time.time() - start_time
+                finally:
+                    coord.request_stop()
+                    coord.join(threads)
+        row["examples_per_sec"] = steps * tune_config.batch_size / elapsed_secs
+    except Exception:
+        row["error"] = traceback.format_exc()
+    return row
+
+def _benchmark(args):
+    return benchmark(*args)
+
+
+def run_grid(hparams, grid, mode, input_files, warm_up_steps, steps):
+    '''
+    Benchmark every configuration in a new process: tensorflow creates its thread pools once per process,
+    so configurations run in the same process would share the pools of the first one
+    :return: DataFrame with one row per configuration
+    '''
+    pool = multiprocessing.Pool(processes=1, maxtasksperchild=1)
+    rows = []
+    try:
+        for row in pool.imap(_benchmark, [(hparams, tune_config, mode, input_files, warm_up_steps, steps)
+                                          for tune_config in grid]):
+            tf.logging.info("{}: {:.1f} examples/sec".format(
+                {key: row[key] for key in autotune.TuneConfig._fields}, row.get("examples_per_sec", float("nan"))))
+            rows.append(row)
+    finally:
+        pool.close()
+        pool.join()
+    return pd.DataFrame(rows)
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if FLAGS.mode not in MODES:
+        raise ValueError("Wrong mode {}".format(FLAGS.mode))
+
+    if FLAGS.model_dir:
+        hparams = net_hparams.load_hparams(FLAGS.model_dir)
+    else:
+        hparams = net_hparams.create_hparams()._replace(multi_task=FLAGS.multi_task)
+
+    default_batch_size = hparams.batch_size if FLAGS.mode == "train" else hparams.eval_batch_size
+    grid = create_grid(parse_grid(FLAGS.intra_op_threads),
+                       parse_grid(FLAGS.inter_op_threads),
+                       parse_grid(FLAGS.reader_threads),
+                       parse_grid(FLAGS.batch_sizes) or [default_batch_size])
+    split = "train" if FLAGS.mode == "train" else "test"
+    input_files = data_set.input_files(FLAGS.input_dir, model_train.COMPANY_NAME, split, hparams,
+                                       model_train.OUTPUT_NAME_SUFFIX)
+
+    results = run_grid(hparams, grid, FLAGS.mode, input_files, FLAGS.warm_up_steps, FLAGS.benchmark_steps)
+    if "examples_per_sec" not in results or results["examples_per_sec"].isnull().all():
+        raise RuntimeError("All the configurations failed:\n{}".format(results["error"].iloc[0]))
+
+    results = results.sort_values("examples_per_sec", ascending=False)
+    print(results.drop(["error"], axis=1, errors="ignore").to_string(index=False))
+
+    best = results.iloc[0]
+    best_config = autotune.TuneConfig(*[int(best[key]) for key in autotune.TuneConfig._fields])
+    autotune.save_best_config(hparams.model_type, FLAGS.mode, best_config, path=FLAGS.autotune_file,
+                              examples_per_sec=float(best["examples_per_sec"]))
+    print("best {}: {} saved to {}".format(FLAGS.mode, best_config, FLAGS.autotune_file))
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from utils import backtest
+from utils.predictions import load_predictions
+
+tf.flags.DEFINE_integer("loglevel", 20, "Tensorflow log level")
+tf.flags.DEFINE_string("prediction_files", None, "Comma separated prediction files exported by main_test.py or ensemble_test.py")
+tf.flags.DEFINE_string("prediction_columns", "predictions", "Comma separated columns of the files used as models")
+tf.flags.DEFINE_string("thresholds", "0,0.001,0.005,0.01", "Comma separated min absolute predicted return to open a position")
+tf.flags.DEFINE_string("holding_periods", "1,5,10,20", "Comma separated days every position is held")
+tf.flags.DEFINE_float("cost_bps", 5., "Trading cost in basis points of the traded value")
+tf.flags.DEFINE_boolean("classification", False, "Predictions are up/down classes: class 1 is long, class 0 short. Needs returns_file")
+tf.flags.DEFINE_string("returns_file", None, "Regression prediction file whose targets are the realized returns. "
+                       "Required with classification, where the targets are class ids")
+tf.flags.DEFINE_string("output_file", './data/results/backtest.csv', "CSV file with a row per model and variant")
+FLAGS = tf.flags.FLAGS
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.prediction_files:
+        raise ValueError("You must specify the prediction files")
+
+    if FLAGS.classification and not FLAGS.returns_file:
+        raise ValueError("The targets of the classification files are class ids, "
+                         "you must specify the returns_file with the realized returns")
+
+    tables = {file_name: load_predictions(file_name) for file_name in FLAGS.prediction_files.split(",")}
+    all_rows = pd.concat(list(tables.values()))
+    dates = np.sort(all_rows["date"].unique())
+    tickers = np.sort(all_rows["ticker"].unique())
+
+    model_names, predictions, targets = [], [], None
+    for file_name, table in tables.items():
+        columns = [column for column in FLAGS.prediction_columns.split(",") if column in table]
+        panels, _, _ = backtest.to_panel(table, columns + ["targets"], dates, tickers)
+        for column in columns:
+            model_names.append("{}:{}".format(os.path.basename(file_name), column))
+            predictions.append(panels[column])
+        # the realized returns are the same in every file, keep the first value of every (date, ticker)
+        targets = panels["targets"] if targets is None else np.where(np.isnan(targets), panels["targets"], targets)
+
+    if FLAGS.returns_file:
+        returns = load_predictions(FLAGS.returns_file)
+        if "targets" not in returns:
+            raise ValueError("No targets column with the realized returns in {}".format(FLAGS.returns_file))
+        targets = backtest.to_panel(returns, ["targets"], dates, tickers)[0]["targets"]
+
+    predictions = np.stack(predictions)
+    if FLAGS.classification:
+        predictions = 2. * predictions - 1.
+
+    thresholds = [float(value) for value in FLAGS.thresholds.split(",")]
+    holding_periods = [int(value) for value in FLAGS.holding_periods.split(",")]
+    results = backtest.run_backtest(predictions, targets, thresholds, holding_periods, cost_bps=FLAGS.cost_bps)
+    table = backtest.results_table(results, model_names, thresholds, holding_periods).sort_values("sharpe", ascending=False)
+
+    os.makedirs(os.path.dirname(os.path.abspath(FLAGS.output_file)), exist_ok=True)
+    table.to_csv(FLAGS.output_file, index=False)
+    print(table.to_string(index=False))
+    print("Wrote to {}".format(FLAGS.output_file))
+
+
+if __name__ == "__main__":
+    tf.app.run()
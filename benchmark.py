@@ -0,0 +1,179 @@
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import time
+import traceback
+
+import numpy as np
+import tensorflow as tf
+
+import model_helper as model
+import model_train
+import net_hparams
+from models import registry
+
+tf.flags.DEFINE_string("models", ",".join(sorted(registry.MODEL_MODULES)), "Comma separated models to benchmark")
+tf.flags.DEFINE_string("hidden_layer_type", model_train.HIDDEN_LAYER_TYPES[0], "Hidden layer of the models using hidden_layer_type")
+tf.flags.DEFINE_integer("batch_size", 30, "Batch size of the synthetic inputs")
+tf.flags.DEFINE_integer("sequence_length", net_hparams.SL, "Time stamps of the synthetic inputs")
+tf.flags.DEFINE_integer("input_size", len(net_hparams.KEYS), "Features of every time stamp of the synthetic inputs")
+tf.flags.DEFINE_integer("warm_up_steps", 10, "Steps run before the timing")
+tf.flags.DEFINE_integer("train_steps", 100, "Training steps timed for every model")
+tf.flags.DEFINE_integer("infer_steps", 100, "Inference batches timed for every model")
+tf.flags.DEFINE_integer("intra_op_threads", 0, "Threads used inside a single op, 0 lets tensorflow decide")
+tf.flags.DEFINE_integer("inter_op_threads", 0, "Ops executed in parallel, 0 lets tensorflow decide")
+tf.flags.DEFINE_string("output_file", None, "JSON file of the results. Defaults to ./debug/benchmark_<commit>.json")
+FLAGS = tf.flags.FLAGS
+
+OUTPUT_FILE = os.path.abspath("./debug/benchmark_{}.json")
+
+
+def git_commit():
+    '''
+    :return: commit of the working tree, with a -dirty suffix if there are uncommitted changes
+    '''
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"]).decode().strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"]).decode().strip()
+        return commit + "-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def synthetic_inputs(hparams, mode, seed=0):
+    '''
+    random inputs with the same structure returned by data_set_helper.create_input_fn
+    :param hparams: hiper-parameters defining the shape of the inputs
+    :param mode: mode of the model, in INFER only the features are returned
+    :return: features_map, target
+    '''
+    rng = np.random.RandomState(seed)
+    batch_size = hparams.batch_size
+    if "class" in hparams.e_type:
+        target = tf.constant(rng.randint(hparams.num_class[hparams.e_type], size=batch_size), dtype=tf.int64)
+    else:
+        target = tf.constant(rng.randn(batch_size), dtype=tf.float32)
+
+    if net_hparams.is_sequential(hparams.model_type):
+        features_map = {
+            'features': tf.constant(rng.randn(batch_size, hparams.sequence_length, hparams.input_size), dtype=tf.float32),
+            'length': tf.constant(np.full(batch_size, hparams.sequence_length), dtype=tf.int64),
+            'ticker': tf.constant(np.zeros(batch_size), dtype=tf.int64)}
+    else:
+        features_map = {'features': tf.constant(rng.randn(batch_size, hparams.input_size), dtype=tf.float32)}
+
+    if mode == tf.contrib.learn.ModeKeys.INFER:
+        features_map['targets'] = target
+        return features_map, None
+    return features_map, target
+
+def time_steps(fetch, session_config, warm_up_steps, steps):
+    '''
+    :return: seconds spent running fetch for the given steps
+    '''
+    with tf.Session(config=session_config) as sess:
+        sess.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+        for _ in range(warm_up_steps):
+            sess.run(fetch)
+        start_time = time.time()
+        for _ in range(steps):
+            sess.run(fetch)
+        return time.time() - start_time
+
+
+def benchmark_model(hparams, warm_up_steps, train_steps, infer_steps, session_config):
+    '''
+    build and run the training and the inference graph of a model on synthetic inputs
+    :return: dictionary of the results, with the traceback in "error" if the model failed
+    '''
+    result = {"model_type": hparams.model_type}
+    try:
+        model_fn = model.create_model_fn(hparams, model_impl=registry.get_model(hparams.model_type))
+
+        with tf.Graph().as_default():
+            tf.contrib.framework.create_global_step()
+            start_time = time.time()
+            features_map, target = synthetic_inputs(hparams, tf.contrib.learn.ModeKeys.TRAIN)
+            train_op = model_fn(features_map, target, tf.contrib.learn.ModeKeys.TRAIN).train_op
+            result["build_secs"] = time.time() - start_time
+            result["num_params"] = int(sum(np.prod(var.get_shape().as_list()) for var in tf.trainable_variables()))
+            elapsed_secs = time_steps(train_op, session_config, warm_up_steps, train_steps)
+            result["train_steps_per_sec"] = train_steps / elapsed_secs
+            result["train_examples_per_sec"] = train_steps * hparams.batch_size / elapsed_secs
+
+        with tf.Graph().as_default():
+            tf.contrib.framework.create_global_step()
+            start_time = time.time()
+            features_map, _ = synthetic_inputs(hparams, tf.contrib.learn.ModeKeys.INFER)
+            predictions = model_fn(features_map, None, tf.contrib.learn.ModeKeys.INFER).predictions
+            result["infer_build_secs"] = time.time() - start_time
+            elapsed_secs = time_steps(predictions, session_config, warm_up_steps, infer_steps)
+            result["infer_examples_per_sec"] = infer_steps * hparams.batch_size / elapsed_secs
+    except Exception:
+        # a broken model must not stop the benchmark of the others
+        result["error"] = traceback.format_exc()
+    return result
+
+def _benchmark_model(args):
+    return benchmark_model(*args)
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    session_config = tf.ConfigProto(intra_op_parallelism_threads=FLAGS.intra_op_threads,
+                                    inter_op_parallelism_threads=FLAGS.inter_op_threads)
+
+    jobs = []
+    for model_type in FLAGS.models.split(","):
+        hparams = net_hparams.create_hparams(model_type=model_type,
+                                             hidden_layer_type=FLAGS.hidden_layer_type)._replace(
+            batch_size=FLAGS.batch_size,
+            eval_batch_size=FLAGS.batch_size,
+            sequence_length=FLAGS.sequence_length,
+            input_size=FLAGS.input_size,
+            summary_level="off")
+        jobs.append((hparams, FLAGS.warm_up_steps, FLAGS.train_steps, FLAGS.infer_steps, session_config))
+
+    # every model in a new process, so the models do not share thread pools or a crash
+    pool = multiprocessing.Pool(processes=1, maxtasksperchild=1)
+    results = []
+    try:
+        for result in pool.imap(_benchmark_model, jobs):
+            if "error" in result:
+                tf.logging.error("{} failed:\n{}".format(result["model_type"], result["error"]))
+            else:
+                tf.logging.info("{}: {:.1f} train steps/sec, {:.1f} inference examples/sec".format(
+                    result["model_type"], result["train_steps_per_sec"], result["infer_examples_per_sec"]))
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    commit = git_commit()
+    report = {"commit": commit,
+              "timestamp": int(time.time()),
+              "host": socket.gethostname(),
+              "cpu_count": multiprocessing.cpu_count(),
+              "tensorflow": tf.__version__,
+              "config": {"batch_size": FLAGS.batch_size,
+                         "sequence_length": FLAGS.sequence_length,
+                         "input_size": FLAGS.input_size,
+                         "hidden_layer_type": FLAGS.hidden_layer_type,
+                         "warm_up_steps": FLAGS.warm_up_steps,
+                         "train_steps": FLAGS.train_steps,
+                         "infer_steps": FLAGS.infer_steps,
+                         "intra_op_threads": FLAGS.intra_op_threads,
+                         "inter_op_threads": FLAGS.inter_op_threads},
+              "results": results}
+
+    full_path = FLAGS.output_file or OUTPUT_FILE.format(commit)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote to {}".format(full_path))
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1 @@
+# makes the top level modules (utils, models, ...) importable by the tests in tests/
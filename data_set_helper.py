@@ -1,4 +1,8 @@
+import os
+import numpy as np
 import tensorflow as tf
+from net_hparams import feature_keys, is_sequential
+from utils.normalization import normalization_params, normalize_features
 
 label_type = {"reg":tf.float32,
               "class":tf.int64}
@@ -6,9 +10,17 @@ label_type = {"reg":tf.float32,
 def get_feature_columns(h_params):
     feature_columns = []
 
-    if "rnn" in h_params.model_type:
+    if is_sequential(h_params.model_type):
         feature_columns.append(tf.contrib.layers.real_valued_column(column_name="length",
                                                                     dimension=1, dtype=tf.int64))
+        # files exported before the ticker id was added belong to ticker 0
+        feature_columns.append(tf.contrib.layers.real_valued_column(column_name="ticker",
+                                                                    dimension=1, dtype=tf.int64,
+                                                                    default_value=0))
+        # YYYYMMDD of the last time_stamp, 0 for files exported before the date was added
+        feature_columns.append(tf.contrib.layers.real_valued_column(column_name="date",
+                                                                    dimension=1, dtype=tf.int64,
+                                                                    default_value=0))
         for key in h_params.KEYS:
             feature_columns.append(tf.contrib.layers.real_valued_column(column_name=key,
                                                                         dimension=h_params.sequence_length,
@@ -19,6 +31,9 @@ def get_feature_columns(h_params):
     else:
         feature_columns.append(tf.contrib.layers.real_valued_column(
             column_name="features", dimension=(h_params.input_size), dtype=tf.float32))
+        feature_columns.append(tf.contrib.layers.real_valued_column(column_name="ticker",
+                                                                    dimension=1, dtype=tf.int64,
+                                                                    default_value=0))
 
         feature_columns.append(tf.contrib.layers.real_valued_column(column_name="label",
                                                                     dimension=1,
@@ -27,7 +42,90 @@ def get_feature_columns(h_params):
     return set(feature_columns)
 
 
-def create_input_fn(mode, input_files, batch_size, num_epochs, h_params):
+def input_files(input_dir, company_name, split, h_params, name_suffix='seq'):
+    '''
+    pattern of the TFRecords files of a dataset split, matching also its shards.
+    In multi-task mode the files of all the tickers of the universe are used
+    :param input_dir: root directory of the exported datasets
+    :param company_name: company used in single-task mode
+    :param split: train, valid or test
+    :param h_params: hiper-parameters of the model
+    :param name_suffix: suffix of the exported files
+    '''
+    tickers = h_params.tickers if h_params.multi_task else [company_name]
+    return [os.path.abspath(os.path.join(input_dir, ticker, "{}_{}_{}.tfrecords*".format(split, name_suffix, h_params.e_type)))
+            for ticker in tickers]
+
+
+def load_normalization(input_dir, h_params):
+    '''
+    set the feature statistics used by the input normalization, from the manifests of the exported datasets.
+    Hiper-parameters that already have them, e.g. loaded from a trained model, are not changed
+    :param input_dir: root directory of the exported datasets
+    :param h_params: hiper-parameters of the model
+    '''
+    if h_params.input_normalization == "none" or h_params.feature_shift is not None:
+        return h_params
+    keys = feature_keys(h_params) if is_sequential(h_params.model_type) else h_params.KEYS
+    shift, scale = normalization_params(input_dir, h_params.tickers, keys, h_params.input_normalization)
+    return h_params._replace(feature_shift=shift, feature_scale=scale)
+
+
+def shard_files(file_patterns, num_shards, shard_index):
+    '''
+    split the files matching the patterns among different readers
+    :param file_patterns: list of file patterns
+    :param num_shards: number of readers
+    :param shard_index: index of this reader
+    :return: files read by this reader
+    '''
+    files = sorted(set(file_name for pattern in file_patterns for file_name in tf.gfile.Glob(pattern)))
+    if len(files) < num_shards:
+        # every reader would read the same examples, which is not data parallel training
+        raise ValueError("{} files for {} shards, export at least a train shard per reader "
+                         "with dataset_extraction.py --num_train_shards".format(len(files), num_shards))
+    return files[shard_index::num_shards]
+
+
+def count_records(file_patterns):
+    '''
+    number of examples in the TFRecords files matching the patterns
+    :param file_patterns: list of file patterns
+    '''
+    return sum(1 for pattern in file_patterns
+               for file_name in tf.gfile.Glob(pattern)
+               for _ in tf.python_io.tf_record_iterator(file_name))
+
+
+def read_windows(file_patterns, h_params):
+    '''
+    read the sequential examples of TFRecords files in numpy arrays, in the order of the files
+    :param file_patterns: list of file patterns
+    :param h_params: hiper-parameters of the model
+    :return: dictionary with features [examples, sequence_length, input_size] in feature_keys order,
+        length, ticker, date and targets (last label of the sequence)
+    '''
+    columns = {'features': [], 'length': [], 'ticker': [], 'date': [], 'targets': []}
+    keys = feature_keys(h_params)
+    for pattern in file_patterns:
+        for file_name in sorted(tf.gfile.Glob(pattern)):
+            for record in tf.python_io.tf_record_iterator(file_name):
+                feature = tf.train.Example.FromString(record).features.feature
+                columns['features'].append(np.stack([feature[key].float_list.value for key in keys], axis=1))
+                columns['length'].append(feature['length'].int64_list.value[0])
+                columns['ticker'].append(feature['ticker'].int64_list.value[0] if 'ticker' in feature else 0)
+                columns['date'].append(feature['date'].int64_list.value[0] if 'date' in feature else 0)
+                label = feature['label'].float_list.value or feature['label'].int64_list.value
+                columns['targets'].append(label[-1])
+
+    return {'features': np.array(columns['features'], dtype=np.float32).reshape(-1, h_params.sequence_length, len(keys)),
+            'length': np.array(columns['length'], dtype=np.int64),
+            'ticker': np.array(columns['ticker'], dtype=np.int64),
+            'date': np.array(columns['date'], dtype=np.int64),
+            'targets': np.array(columns['targets'])}
+
+
+def create_input_fn(mode, input_files, batch_size, num_epochs, h_params, reader_num_threads=1, parser_num_threads=1):
     print("reading file {}".format(input_files))
     def input_fn():
         features = tf.contrib.layers.create_feature_spec_for_parsing(get_feature_columns(h_params))
@@ -37,9 +135,11 @@ def create_input_fn(mode, input_files, batch_size, num_epochs, h_params):
             batch_size=batch_size,
             features=features,
             reader=tf.TFRecordReader,
-            randomize_input=True,
+            randomize_input=mode != tf.contrib.learn.ModeKeys.INFER,     # predictions keep the order of the files
             num_epochs=num_epochs,
             queue_capacity=100000 + batch_size * 10,
+            reader_num_threads=reader_num_threads,
+            parser_num_threads=parser_num_threads,
             name="read_batch_features_{}".format(mode))
 
         # This is an ugly hack because of a current bug in tf.learn
@@ -52,22 +152,54 @@ def create_input_fn(mode, input_files, batch_size, num_epochs, h_params):
 
 
         target = feature_map.pop("label")
-        if "rnn" in h_params.model_type:
+        if is_sequential(h_params.model_type):
             length = tf.squeeze(feature_map.pop("length"))
-            features = tf.concat([tf.expand_dims(feature_map[k], 2)for k in feature_map], axis=2)
-            return rnn_return_fn(mode, features, length, target)
+            ticker = tf.squeeze(feature_map.pop("ticker"), 1)
+            date = tf.squeeze(feature_map.pop("date"), 1)
+            features = tf.concat([tf.expand_dims(feature_map[k], 2) for k in feature_keys(h_params)], axis=2)
+            features = normalize_features(features, ticker, h_params)
+            return rnn_return_fn(mode, {'features': features, 'length': length, 'ticker': ticker, 'date': date}, target)
         else:
             target = tf.squeeze(target, 1)
+            feature_map['ticker'] = tf.squeeze(feature_map['ticker'], 1)
+            feature_map['features'] = normalize_features(feature_map['features'], feature_map['ticker'], h_params)
             return feature_map, target
 
     return input_fn
 
 
-def rnn_return_fn(mode, features, length, target):
+def create_replay_input_fn(new_files, replay_files, batch_size, replay_fraction, h_params, num_epochs=None):
+    '''
+    training batches mixing new examples and examples replayed from the history, in a fixed proportion
+    :param new_files: files of the new examples
+    :param replay_files: files of the history sampled by the replay, None or empty to train only on the new examples
+    :param batch_size: examples of every batch
+    :param replay_fraction: fraction of every batch taken from the replay files
+    :param h_params: hiper-parameters of the model
+    :param num_epochs: epochs over the new examples, None for indefinite. The replay is sampled indefinitely
+    '''
+    replay_batch_size = int(round(batch_size * replay_fraction)) if replay_files else 0
+    new_input_fn = create_input_fn(tf.contrib.learn.ModeKeys.TRAIN, new_files, batch_size - replay_batch_size,
+                                   num_epochs, h_params)
+    if replay_batch_size == 0:
+        return new_input_fn
+    replay_input_fn = create_input_fn(tf.contrib.learn.ModeKeys.TRAIN, replay_files, replay_batch_size, None, h_params)
+
+    def input_fn():
+        new_features, new_target = new_input_fn()
+        replay_features, replay_target = replay_input_fn()
+        features_map = {key: tf.concat([new_features[key], replay_features[key]], axis=0) for key in new_features}
+        return features_map, tf.concat([new_target, replay_target], axis=0)
+
+    return input_fn
+
+
+def rnn_return_fn(mode, features_map, target):
     if mode == tf.contrib.learn.ModeKeys.INFER:
-        return {'features':features, 'length':length, 'targets':target[:, -1]}
+        features_map['targets'] = target[:, -1]
+        return features_map
     else:
-        return {'features': features, 'length': length}, target[:, -1]
+        return features_map, target[:, -1]
 
 
 
@@ -1,9 +1,12 @@
 import tensorflow as tf
+import argparse
 import functools
+import json
 import numpy as np
 import os
 import pandas as pd
 import net_hparams
+from utils import normalization
 from sklearn.model_selection import train_test_split
 
 # companies = ['apple', 'bank_of_america', 'cantel_medical_corp', 'capital_city_bank', 'goldman', 'google',
@@ -22,26 +25,47 @@ EXAMPLE_FN_NAME = {True: "create_example_sequencial",
 OUTPUT_NAME_SUFFIX = {True: "seq",
                       False: ""}
 
+# walk-forward folds: every fold tests on the next TEST_MONTHS after the previous fold
+WALK_FORWARD = False
+WALK_FORWARD_DIR = "walk_forward"
+WALK_FORWARD_START = "2015-01-01"
+WALK_FORWARD_FOLDS = 12
+TEST_MONTHS = 1
+VALID_MONTHS = 12
+TRAIN_MONTHS = None             # None for an expanding train window
+FOLDS_FILE = "folds.json"
 
-def create_tfrecords_file(input, output_file_name, example_fn, path='../data'):
+# incremental updates (--since): the days after the last day seen by the deployed model plus the REPLAY_MONTHS before them
+INCREMENTAL_DIR = "incremental"
+INCREMENTAL_EXPORT_FILE = "export.json"     # since date and last exported date, read by incremental_train.py
+REPLAY_MONTHS = 12
+
+
+def create_tfrecords_file(input, output_file_name, example_fn, path='../data', num_shards=1):
     """
-    Creates a TFRecords file for the given input data and example transofmration function
+    Creates a TFRecords file for the given input data and example transofmration function.
+    With num_shards > 1 the rows are written round-robin to <output_file_name>-<shard>-of-<num_shards>
     """
     full_path = os.path.join(path + '/' + output_file_name)
     os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    writer = tf.python_io.TFRecordWriter(full_path)
+    if num_shards > 1:
+        full_paths = ["{}-{:05d}-of-{:05d}".format(full_path, shard, num_shards) for shard in range(num_shards)]
+    else:
+        full_paths = [full_path]
+    writers = [tf.python_io.TFRecordWriter(shard_path) for shard_path in full_paths]
     print("Creating TFRecords file at {}...".format(full_path))
-    for time, row in input.iterrows():
+    for idx, (time, row) in enumerate(input.iterrows()):
         x = example_fn(row)
-        writer.write(x.SerializeToString())
+        writers[idx % num_shards].write(x.SerializeToString())
     # for feature, target in zip(input[0], input[1]):
     #     x = example_fn(feature, target)
     #     writer.write(x.SerializeToString())
 
-    writer.close()
+    for writer in writers:
+        writer.close()
     print("Wrote to {}".format(full_path))
 
-def create_example(row,  keys):
+def create_example(row,  keys, ticker_id=0):
     """
     Creates a training example.
     Returnsthe a tensorflow.Example Protocol Buffer object.
@@ -64,9 +88,11 @@ def create_example(row,  keys):
         return ValueError("error in the experiment type")
 
     example.features.feature["features"].float_list.value.extend(features)
+    example.features.feature["ticker"].int64_list.value.append(ticker_id)
+    example.features.feature["date"].int64_list.value.append(date_id(row.name))
     return example
 
-def create_example_sequencial(row, keys):
+def create_example_sequencial(row, keys, ticker_id=0):
     """
     Creates a training example.
     Returnsthe a tensorflow.Example Protocol Buffer object.
@@ -75,6 +101,8 @@ def create_example_sequencial(row, keys):
     example = tf.train.Example()
     assert features.shape[0] == h_params.sequence_length
     example.features.feature["length"].int64_list.value.append(features.shape[0])
+    example.features.feature["ticker"].int64_list.value.append(ticker_id)
+    example.features.feature["date"].int64_list.value.append(date_id(row.name))
 
     for idx, key in enumerate(keys):
         example.features.feature[key].float_list.value.extend(features[:,idx])
@@ -94,6 +122,16 @@ def create_example_sequencial(row, keys):
 
 
 
+def date_id(date):
+    '''
+    date of an example as a YYYYMMDD integer, stored with the example to attach it to the predictions
+    :param date: index of the row, 0 if it is not a date
+    '''
+    if not hasattr(date, "strftime"):
+        return 0
+    return int(date.strftime("%Y%m%d"))
+
+
 def split_train_valid_test(data):
     # data_test = data.ix[pd.Timestamp("2015-01-01"):]
     # X_train = data.ix[:pd.Timestamp("2015-01-01")]
@@ -104,9 +142,64 @@ def split_train_valid_test(data):
     data_train = data.ix[:pd.Timestamp("2012-01-01")]
     return data_train, data_valid, data_test
 
-def run(file_name, in_path = '../data/stock', out_path='../data'):
-    example_fn = eval(EXAMPLE_FN_NAME['rnn' in h_params.model_type])
-    output_name_suffix = OUTPUT_NAME_SUFFIX['rnn' in h_params.model_type]
+def walk_forward_folds(start=WALK_FORWARD_START, num_folds=WALK_FORWARD_FOLDS, test_months=TEST_MONTHS,
+                       valid_months=VALID_MONTHS, train_months=TRAIN_MONTHS):
+    '''
+    boundaries of the walk-forward folds: fold k validates on the valid_months before its test period
+    and trains on everything before the validation, or on the last train_months
+    :return: list of dictionaries with fold, train_start, valid_start, test_start, test_end. Intervals are [start, end)
+    '''
+    folds = []
+    for fold in range(num_folds):
+        test_start = pd.Timestamp(start) + pd.DateOffset(months=fold * test_months)
+        valid_start = test_start - pd.DateOffset(months=valid_months)
+        train_start = None if train_months is None else valid_start - pd.DateOffset(months=train_months)
+        folds.append({"fold": fold,
+                      "train_start": None if train_start is None else str(train_start.date()),
+                      "valid_start": str(valid_start.date()),
+                      "test_start": str(test_start.date()),
+                      "test_end": str((test_start + pd.DateOffset(months=test_months)).date())})
+    return folds
+
+def split_fold(data, fold):
+    '''
+    train, valid and test rows of a walk-forward fold
+    '''
+    data = data.sort_index()
+    train_start = pd.Timestamp(fold["train_start"]) if fold["train_start"] else data.index[0]
+    valid_start, test_start, test_end = [pd.Timestamp(fold[key]) for key in ["valid_start", "test_start", "test_end"]]
+    return data[(data.index >= train_start) & (data.index < valid_start)], \
+           data[(data.index >= valid_start) & (data.index < test_start)], \
+           data[(data.index >= test_start) & (data.index < test_end)]
+
+def write_manifest(path, train, valid, test):
+    '''
+    manifest of the exported dataset of a ticker, with the feature statistics of the train split
+    used by the input normalization
+    '''
+    feature_stats = normalization.compute_feature_stats(train, h_params.KEYS, h_params.sequence_length,
+                                                        net_hparams.is_sequential(h_params.model_type))
+    normalization.write_manifest(path, feature_stats,
+                                 keys=h_params.KEYS,
+                                 rows={"train": len(train), "valid": len(valid), "test": len(test)})
+
+def get_ticker_id(company_name):
+    '''
+    id of the company in the universe of the multi-task model
+    :param company_name: name of the company
+    '''
+    if company_name not in h_params.tickers:
+        raise ValueError("{} is not in the tickers {}".format(company_name, h_params.tickers))
+    return h_params.tickers.index(company_name)
+
+def run(file_name, in_path = '../data/stock', out_path='../data', num_train_shards=1):
+    '''
+    export the train, valid and test splits in <out_path>/<file_name>
+    :param num_train_shards: >1 splits the train set in shards that can be read by different workers
+    '''
+    example_fn = eval(EXAMPLE_FN_NAME[net_hparams.is_sequential(h_params.model_type)])
+    example_fn = functools.partial(example_fn, ticker_id=get_ticker_id(file_name))
+    output_name_suffix = OUTPUT_NAME_SUFFIX[net_hparams.is_sequential(h_params.model_type)]
 
     full_path = os.path.join(in_path, file_name) + '-{}-fea.csv'.format(h_params.e_type)
     print("processing {}".format(full_path))
@@ -115,12 +208,14 @@ def run(file_name, in_path = '../data/stock', out_path='../data'):
     # data = pd.read_csv(full_path, header=None, parse_dates=True, index_col="Date", names=KEYS, skiprows=1)
 
     train, valid, test = split_train_valid_test(data)
+    write_manifest(os.path.join(out_path, file_name), train, valid, test)
 
     create_tfrecords_file(
         input=train,
         output_file_name="train_{}_{}.tfrecords".format(output_name_suffix, h_params.e_type),
         example_fn=functools.partial(example_fn, keys=h_params.KEYS),
-        path=os.path.join(out_path, file_name))
+        path=os.path.join(out_path, file_name),
+        num_shards=num_train_shards)
 
     # Create test.tfrecords
     create_tfrecords_file(
@@ -158,6 +253,83 @@ def run(file_name, in_path = '../data/stock', out_path='../data'):
     #     path=os.path.join(out_path, file_name)
     # )
 
+def run_walk_forward(file_name, in_path='../data/stock', out_path='../data', folds=None, num_train_shards=1):
+    '''
+    export the splits of every walk-forward fold in <out_path>/walk_forward/fold_<k>/<file_name>,
+    a fold directory is used as input_dir by the training scripts
+    '''
+    folds = walk_forward_folds() if folds is None else folds
+    example_fn = eval(EXAMPLE_FN_NAME[net_hparams.is_sequential(h_params.model_type)])
+    example_fn = functools.partial(example_fn, ticker_id=get_ticker_id(file_name), keys=h_params.KEYS)
+    output_name_suffix = OUTPUT_NAME_SUFFIX[net_hparams.is_sequential(h_params.model_type)]
+
+    full_path = os.path.join(in_path, file_name) + '-{}-fea.csv'.format(h_params.e_type)
+    print("processing {}".format(full_path))
+    data = pd.read_csv(full_path, parse_dates=True, index_col=0)
+
+    root = os.path.join(out_path, WALK_FORWARD_DIR)
+    for fold in folds:
+        splits = split_fold(data, fold)
+        write_manifest(os.path.join(root, "fold_{}".format(fold["fold"]), file_name), *splits)
+        for split, rows in zip(["train", "valid", "test"], splits):
+            create_tfrecords_file(
+                input=rows,
+                output_file_name="{}_{}_{}.tfrecords".format(split, output_name_suffix, h_params.e_type),
+                example_fn=example_fn,
+                path=os.path.join(root, "fold_{}".format(fold["fold"]), file_name),
+                num_shards=num_train_shards if split == "train" else 1)
+
+    with open(os.path.join(root, FOLDS_FILE), "w") as f:
+        json.dump(folds, f, indent=2)
+
+def run_incremental(file_name, since, in_path='../data/stock', out_path='../data', replay_months=REPLAY_MONTHS):
+    '''
+    export the windows after the since date in the new split and the replay_months before them in the replay split,
+    in <out_path>/incremental/<file_name>, with the since date and the last exported date in export.json
+    :param since: YYYY-MM-DD, last day seen by the deployed model
+    '''
+    example_fn = eval(EXAMPLE_FN_NAME[net_hparams.is_sequential(h_params.model_type)])
+    example_fn = functools.partial(example_fn, ticker_id=get_ticker_id(file_name), keys=h_params.KEYS)
+    output_name_suffix = OUTPUT_NAME_SUFFIX[net_hparams.is_sequential(h_params.model_type)]
+
+    full_path = os.path.join(in_path, file_name) + '-{}-fea.csv'.format(h_params.e_type)
+    print("processing {}".format(full_path))
+    data = pd.read_csv(full_path, parse_dates=True, index_col=0).sort_index()
+
+    since = pd.Timestamp(since)
+    replay_start = since - pd.DateOffset(months=replay_months)
+    splits = {"new": data[data.index > since],
+              "replay": data[(data.index > replay_start) & (data.index <= since)]}
+    for split, rows in splits.items():
+        create_tfrecords_file(
+            input=rows,
+            output_file_name="{}_{}_{}.tfrecords".format(split, output_name_suffix, h_params.e_type),
+            example_fn=example_fn,
+            path=os.path.join(out_path, INCREMENTAL_DIR, file_name))
+
+    if len(splits["new"]) == 0:
+        raise ValueError("No day of {} after {}".format(file_name, since.date()))
+    export = {"since_date": str(since.date()),
+              "last_date": str(splits["new"].index[-1].date()),
+              "new_rows": len(splits["new"]),
+              "replay_rows": len(splits["replay"])}
+    with open(os.path.join(out_path, INCREMENTAL_DIR, file_name, INCREMENTAL_EXPORT_FILE), "w") as f:
+        json.dump(export, f, indent=2)
+    return export
+
+
 if __name__ == "__main__":
-    for company_name in ['apple']:
-        run(company_name, in_path=INPUT_DIR, out_path=OUTPUT_DIR)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--since", default=None,
+                        help="YYYY-MM-DD, last day seen by the deployed model: export the incremental update after it")
+    parser.add_argument("--num_train_shards", type=int, default=1,
+                        help="Files the train split is written to, at least the workers of distributed_train.py")
+    args = parser.parse_args()
+
+    for company_name in h_params.tickers:
+        if args.since is not None:
+            run_incremental(company_name, args.since, in_path=INPUT_DIR, out_path=OUTPUT_DIR)
+        elif WALK_FORWARD:
+            run_walk_forward(company_name, in_path=INPUT_DIR, out_path=OUTPUT_DIR, num_train_shards=args.num_train_shards)
+        else:
+            run(company_name, in_path=INPUT_DIR, out_path=OUTPUT_DIR, num_train_shards=args.num_train_shards)
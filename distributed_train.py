@@ -0,0 +1,247 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import tensorflow as tf
+
+import model_helper as model
+import data_set_helper as data_set
+import model_train
+import net_hparams
+from models import registry
+from utils.hooks import ThroughputHook
+
+tf.flags.DEFINE_integer("num_workers", 2, "Number of worker processes training the model")
+tf.flags.DEFINE_integer("num_ps", 1, "Number of parameter server processes holding the variables")
+tf.flags.DEFINE_integer("train_steps", 2000, "Global training steps shared among the workers")
+tf.flags.DEFINE_integer("warm_up_steps", 20, "Steps of every worker excluded from the throughput")
+tf.flags.DEFINE_boolean("scaling_report", False, "Train with 1, 2, 4, ... num_workers workers and report the throughput scaling")
+tf.flags.DEFINE_string("model_dir", None, "Directory of the run. Defaults to a new directory in ./debug")
+FLAGS = tf.flags.FLAGS
+
+MODEL_DIR = os.path.abspath("./debug/distributed_{}")
+STATS_FILE = "worker_{}_stats.json"
+SCALING_FILE = "scaling.json"
+HOST = "localhost"
+
+
+def free_ports(num_ports):
+    '''
+    ask the OS for ports that are free on localhost
+    :param num_ports: number of ports
+    :return: list of ports
+    '''
+    sockets = []
+    for _ in range(num_ports):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((HOST, 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+def create_cluster(num_workers, num_ps):
+    '''
+    localhost cluster definition
+    :param num_workers: number of workers, the first one is the chief
+    :param num_ps: number of parameter servers
+    :return: dictionary job name -> list of addresses, as used by tf.train.ClusterSpec and TF_CONFIG
+    '''
+    addresses = ["{}:{}".format(HOST, port) for port in free_ports(num_workers + num_ps)]
+    return {"ps": addresses[:num_ps],
+            "worker": addresses[num_ps:]}
+
+
+def launch_cluster(cluster, model_dir, argv):
+    '''
+    start a process for every task of the cluster. Every process runs this script with the same flags,
+    its task is defined by the TF_CONFIG environment variable also read by the RunConfig of the estimator
+    :param cluster: cluster definition
+    :param model_dir: directory of the run, also containing the logs of every process
+    :param argv: flags passed to the processes
+    :return: ps processes, worker processes
+    '''
+    os.makedirs(model_dir, exist_ok=True)
+    processes = {}
+    for job_name in ["ps", "worker"]:
+        processes[job_name] = []
+        for task_index in range(len(cluster[job_name])):
+            env = dict(os.environ)
+            env["TF_CONFIG"] = json.dumps({"cluster": cluster,
+                                           "task": {"type": job_name, "index": task_index},
+                                           "environment": "cloud"})
+            if job_name == "ps":
+                env["CUDA_VISIBLE_DEVICES"] = ""        # the parameter servers only hold variables
+            log_file = open(os.path.join(model_dir, "{}_{}.log".format(job_name, task_index)), "w")
+            processes[job_name].append(subprocess.Popen([sys.executable, os.path.abspath(__file__)] + argv +
+                                                        ["--model_dir={}".format(model_dir)],
+                                                        env=env,
+                                                        stdout=log_file,
+                                                        stderr=subprocess.STDOUT))
+            log_file.close()        # the process keeps its own handle
+    return processes["ps"], processes["worker"]
+
+def run_cluster(num_workers, num_ps, model_dir, argv):
+    '''
+    train on a localhost cluster and wait for all the workers
+    :return: list of the throughput stats of every worker
+    '''
+    cluster = create_cluster(num_workers, num_ps)
+    tf.logging.info("training with cluster {}".format(cluster))
+    ps_processes, worker_processes = launch_cluster(cluster, model_dir, argv)
+    try:
+        for task_index, process in enumerate(worker_processes):
+            if process.wait() != 0:
+                raise RuntimeError("worker {} failed, see {}".format(
+                    task_index, os.path.join(model_dir, "worker_{}.log".format(task_index))))
+    finally:
+        # the parameter servers never return
+        for process in ps_processes + worker_processes:
+            if process.poll() is None:
+                process.terminate()
+
+    stats = []
+    for task_index in range(num_workers):
+        with open(os.path.join(model_dir, STATS_FILE.format(task_index))) as f:
+            stats.append(json.load(f))
+    return stats
+
+
+def train_worker(hparams, cluster_spec, task_index, model_dir, input_dir, train_steps, num_epochs, warm_up_steps):
+    '''
+    between-graph replicated training: every worker builds its own graph, reads its own shard of the training set
+    and updates the variables placed on the parameter servers
+    :return: throughput stats of the worker
+    '''
+    num_workers = cluster_spec.num_tasks("worker")
+    config = model.create_run_config(hparams)
+    # a worker only talks with the parameter servers, not with the other workers
+    config.tf_config.device_filters.extend(["/job:ps", "/job:worker/task:{}".format(task_index)])
+
+    server = tf.train.Server(cluster_spec,
+                             job_name="worker",
+                             task_index=task_index,
+                             config=config.tf_config)
+
+    estimator = tf.contrib.learn.Estimator(
+        model_fn=model.create_model_fn(hparams, model_impl=registry.get_model(hparams.model_type)),
+        model_dir=model_dir,
+        config=config)
+
+    train_files = data_set.shard_files(
+        data_set.input_files(input_dir, model_train.COMPANY_NAME, "train", hparams, model_train.OUTPUT_NAME_SUFFIX),
+        num_shards=num_workers,
+        shard_index=task_index)
+
+    input_fn_train = data_set.create_input_fn(
+        mode=tf.contrib.learn.ModeKeys.TRAIN,
+        input_files=train_files,
+        batch_size=hparams.batch_size,
+        num_epochs=num_epochs,
+        h_params=hparams)
+
+    throughput = ThroughputHook(hparams.batch_size, warm_up_steps=warm_up_steps)
+    tf.logging.info("worker {} of {} reading {} on {}".format(task_index, num_workers, train_files, server.target))
+    estimator.fit(input_fn=input_fn_train, max_steps=train_steps, monitors=[throughput])
+
+    stats = throughput.stats()
+    stats.update({"task_index": task_index, "num_workers": num_workers, "files": train_files})
+    return stats
+
+def run_task(tf_config):
+    '''
+    run the task of this process as defined in TF_CONFIG
+    '''
+    cluster_spec = tf.train.ClusterSpec(tf_config["cluster"])
+    job_name = tf_config["task"]["type"]
+    task_index = tf_config["task"]["index"]
+
+    if job_name == "ps":
+        server = tf.train.Server(cluster_spec, job_name=job_name, task_index=task_index)
+        server.join()
+    elif job_name == "worker":
+        hparams = net_hparams.load_hparams(FLAGS.model_dir)
+        stats = train_worker(hparams, cluster_spec, task_index,
+                             model_dir=FLAGS.model_dir,
+                             input_dir=FLAGS.input_dir,
+                             train_steps=FLAGS.train_steps,
+                             num_epochs=FLAGS.num_epochs,
+                             warm_up_steps=FLAGS.warm_up_steps)
+        with open(os.path.join(FLAGS.model_dir, STATS_FILE.format(task_index)), "w") as f:
+            json.dump(stats, f, indent=2)
+    else:
+        raise ValueError("Wrong job name {}".format(job_name))
+
+
+def worker_counts(max_workers):
+    '''
+    :return: 1, 2, 4, ... up to max_workers included
+    '''
+    counts = []
+    num_workers = 1
+    while num_workers < max_workers:
+        counts.append(num_workers)
+        num_workers *= 2
+    counts.append(max_workers)
+    return counts
+
+def scaling_report(rows):
+    '''
+    throughput of every cluster size respect to the single worker
+    :param rows: list of dictionary with num_workers and examples_per_sec of the run
+    :return: DataFrame with speedup and efficiency
+    '''
+    report = pd.DataFrame(rows).sort_values("num_workers")
+    base = report["examples_per_sec"].iloc[0] / report["num_workers"].iloc[0]
+    report["speedup"] = report["examples_per_sec"] / base
+    report["efficiency"] = report["speedup"] / report["num_workers"]
+    return report
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if "TF_CONFIG" in os.environ:
+        run_task(json.loads(os.environ["TF_CONFIG"]))
+        return
+
+    run_dir = FLAGS.model_dir or MODEL_DIR.format(int(time.time()))
+    hparams = net_hparams.create_hparams()._replace(multi_task=FLAGS.multi_task,
+                                                    input_normalization=FLAGS.input_normalization,
+                                                    batch_norm=FLAGS.batch_norm)
+    hparams = data_set.load_normalization(FLAGS.input_dir, hparams)
+    # fail before starting the clusters if the largest one can not give a train shard to every worker
+    data_set.shard_files(data_set.input_files(FLAGS.input_dir, model_train.COMPANY_NAME, "train", hparams,
+                                              model_train.OUTPUT_NAME_SUFFIX),
+                         num_shards=FLAGS.num_workers,
+                         shard_index=0)
+    argv = [arg for arg in sys.argv[1:] if not arg.startswith("--model_dir")]
+
+    counts = worker_counts(FLAGS.num_workers) if FLAGS.scaling_report else [FLAGS.num_workers]
+    rows = []
+    for num_workers in counts:
+        # every cluster size starts from scratch
+        model_dir = os.path.join(run_dir, "workers_{}".format(num_workers))
+        net_hparams.save_hparams(hparams, model_dir)
+
+        start_time = time.time()
+        stats = run_cluster(num_workers, FLAGS.num_ps, model_dir, argv)
+        rows.append({"num_workers": num_workers,
+                     "examples_per_sec": sum(worker["examples_per_sec"] for worker in stats),
+                     "train_secs": time.time() - start_time})
+        tf.logging.info("{} workers: {:.1f} examples/sec".format(num_workers, rows[-1]["examples_per_sec"]))
+
+    report = scaling_report(rows)
+    full_path = os.path.join(run_dir, SCALING_FILE)
+    with open(full_path, "w") as f:
+        json.dump(report.to_dict(orient="records"), f, indent=2)
+    print(report.to_string(index=False))
+    print("Wrote to {}".format(full_path))
+
+
+if __name__ == "__main__":
+    tf.app.run()
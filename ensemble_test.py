@@ -0,0 +1,143 @@
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import data_set_helper as data_set
+import model_train
+import net_hparams
+import utils.summarizer as s
+from models import registry
+from utils import predictions as pred
+from utils.normalization import normalize_features
+
+tf.flags.DEFINE_string("model_dirs", None, "Comma separated directories of the models to ensemble")
+tf.flags.DEFINE_string("export_dir", './data/results', "Results export diretory")
+tf.flags.DEFINE_string("export_format", "csv", "Format of the exported predictions: csv or npz")
+tf.flags.DEFINE_integer("log_every_n_batches", 100, "Log the prediction progress every this many batches")
+FLAGS = tf.flags.FLAGS
+
+# hiper-parameters that have to match to share the same input batches
+INPUT_FIELDS = ("sequence_length", "input_size", "KEYS", "e_type", "tickers", "multi_task")
+RETURN_TYPE = 'relative'
+
+
+def check_compatible(all_hparams):
+    for field in INPUT_FIELDS:
+        values = [getattr(hparams, field) for hparams in all_hparams]
+        if any(value != values[0] for value in values):
+            raise ValueError("The models do not share the same inputs, different {}: {}".format(field, values))
+
+
+def model_name(idx, hparams):
+    return "{}_{}".format(idx, hparams.model_type)
+
+
+def build_ensemble(all_hparams, features_map):
+    '''
+    build all the models on the same input batch, every model in its own variable scope
+    :return: dictionary model name -> predictions, list of (scope, checkpoint variable name -> variable)
+    '''
+    s.set_summary_level("off")
+    predictions = {}
+    var_lists = []
+    for idx, hparams in enumerate(all_hparams):
+        scope = "model_{}".format(idx)
+        # the shared batch is not normalized, every model applies its own statistics
+        model_features = dict(features_map)
+        model_features['features'] = normalize_features(features_map['features'], features_map['ticker'], hparams)
+        with tf.variable_scope(scope):
+            predictions[model_name(idx, hparams)], _ = registry.get_model(hparams.model_type)(
+                hparams, tf.contrib.learn.ModeKeys.INFER, model_features, None)
+        # the scope also appears inside the names built from vs.name, e.g. the batch norm scopes
+        var_lists.append({var.op.name.replace(scope + "/", ""): var
+                          for var in tf.global_variables() if var.op.name.startswith(scope + "/")})
+    return predictions, var_lists
+
+
+def ensemble_prediction(columns, names, e_type):
+    stacked = np.stack([columns[name] for name in names], axis=1)
+    if "class" in e_type:
+        # majority vote
+        return np.array([np.bincount(row).argmax() for row in stacked.astype(np.int64)])
+    return stacked.mean(axis=1)
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.model_dirs:
+        raise ValueError("You must specify the model directories")
+    model_dirs = FLAGS.model_dirs.split(",")
+    all_hparams = [net_hparams.load_hparams(model_dir) for model_dir in model_dirs]
+    check_compatible(all_hparams)
+    hparams = all_hparams[0]
+
+    test_files = data_set.input_files(FLAGS.input_dir, model_train.COMPANY_NAME, "test", hparams,
+                                      model_train.OUTPUT_NAME_SUFFIX)
+    num_rows = data_set.count_records(test_files)
+
+    with tf.Graph().as_default():
+        input_fn = data_set.create_input_fn(mode=tf.contrib.learn.ModeKeys.INFER,
+                                            input_files=test_files,
+                                            batch_size=hparams.eval_batch_size,
+                                            num_epochs=1,
+                                            h_params=hparams._replace(input_normalization="none"))
+        features_map = input_fn()
+        model_predictions, var_lists = build_ensemble(all_hparams, features_map)
+        fetches = dict(model_predictions)
+        for key in ['targets', 'ticker', 'date']:
+            fetches[key] = features_map[key]
+        savers = [tf.train.Saver(var_list=var_list) for var_list in var_lists]
+
+        with tf.Session() as sess:
+            sess.run(tf.local_variables_initializer())      # epoch counter of the input queue
+            for saver, model_dir in zip(savers, model_dirs):
+                saver.restore(sess, tf.train.latest_checkpoint(model_dir))
+
+            coord = tf.train.Coordinator()
+            threads = tf.train.start_queue_runners(sess=sess, coord=coord)
+            columns = None
+            idx = 0
+            num_batches = 0
+            start_time = time.time()
+            try:
+                while not coord.should_stop():
+                    batch = sess.run(fetches)
+                    if columns is None:
+                        columns = {key: np.empty((num_rows,) + value.shape[1:], dtype=value.dtype)
+                                   for key, value in batch.items()}
+                    batch_size = len(batch['targets'])
+                    for key, value in batch.items():
+                        columns[key][idx:idx + batch_size] = value
+                    idx += batch_size
+                    num_batches += 1
+                    if num_batches % FLAGS.log_every_n_batches == 0:
+                        tf.logging.info("{} / {} predictions ({:.1f} rows/sec)".format(
+                            idx, num_rows, idx / (time.time() - start_time)))
+            except tf.errors.OutOfRangeError:
+                pass
+            finally:
+                coord.request_stop()
+                coord.join(threads)
+
+    if columns is None:
+        raise ValueError("No test example in {}".format(test_files))
+    columns = {key: values[:idx] for key, values in columns.items()}
+    names = sorted(model_predictions)
+    export_data = {'date': pred.to_dates(columns['date']),
+                   'ticker': np.asarray(hparams.tickers)[columns['ticker']],
+                   'targets': columns['targets']}
+    for name in names:
+        export_data[name] = columns[name]
+    export_data['ensemble'] = ensemble_prediction(columns, names, hparams.e_type)
+
+    company_name = "universe" if hparams.multi_task else model_train.COMPANY_NAME
+    full_path = pred.export_predictions(export_data,
+                                        os.path.join(FLAGS.export_dir, "{}_ensemble_{}".format(company_name, RETURN_TYPE)),
+                                        export_format=FLAGS.export_format)
+    print("Wrote {} predictions of {} models to {}".format(idx, len(names), full_path))
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+import tensorflow as tf
+
+import net_hparams
+from utils import bootstrap
+from utils.predictions import load_predictions
+
+tf.flags.DEFINE_integer("loglevel", 20, "Tensorflow log level")
+tf.flags.DEFINE_string("prediction_files", None, "Comma separated prediction files exported by main_test.py or ensemble_test.py")
+tf.flags.DEFINE_string("prediction_columns", "predictions", "Comma separated columns of the files used as models")
+tf.flags.DEFINE_string("e_type", net_hparams.EXPERIMENT_TYPE, "Experiment type of the predictions: reg or class")
+tf.flags.DEFINE_integer("num_resamples", 2000, "Number of bootstrap resamples")
+tf.flags.DEFINE_integer("block_size", 20, "Consecutive days of a ticker in every bootstrap block")
+tf.flags.DEFINE_integer("num_workers", multiprocessing.cpu_count(), "Processes computing the resamples")
+tf.flags.DEFINE_float("confidence", 0.95, "Level of the confidence intervals")
+tf.flags.DEFINE_integer("seed", 0, "Seed of the resamples")
+tf.flags.DEFINE_string("output_file", './data/results/bootstrap.csv', "CSV file with a row per model and metric")
+FLAGS = tf.flags.FLAGS
+
+
+def align_models(file_names, columns):
+    '''
+    join the predictions of every file on (ticker, date), keeping the rows predicted by all the models
+    :return: model names; array [models, rows]; array [rows] of targets; array [rows] of tickers.
+        Rows are sorted by ticker and date
+    '''
+    model_names, merged = [], None
+    for file_name in file_names:
+        table = load_predictions(file_name)
+        for column in [column for column in columns if column in table]:
+            name = "{}:{}".format(os.path.basename(file_name), column)
+            model = table[["ticker", "date", "targets", column]].rename(columns={column: name})
+            merged = model if merged is None else merged.merge(model.drop("targets", axis=1), on=["ticker", "date"])
+            model_names.append(name)
+    if merged is None:
+        raise ValueError("No column {} in the prediction files".format(columns))
+    merged = merged.sort_values(["ticker", "date"])
+    return model_names, merged[model_names].values.T, merged["targets"].values, merged["ticker"].values
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.prediction_files:
+        raise ValueError("You must specify the prediction files")
+
+    model_names, predictions, targets, tickers = align_models(FLAGS.prediction_files.split(","),
+                                                     FLAGS.prediction_columns.split(","))
+    names = bootstrap.metric_names(FLAGS.e_type)
+    tf.logging.info("{} models on {} common rows".format(len(model_names), len(targets)))
+
+    start_time = time.time()
+    samples = bootstrap.bootstrap(predictions, targets, names, groups=tickers, num_resamples=FLAGS.num_resamples,
+                                  block_size=FLAGS.block_size, seed=FLAGS.seed,
+                                  num_workers=FLAGS.num_workers)
+    tf.logging.info("{} resamples in {:.2f} sec".format(FLAGS.num_resamples, time.time() - start_time))
+
+    point = bootstrap.compute_metrics(predictions, targets, names)
+    rows = []
+    for name in names:
+        lower, upper = bootstrap.confidence_interval(samples[name], FLAGS.confidence)
+        diff_lower, diff_upper, p_value = bootstrap.paired_difference(samples[name], 0, FLAGS.confidence)
+        for idx, model_name in enumerate(model_names):
+            rows.append({"model": model_name,
+                         "metric": name,
+                         "value": point[name][idx],
+                         "lower": lower[idx],
+                         "upper": upper[idx],
+                         "diff_baseline": point[name][idx] - point[name][0],
+                         "diff_lower": diff_lower[idx],
+                         "diff_upper": diff_upper[idx],
+                         "p_value": p_value[idx]})
+    table = pd.DataFrame(rows, columns=["model", "metric", "value", "lower", "upper",
+                                        "diff_baseline", "diff_lower", "diff_upper", "p_value"])
+
+    os.makedirs(os.path.dirname(os.path.abspath(FLAGS.output_file)), exist_ok=True)
+    table.to_csv(FLAGS.output_file, index=False)
+    print("Baseline for the differences: {}".format(model_names[0]))
+    print(table.to_string(index=False))
+    print("Wrote to {}".format(FLAGS.output_file))
+
+
+if __name__ == "__main__":
+    tf.app.run()
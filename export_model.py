@@ -0,0 +1,28 @@
+import os
+
+import tensorflow as tf
+
+import net_hparams
+from utils import inference
+
+tf.flags.DEFINE_integer("loglevel", 20, "Tensorflow log level")
+tf.flags.DEFINE_string("model_dir", None, "Directory to load model checkpoints from")
+tf.flags.DEFINE_string("checkpoint_path", None, "Checkpoint to export. Defaults to the latest one of model_dir")
+tf.flags.DEFINE_string("export_dir", None, "Directory of the exported graph. Defaults to <model_dir>/export")
+FLAGS = tf.flags.FLAGS
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.model_dir:
+        raise ValueError("You must specify a model directory")
+
+    hparams = net_hparams.load_hparams(FLAGS.model_dir)
+    export_dir = FLAGS.export_dir or os.path.join(FLAGS.model_dir, "export")
+    full_path = inference.export_frozen_graph(hparams, FLAGS.model_dir, export_dir,
+                                              checkpoint_path=FLAGS.checkpoint_path)
+    print("Wrote to {}".format(full_path))
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,63 @@
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import data_set_helper as data_set
+import model_train
+import net_hparams
+from utils import numpy_inference
+from utils.streaming import WindowedPredictor
+
+tf.flags.DEFINE_string("model_dir", None, "Directory to load model checkpoints from")
+tf.flags.DEFINE_string("output_file", None, "Exported weights. Defaults to <model_dir>/export/numpy_model.npz")
+tf.flags.DEFINE_boolean("verify", True, "Compare the numpy predictions with the tensorflow ones on the test split")
+tf.flags.DEFINE_integer("num_windows", 1024, "Test windows used by the verification")
+tf.flags.DEFINE_float("tolerance", 1e-4, "Max absolute difference between numpy and tensorflow predictions")
+FLAGS = tf.flags.FLAGS
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.model_dir:
+        raise ValueError("You must specify a model directory")
+
+    hparams = net_hparams.load_hparams(FLAGS.model_dir)
+    checkpoint_path = tf.train.latest_checkpoint(FLAGS.model_dir)
+    output_file = FLAGS.output_file or os.path.join(FLAGS.model_dir, "export", "numpy_model.npz")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    numpy_inference.export_weights(hparams, checkpoint_path, output_file)
+    print("Wrote to {}".format(output_file))
+
+    if not FLAGS.verify:
+        return
+
+    windows = data_set.read_windows(data_set.input_files(FLAGS.input_dir, model_train.COMPANY_NAME, "test", hparams,
+                                                         model_train.OUTPUT_NAME_SUFFIX),
+                                    hparams)
+    features = windows['features'][:FLAGS.num_windows]
+    length = windows['length'][:FLAGS.num_windows]
+    tickers = windows['ticker'][:FLAGS.num_windows]
+
+    windowed = WindowedPredictor(hparams, checkpoint_path)
+    reference = windowed.predict(features, tickers, length)
+    windowed.close()
+
+    start_time = time.time()
+    numpy_model = numpy_inference.NumpyModel(output_file)
+    load_secs = time.time() - start_time
+    start_time = time.time()
+    predictions = numpy_model.predict(features, length, tickers)
+    predict_secs = time.time() - start_time
+
+    max_diff = float(np.max(np.abs(predictions - reference)))
+    print("numpy vs tensorflow on {} windows: max abs difference {:.2e}".format(len(features), max_diff))
+    print("numpy model loaded in {:.2f}ms, {} windows predicted in {:.2f}ms".format(
+        load_secs * 1000., len(features), predict_secs * 1000.))
+    if max_diff > FLAGS.tolerance:
+        raise ValueError("Numpy predictions differ from the tensorflow ones by {}".format(max_diff))
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import time
+
+import tensorflow as tf
+
+import data_set_helper as data_set
+import model_helper as model
+import model_train
+import net_hparams
+from models import registry
+from utils import autotune
+from utils import checkpoints
+from utils.eval_metric import create_evaluation_metrics
+
+tf.flags.DEFINE_string("model_dir", None, "Root directory of the model versions v0, v1, ...")
+tf.flags.DEFINE_string("base_model_dir", None, "Trained model the first version starts from, e.g. a model_train.py run")
+tf.flags.DEFINE_string("incremental_dir", './data/incremental', "Directory of the new and replay windows exported by dataset_extraction.run_incremental")
+tf.flags.DEFINE_integer("incremental_steps", 500, "Training steps of an update")
+tf.flags.DEFINE_float("replay_fraction", 0.5, "Fraction of every batch sampled from the replay windows. 0 trains only on the new windows")
+tf.flags.DEFINE_string("since_date", None, "Last day seen by the previous version, checked against the exported update")
+FLAGS = tf.flags.FLAGS
+
+UPDATE_FILE = "update.json"   # written when a version is complete
+BEFORE_DIR = "before"           # copy of the source checkpoint evaluated before the update
+EXPORT_FILE = "export.json"     # written by dataset_extraction.run_incremental
+
+
+def load_export(input_dir, source_dir, since_date=None):
+    '''
+    since date and last date of the exported update, checked against the expected since date
+    and against the last day seen by the source version
+    :return: dictionary with since_date, last_date, new_rows and replay_rows
+    '''
+    full_path = os.path.join(input_dir, model_train.COMPANY_NAME, EXPORT_FILE)
+    if not os.path.exists(full_path):
+        raise ValueError("No {}, export the update with dataset_extraction.py --since".format(full_path))
+    with open(full_path) as f:
+        export = json.load(f)
+
+    if since_date is not None and since_date != export["since_date"]:
+        raise ValueError("The update in {} starts after {}, not {}".format(input_dir, export["since_date"], since_date))
+    source_update = os.path.join(source_dir, UPDATE_FILE)
+    if os.path.exists(source_update):
+        with open(source_update) as f:
+            last_seen = json.load(f)["last_date"]
+        if last_seen != export["since_date"]:
+            raise ValueError("{} was trained up to {}, the update in {} starts after {}".format(
+                source_dir, last_seen, input_dir, export["since_date"]))
+    return export
+
+
+def evaluate(hparams, model_dir, input_dir, split, config):
+    '''
+    metrics of a model version on the new or the replay windows
+    '''
+    estimator = tf.contrib.learn.Estimator(
+        model_fn=model.create_model_fn(hparams, model_impl=registry.get_model(hparams.model_type)),
+        model_dir=model_dir,
+        config=config)
+    input_fn = data_set.create_input_fn(
+        mode=tf.contrib.learn.ModeKeys.EVAL,
+        input_files=data_set.input_files(input_dir, model_train.COMPANY_NAME, split, hparams,
+                                         model_train.OUTPUT_NAME_SUFFIX),
+        batch_size=hparams.eval_batch_size,
+        num_epochs=1,
+        h_params=hparams)
+    metrics = estimator.evaluate(input_fn=input_fn, metrics=create_evaluation_metrics(hparams.e_type), name=split)
+    return {key: value.item() if hasattr(value, "item") else value for key, value in metrics.items()}
+
+
+def update(hparams, source_dir, target_dir, input_dir, steps, replay_fraction, config):
+    '''
+    restore the latest checkpoint of source_dir in target_dir and train it for a few steps on the new windows,
+    mixed with windows replayed from the months before them
+    :return: global steps at the start and at the end of the update
+    '''
+    start_step = checkpoints.warm_start(source_dir, target_dir)
+    net_hparams.save_hparams(hparams, target_dir)
+
+    estimator = tf.contrib.learn.Estimator(
+        model_fn=model.create_model_fn(hparams, model_impl=registry.get_model(hparams.model_type)),
+        model_dir=target_dir,
+        config=config)
+    input_fn_train = data_set.create_replay_input_fn(
+        new_files=data_set.input_files(input_dir, model_train.COMPANY_NAME, "new", hparams, model_train.OUTPUT_NAME_SUFFIX),
+        replay_files=data_set.input_files(input_dir, model_train.COMPANY_NAME, "replay", hparams,
+                                          model_train.OUTPUT_NAME_SUFFIX),
+        batch_size=hparams.batch_size,
+        replay_fraction=replay_fraction,
+        h_params=hparams)
+    estimator.fit(input_fn=input_fn_train, max_steps=start_step + steps)
+    return start_step, checkpoints.global_step(target_dir)
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.model_dir:
+        raise ValueError("You must specify a model directory")
+
+    latest = checkpoints.latest_version(FLAGS.model_dir, finished_file=UPDATE_FILE)
+    if latest is None:
+        if not FLAGS.base_model_dir:
+            raise ValueError("No version in {}, you must specify the base model directory".format(FLAGS.model_dir))
+        source_dir, version = FLAGS.base_model_dir, 0
+    else:
+        source_dir, version = checkpoints.version_dir(FLAGS.model_dir, latest), latest + 1
+    target_dir = checkpoints.version_dir(FLAGS.model_dir, version)
+    if os.path.exists(target_dir):
+        # left by a run that crashed before writing its update file, it would be resumed half trained
+        tf.logging.warning("Removing the unfinished version {}".format(target_dir))
+        shutil.rmtree(target_dir)
+    export = load_export(FLAGS.incremental_dir, source_dir, FLAGS.since_date)
+
+    # the new version has the variables of its source
+    hparams = net_hparams.load_hparams(source_dir)
+    tune_config = autotune.load_best_config(hparams.model_type, "train") if FLAGS.use_autotune else autotune.DEFAULT_CONFIG
+    config = model.create_run_config(hparams,
+                                     intra_op_threads=tune_config.intra_op_threads,
+                                     inter_op_threads=tune_config.inter_op_threads)
+
+    # the source is evaluated from a copy, so no event file is written in the directory of the deployed model
+    before_dir = os.path.join(target_dir, BEFORE_DIR)
+    checkpoints.warm_start(source_dir, before_dir)
+    before = {split: evaluate(hparams, before_dir, FLAGS.incremental_dir, split, config) for split in ["new", "replay"]}
+    start_time = time.time()
+    start_step, end_step = update(hparams, source_dir, target_dir, FLAGS.incremental_dir, FLAGS.incremental_steps,
+                                  FLAGS.replay_fraction, config)
+    train_secs = time.time() - start_time
+    after = {split: evaluate(hparams, target_dir, FLAGS.incremental_dir, split, config) for split in ["new", "replay"]}
+
+    summary = {"version": version,
+               "source_dir": source_dir,
+               "since_date": export["since_date"],
+               "last_date": export["last_date"],
+               "start_step": start_step,
+               "end_step": end_step,
+               "replay_fraction": FLAGS.replay_fraction,
+               "train_secs": train_secs,
+               "before": before,
+               "after": after}
+    full_path = os.path.join(target_dir, UPDATE_FILE)
+    with open(full_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    for split in ["new", "replay"]:
+        print("{}: loss {:.6f} -> {:.6f}".format(split, before[split]["loss"], after[split]["loss"]))
+    print("Version {} trained in {:.1f}s, wrote to {}".format(version, train_secs, full_path))
+
+
+if __name__ == "__main__":
+    tf.app.run()
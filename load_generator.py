@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import tensorflow as tf
+
+import net_hparams
+
+tf.flags.DEFINE_integer("loglevel", 20, "Tensorflow log level")
+tf.flags.DEFINE_string("server", "http://localhost:8500", "Address of the prediction server")
+tf.flags.DEFINE_integer("concurrency", 16, "Clients sending requests in parallel")
+tf.flags.DEFINE_integer("num_requests", 2000, "Requests sent by all the clients")
+tf.flags.DEFINE_integer("windows_per_request", 1, "Feature windows in every request")
+tf.flags.DEFINE_integer("sequence_length", net_hparams.SL, "Time stamps of every window")
+tf.flags.DEFINE_integer("input_size", len(net_hparams.KEYS), "Features of every time stamp")
+tf.flags.DEFINE_integer("seed", 0, "Seed of the random windows")
+FLAGS = tf.flags.FLAGS
+
+
+def send(server, path, body=None):
+    request = urllib.request.Request(server + path,
+                                     data=None if body is None else json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def client(server, bodies, latencies, errors):
+    for body in bodies:
+        start_time = time.time()
+        try:
+            send(server, "/predict", body)
+            latencies.append(time.time() - start_time)
+        except Exception as e:
+            errors.append(str(e))
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    rng = np.random.RandomState(FLAGS.seed)
+    bodies = [{"features": rng.randn(FLAGS.windows_per_request, FLAGS.sequence_length, FLAGS.input_size).tolist()}
+              for _ in range(FLAGS.num_requests)]
+
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(FLAGS.server, bodies[idx::FLAGS.concurrency], latencies, errors))
+               for idx in range(FLAGS.concurrency)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed_secs = time.time() - start_time
+
+    latencies = np.array(latencies)
+    report = {"requests": len(latencies),
+              "errors": len(errors),
+              "requests_per_sec": len(latencies) / elapsed_secs,
+              "windows_per_sec": len(latencies) * FLAGS.windows_per_request / elapsed_secs}
+    if len(latencies):
+        report.update({"client_p50_ms": float(np.percentile(latencies, 50) * 1000.),
+                       "client_p99_ms": float(np.percentile(latencies, 99) * 1000.)})
+    if errors:
+        tf.logging.error("first error: {}".format(errors[0]))
+    report["server"] = send(FLAGS.server, "/stats")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    tf.app.run()
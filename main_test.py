@@ -1,23 +1,26 @@
 import os
 import sys
-import pandas as pd
+import numpy as np
 import tensorflow as tf
 
 import model_helper as model
 import data_set_helper as data_set
 import net_hparams
+from models import registry
+from utils import autotune
+from utils import predictions as pred
 from utils.func_utils import export_to_csv
-from models.multi_layer import mlp
-from models.deep_rnn import deep_rnn
-from models.simple_rnn import simple_rnn
-from models.cnn_rnn import cnn_rnn
-from models.hierarcical_cnn_rnn import h_cnn_rnn
-from models.depthwise_cnn_rnn import dw_cnn_rnn
+from utils.profiler import ProfilerHook
 
 tf.flags.DEFINE_integer("loglevel", 20, "Tensorflow log level")
 tf.flags.DEFINE_string("model_dir", 'debug/runs_1494486124', "Directory to load model checkpoints from")
 tf.flags.DEFINE_string("input_dir", './data', "Evaluate after this many train steps")
 tf.flags.DEFINE_string("export_dir", './data/results', "Results export diretory")
+tf.flags.DEFINE_integer("profile_every_n_steps", 0, "Profile an inference pass tracing a batch every this many batches. 0 disables the profiling")
+tf.flags.DEFINE_string("profile_dir", None, "Directory of the traces and cost tables. Defaults to <model_dir>/profile_test")
+tf.flags.DEFINE_string("export_format", "csv", "Format of the exported predictions: csv or npz")
+tf.flags.DEFINE_integer("log_every_n_batches", 100, "Log the prediction progress every this many batches")
+tf.flags.DEFINE_boolean("use_autotune", True, "Use the thread configuration and batch size found by autotune.py for this model and host")
 FLAGS = tf.flags.FLAGS
 
 if not FLAGS.model_dir:
@@ -27,7 +30,6 @@ if not FLAGS.model_dir:
 COMPANY_NAME = 'apple'
 OUTPUT_NAME_SUFFIX = 'seq'
 RETURN_TYPE = 'relative'
-TEST_FILE = os.path.abspath(os.path.join(FLAGS.input_dir, COMPANY_NAME, "test_{}_{}.tfrecords"))
 
 tf.logging.set_verbosity(FLAGS.loglevel)
 
@@ -35,9 +37,12 @@ tf.logging.set_verbosity(FLAGS.loglevel)
 
 
 def main(unused_argv):
-    hparams = net_hparams.create_hparams()
+    hparams = net_hparams.load_hparams(FLAGS.model_dir)
+    tune_config = autotune.load_best_config(hparams.model_type, "infer") if FLAGS.use_autotune else autotune.DEFAULT_CONFIG
+    if tune_config.batch_size:
+        hparams = hparams._replace(eval_batch_size=tune_config.batch_size)
 
-    model_impl = eval(hparams.model_type)
+    model_impl = registry.get_model(hparams.model_type)
 
     model_fn = model.create_model_fn(
         hparams,
@@ -46,27 +51,51 @@ def main(unused_argv):
     estimator = tf.contrib.learn.Estimator(
         model_fn=model_fn,
         model_dir=FLAGS.model_dir,
-        config=tf.contrib.learn.RunConfig(gpu_memory_fraction=0.6,
-                                          save_checkpoints_secs=30))
+        config=model.create_run_config(hparams,
+                                       save_checkpoints_secs=30,
+                                       intra_op_threads=tune_config.intra_op_threads,
+                                       inter_op_threads=tune_config.inter_op_threads))
 
     input_fn_test = data_set.create_input_fn(
         mode=tf.contrib.learn.ModeKeys.INFER,
-        input_files=[TEST_FILE.format(OUTPUT_NAME_SUFFIX, hparams.e_type)],
+        input_files=data_set.input_files(FLAGS.input_dir, COMPANY_NAME, "test", hparams, OUTPUT_NAME_SUFFIX),
         batch_size=hparams.eval_batch_size,
         num_epochs=1,
-        h_params=hparams)
-
-    export_data = pd.DataFrame(columns=('predictions','targets'))
-
-    ev = estimator.predict(input_fn=input_fn_test)
-    for idx_row, row in enumerate(ev):
-        print("idx_row {}\t\tprediction {}\t\ttarget {}".format(idx_row, row['predictions'], row['targets']))
-        export_data = export_data.append(pd.DataFrame([[row['predictions'], row['targets']]],
-                                                      columns=['predictions', 'targets']))
-
-    full_path = os.path.join(FLAGS.export_dir, "{}_{}_{}".format(COMPANY_NAME, hparams.model_type, RETURN_TYPE)) + '.csv'
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    export_data.to_csv(full_path)
+        h_params=hparams,
+        reader_num_threads=tune_config.reader_threads,
+        parser_num_threads=tune_config.reader_threads)
+
+    if FLAGS.profile_every_n_steps > 0:
+        # predict does not accept hooks: profile the same forward pass trough evaluate
+        input_fn_profile = data_set.create_input_fn(
+            mode=tf.contrib.learn.ModeKeys.EVAL,
+            input_files=data_set.input_files(FLAGS.input_dir, COMPANY_NAME, "test", hparams, OUTPUT_NAME_SUFFIX),
+            batch_size=hparams.eval_batch_size,
+            num_epochs=1,
+            h_params=hparams)
+        profiler = ProfilerHook(FLAGS.profile_dir or os.path.join(FLAGS.model_dir, "profile_test"),
+                                every_n_steps=FLAGS.profile_every_n_steps)
+        estimator.evaluate(input_fn=input_fn_profile, hooks=[profiler])
+
+    test_files = data_set.input_files(FLAGS.input_dir, COMPANY_NAME, "test", hparams, OUTPUT_NAME_SUFFIX)
+    keys = ['predictions', 'targets', 'ticker', 'date']
+    predictions = estimator.predict(input_fn=input_fn_test, outputs=keys)
+    columns = pred.collect_predictions(predictions,
+                                       num_rows=data_set.count_records(test_files),
+                                       keys=keys,
+                                       batch_size=hparams.eval_batch_size,
+                                       log_every_n_batches=FLAGS.log_every_n_batches)
+
+    export_data = {'date': pred.to_dates(columns['date']),
+                   'ticker': np.asarray(hparams.tickers)[columns['ticker']],
+                   'predictions': columns['predictions'],
+                   'targets': columns['targets']}
+
+    company_name = "universe" if hparams.multi_task else COMPANY_NAME
+    full_path = pred.export_predictions(export_data,
+                                        os.path.join(FLAGS.export_dir, "{}_{}_{}".format(company_name, hparams.model_type, RETURN_TYPE)),
+                                        export_format=FLAGS.export_format)
+    print("Wrote {} predictions to {}".format(len(export_data['predictions']), full_path))
 
 if __name__ == "__main__":
     tf.app.run()
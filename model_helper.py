@@ -1,6 +1,17 @@
+import math
 import tensorflow as tf
+from tensorflow.contrib.layers.python.layers.optimizers import OPTIMIZER_CLS_NAMES
 from tensorflow.contrib.learn.python.learn.estimators import model_fn as model_fn_lib
+from tensorflow.python.ops import control_flow_ops
 import utils.func_utils as fu
+import utils.summarizer as s
+from utils.normalization import normalize_features
+
+# recurrent models whose time_stamps are only mixed by the rnn, so they can be advanced one time_stamp at a time
+STREAMING_MODELS = ("deep_rnn", "cnn_rnn", "dw_cnn_rnn")
+
+# models whose output layer can be replaced by the per-ticker output layers of the multi-task mode
+MULTI_TASK_MODELS = ("deep_rnn", "cnn_rnn", "dw_cnn_rnn", "h_cnn_rnn", "tcn")
 
 def create_train_op(loss, hparams):
     '''
@@ -9,15 +20,133 @@ def create_train_op(loss, hparams):
     :param hparams: hiper-parameters used to configure the optimizer
     :return: training updates
     '''
+    if hparams.accumulate_steps > 1:
+        return create_accumulated_train_op(loss, hparams)
+
     train_op = tf.contrib.layers.optimize_loss(
         loss=loss,                                          # loss function used
         global_step=tf.contrib.framework.get_global_step(), # number of batches seen so far
-        learning_rate=hparams.learning_rate,                # learning rate
-        clip_gradients=2.0,                                # clip gradient to a max value
-        optimizer=hparams.optimizer)                        # optimizer used
+        learning_rate=scaled_learning_rate(hparams),        # learning rate
+        clip_gradients=hparams.clip_gradients,              # clip gradient to a max value
+        optimizer=hparams.optimizer,                        # optimizer used
+        learning_rate_decay_fn=_warmup_fn(hparams),
+        summaries=s.optimizer_summaries())
+    return train_op
+
+
+def scaled_learning_rate(hparams):
+    '''
+    learning rate scaled with the effective batch size of the gradient accumulation
+    :param hparams: hiper-parameters with learning_rate, accumulate_steps and lr_scaling
+    '''
+    if hparams.lr_scaling == "none":
+        return hparams.learning_rate
+    elif hparams.lr_scaling == "linear":
+        return hparams.learning_rate * hparams.accumulate_steps
+    elif hparams.lr_scaling == "sqrt":
+        return hparams.learning_rate * math.sqrt(hparams.accumulate_steps)
+    else:
+        raise ValueError("Wrong learning rate scaling {}".format(hparams.lr_scaling))
+
+def _warmup_fn(hparams):
+    '''
+    linear warm-up of the learning rate over the first hparams.warmup_steps training steps
+    :return: learning_rate_decay_fn(learning_rate, global_step) or None if there is no warm-up
+    '''
+    if hparams.warmup_steps <= 0:
+        return None
+
+    def warmup(learning_rate, global_step):
+        progress = tf.cast(global_step + 1, tf.float32) / float(hparams.warmup_steps)
+        return learning_rate * tf.minimum(1., progress)
+    return warmup
+
+
+def create_accumulated_train_op(loss, hparams):
+    '''
+    Large-batch training: the gradients of hparams.accumulate_steps micro-batches are summed and a single update
+    with their mean is applied. The global step still counts the micro-batches, so steps, checkpoints and
+    summaries keep their meaning; the variables change only every accumulate_steps steps.
+    :param loss: loss function to evaluate the error
+    :param hparams: hiper-parameters used to configure the optimizer
+    :return: training updates
+    '''
+    global_step = tf.contrib.framework.get_global_step()
+    accumulate_steps = hparams.accumulate_steps
+
+    with tf.variable_scope("OptimizeLoss"):
+        # moving averages of the batch normalization are still updated every micro-batch
+        update_ops = set(tf.get_collection(tf.GraphKeys.UPDATE_OPS))
+        if update_ops:
+            loss = control_flow_ops.with_dependencies(list(update_ops), loss)
+
+        learning_rate = scaled_learning_rate(hparams)
+        warmup = _warmup_fn(hparams)
+        if warmup is not None:
+            learning_rate = warmup(learning_rate, global_step)
+        s.scalar("learning_rate", learning_rate)
+        s.scalar("loss", loss)
+
+        if isinstance(hparams.optimizer, str):
+            optimizer = OPTIMIZER_CLS_NAMES[hparams.optimizer](learning_rate=learning_rate)
+        else:
+            optimizer = hparams.optimizer(learning_rate=learning_rate)
+
+        grads_and_vars = [(grad, var) for grad, var in optimizer.compute_gradients(loss) if grad is not None]
+        variables = [var for _, var in grads_and_vars]
+        # the slots have to exist before the conditional update, variables can not be created inside a tf.cond.
+        # Building an update with zero gradients creates them through the public API; this op is never run,
+        # the update in apply_accumulated reuses the same slots
+        optimizer.apply_gradients([(tf.zeros_like(var), var) for var in variables], name="create_slots")
+
+        accumulators = []
+        for grad, var in grads_and_vars:
+            accumulators.append(tf.Variable(tf.zeros(var.get_shape(), dtype=var.dtype.base_dtype),
+                                            trainable=False,
+                                            name=var.op.name.replace("/", "_") + "_accumulator"))
+
+        accumulate_op = tf.group(*[accumulator.assign_add(tf.convert_to_tensor(grad))      # densify IndexedSlices
+                                   for accumulator, (grad, _) in zip(accumulators, grads_and_vars)])
+
+        with tf.control_dependencies([accumulate_op]):
+            # the gradients and their summary live outside the tf.cond: a summary inside the update branch
+            # has no value on the accumulation steps and breaks the merged summary op
+            gradients = [accumulator / float(accumulate_steps) for accumulator in accumulators]
+            if hparams.clip_gradients is not None and hparams.clip_gradients > 0:
+                gradients, _ = tf.clip_by_global_norm(gradients, hparams.clip_gradients)
+            s.scalar("global_norm/clipped_gradient_norm", tf.global_norm(gradients))
+            is_update_step = tf.equal(tf.mod(global_step + 1, accumulate_steps), 0)
+
+        def apply_accumulated():
+            apply_op = optimizer.apply_gradients(list(zip(gradients, variables)))
+            with tf.control_dependencies([apply_op]):
+                reset_op = tf.group(*[accumulator.assign(tf.zeros_like(accumulator)) for accumulator in accumulators])
+            return control_flow_ops.with_dependencies([reset_op], tf.constant(True))
+
+        update_op = tf.cond(is_update_step, apply_accumulated, lambda: tf.constant(False))
+
+        with tf.control_dependencies([update_op]):
+            step_op = tf.assign_add(global_step, 1)
+
+        train_op = control_flow_ops.with_dependencies([step_op], loss)
     return train_op
 
 
+def create_run_config(hparams, save_checkpoints_secs=320, intra_op_threads=0, inter_op_threads=0):
+    '''
+    Create the RunConfig of the estimator
+    :param hparams: hiper-parameters used to configure the summaries
+    :param save_checkpoints_secs: save a checkpoint every this many seconds
+    :param intra_op_threads: threads used inside a single op, 0 lets tensorflow decide
+    :param inter_op_threads: ops executed in parallel, 0 lets tensorflow decide
+    :return: RunConfig
+    '''
+    config = tf.contrib.learn.RunConfig(save_checkpoints_secs=save_checkpoints_secs,
+                                        save_summary_steps=hparams.summary_every_n_steps)
+    config.tf_config.intra_op_parallelism_threads = intra_op_threads
+    config.tf_config.inter_op_parallelism_threads = inter_op_threads
+    return config
+
 
 def create_model_fn(hparams, model_impl):
     '''
@@ -26,7 +155,18 @@ def create_model_fn(hparams, model_impl):
     :param model_impl: implementation of the model used, have to use the same interface to inject a different model
     :return: probabilities of the predicted class, value of the loss function, operation to execute the training
     '''
+    if hparams.multi_task and hparams.model_type not in MULTI_TASK_MODELS:
+        raise ValueError("Model {} does not support the multi-task mode".format(hparams.model_type))
+
     def model_fn(features_map, targets, mode):
+        # summaries are only useful while training
+        if mode == tf.contrib.learn.ModeKeys.TRAIN:
+            s.set_summary_level(hparams.summary_level)
+        else:
+            s.set_summary_level("off")
+
+        if hparams.multi_task and 'ticker' not in features_map:
+            raise ValueError("The multi-task mode needs the ticker id feature")
 
         if mode == tf.contrib.learn.ModeKeys.TRAIN:
             predictions, loss = model_impl(
@@ -68,11 +208,16 @@ def create_model_fn(hparams, model_impl):
                 features_map,
                 None)
 
+            infer_predictions = {'predictions':predictions,
+                                 'features':features_map['features'],
+                                 'targets':features_map['targets']
+                                 }
+            for key in ['ticker', 'date']:
+                if key in features_map:
+                    infer_predictions[key] = features_map[key]
+
             return model_fn_lib.ModelFnOps(mode=mode,
-                                           predictions={'predictions':predictions,
-                                                        'features':features_map['features'],
-                                                        'targets':features_map['targets']
-                                                        }
+                                           predictions=infer_predictions
                                            )
 
         if mode == tf.contrib.learn.ModeKeys.EVAL:
@@ -90,3 +235,52 @@ def create_model_fn(hparams, model_impl):
                                            loss=loss
                                            )
     return model_fn
+
+
+def create_inference_graph(hparams, model_impl):
+    '''
+    Build in the default graph only the forward pass of the model, fed by placeholders instead of the input queue.
+    No summaries, regularization, loss or training ops are created
+    :param hparams: hiper-parameters used to configure the model
+    :param model_impl: implementation of the model used
+    :return: dictionary name -> input placeholder, dictionary name -> output tensor
+    '''
+    s.set_summary_level("off")
+    inputs = {'features': tf.placeholder(tf.float32, [None, hparams.sequence_length, hparams.input_size], name='features'),
+              'length': tf.placeholder(tf.int64, [None], name='length'),
+              'ticker': tf.placeholder(tf.int64, [None], name='ticker')}     # only used by the multi-task models
+    features_map = dict(inputs)
+    features_map['features'] = normalize_features(inputs['features'], inputs['ticker'], hparams)
+    predictions, _ = model_impl(hparams,
+                                tf.contrib.learn.ModeKeys.INFER,
+                                features_map,
+                                None)
+    outputs = {'predictions': tf.identity(predictions, name='predictions')}
+    return inputs, outputs
+
+
+def create_streaming_graph(hparams, model_impl):
+    '''
+    Build in the default graph the forward pass of a single time_stamp, starting from a given rnn state.
+    The variables are the same of the full model, so it is restored from the same checkpoints
+    :param hparams: hiper-parameters used to configure the model
+    :param model_impl: implementation of the model used, one of STREAMING_MODELS
+    :return: dictionary name -> input placeholder, dictionary name -> output tensor with the predictions and the new state
+    '''
+    if hparams.model_type not in STREAMING_MODELS:
+        raise ValueError("Model {} does not support the streaming inference".format(hparams.model_type))
+
+    s.set_summary_level("off")
+    inputs = {'features': tf.placeholder(tf.float32, [None, 1, hparams.input_size], name='features'),
+              'initial_state': tf.placeholder(tf.float32, [None, hparams.h_layer_size[-1]], name='initial_state'),
+              'ticker': tf.placeholder(tf.int64, [None], name='ticker')}
+    features_map = dict(inputs)
+    features_map['features'] = normalize_features(inputs['features'], inputs['ticker'], hparams)
+    features_map['length'] = tf.ones_like(inputs['ticker'])
+    predictions, _ = model_impl(hparams._replace(sequence_length=1),
+                                tf.contrib.learn.ModeKeys.INFER,
+                                features_map,
+                                None)
+    outputs = {'predictions': tf.identity(predictions, name='predictions'),
+               'state': tf.identity(tf.get_collection(fu.RNN_STATE_COLLECTION)[-1], name='state')}
+    return inputs, outputs
@@ -6,19 +6,30 @@ import tensorflow as tf
 import model_helper as model
 import data_set_helper as data_set
 import net_hparams
-from models.multi_layer import mlp
-from models.deep_rnn import deep_rnn
-from models.simple_rnn import simple_rnn
-from models.cnn_rnn import cnn_rnn
-from models.hierarcical_cnn_rnn import h_cnn_rnn
-from models.depthwise_cnn_rnn import dw_cnn_rnn
+from models import registry
 
+from utils import autotune
+from utils.checkpoint_manager import AsyncCheckpointHook, CheckpointPolicy, CheckpointValidationMonitor
 from utils.eval_metric import create_evaluation_metrics
+from utils.profiler import ProfilerHook
 
 tf.flags.DEFINE_integer("loglevel", 20, "Tensorflow log level")
 tf.flags.DEFINE_integer("num_epochs", None, "Number of training Epochs. Defaults to indefinite.")
 tf.flags.DEFINE_integer("eval_every", 50, "Evaluate after this many train steps")
 tf.flags.DEFINE_string("input_dir", './data', "Evaluate after this many train steps")
+tf.flags.DEFINE_boolean("multi_task", False, "Train a single model over all the tickers of the universe")
+tf.flags.DEFINE_integer("accumulate_steps", 1, "Accumulate the gradients of this many batches before every update")
+tf.flags.DEFINE_string("lr_scaling", "none", "Scale the learning rate with accumulate_steps: none, linear or sqrt")
+tf.flags.DEFINE_integer("warmup_steps", 0, "Steps of linear learning rate warm-up")
+tf.flags.DEFINE_integer("profile_every_n_steps", 0, "Trace a training step every this many steps. 0 disables the profiling")
+tf.flags.DEFINE_string("profile_dir", None, "Directory of the traces and cost tables. Defaults to <model_dir>/profile")
+tf.flags.DEFINE_boolean("use_autotune", True, "Use the thread configuration found by autotune.py for this model and host")
+tf.flags.DEFINE_string("input_normalization", "none", "Normalize the features with the statistics of the train split: none, zscore or robust")
+tf.flags.DEFINE_boolean("batch_norm", True, "Batch normalize the hidden layers. Can be disabled with the input normalization")
+tf.flags.DEFINE_integer("checkpoint_every_secs", 320, "Save a checkpoint every this many seconds")
+tf.flags.DEFINE_boolean("async_checkpoints", False, "Write the checkpoints in a background thread and keep only the latest and the best ones")
+tf.flags.DEFINE_integer("keep_latest", 2, "Async checkpoints: number of most recent checkpoints kept")
+tf.flags.DEFINE_integer("keep_best", 3, "Async checkpoints: number of checkpoints with the best validation metric kept")
 FLAGS = tf.flags.FLAGS
 
 MODEL_DIR = os.path.abspath("./debug/runs_{}")
@@ -26,57 +37,138 @@ MODEL_DIR = os.path.abspath("./debug/runs_{}")
 
 COMPANY_NAME = 'apple'
 OUTPUT_NAME_SUFFIX = 'seq'
-
-
-TRAIN_FILE = os.path.abspath(os.path.join(FLAGS.input_dir, COMPANY_NAME, "train_{}_{}.tfrecords"))
-VALIDATION_FILE = os.path.abspath(os.path.join(FLAGS.input_dir, COMPANY_NAME, "valid_{}_{}.tfrecords"))
-
-
-tf.logging.set_verbosity(FLAGS.loglevel)
-
-
+TRAIN_STEPS = 10**5
+HIDDEN_LAYER_TYPES = ["gated_dense_layer_ot", "gated_res_net_layer_ot", "highway_dense_layer_ot"]
+
+
+def train(hparams, model_dir, input_dir, company_name=COMPANY_NAME, steps=TRAIN_STEPS, eval_every=50, num_epochs=None,
+          config=None, max_steps=None, early_stopping_rounds=None, early_stopping_metric="loss", early_stopping_metric_minimize=True,
+          hooks=None, reader_num_threads=1, checkpoint_policy=None):
+    '''
+    Train a model and evaluate the final checkpoint on the validation set
+    :param hparams: hiper-parameters of the model
+    :param model_dir: directory where checkpoints and summaries are saved
+    :param input_dir: root directory of the exported datasets
+    :param company_name: company to train on, all the tickers of hparams are used in multi-task mode
+    :param steps: number of training steps
+    :param eval_every: evaluate after this many train steps
+    :param num_epochs: number of training epochs, None for indefinite
+    :param config: RunConfig of the estimator, default to model_helper.create_run_config
+    :param max_steps: train up to this global step instead of for `steps` more steps. Used to resume a model from
+        its last checkpoint
+    :param early_stopping_rounds: stop if the early_stopping_metric didn't improve for this many steps. None disables it
+    :param early_stopping_metric: validation metric watched by the early stopping
+    :param early_stopping_metric_minimize: True if the early_stopping_metric has to be minimized
+    :param hooks: additional SessionRunHooks run during the training
+    :param reader_num_threads: threads reading and parsing the training set
+    :param checkpoint_policy: CheckpointPolicy of the async checkpoints ranked by early_stopping_metric,
+        None to let the estimator save the checkpoints. The config must not save checkpoints too
+    :return: dictionary of the validation metrics
+    '''
+    # the statistics are saved with the hiper-parameters, so every inference path normalizes the same way
+    hparams = data_set.load_normalization(input_dir, hparams)
+    net_hparams.save_hparams(hparams, model_dir)
+    model_impl = registry.get_model(hparams.model_type)
+
+    model_fn = model.create_model_fn(
+        hparams,
+        model_impl=model_impl)
+
+    if config is None:
+        config = model.create_run_config(hparams) if checkpoint_policy is None else \
+            model.create_run_config(hparams, save_checkpoints_secs=None)
+
+    estimator = tf.contrib.learn.Estimator(
+        model_fn=model_fn,
+        model_dir=model_dir,
+        config=config)
+
+    input_fn_train = data_set.create_input_fn(
+        mode=tf.contrib.learn.ModeKeys.TRAIN,
+        input_files=data_set.input_files(input_dir, company_name, "train", hparams, OUTPUT_NAME_SUFFIX),
+        batch_size=hparams.batch_size,
+        num_epochs=num_epochs,
+        h_params=hparams,
+        reader_num_threads=reader_num_threads,
+        parser_num_threads=reader_num_threads
+    )
+
+    input_fn_eval = data_set.create_input_fn(
+        mode=tf.contrib.learn.ModeKeys.EVAL,
+        input_files=data_set.input_files(input_dir, company_name, "valid", hparams, OUTPUT_NAME_SUFFIX),
+        batch_size=hparams.eval_batch_size,
+        num_epochs=1,
+        h_params=hparams)
+
+    eval_metrics = create_evaluation_metrics(hparams.e_type)
+
+    monitor_args = dict(input_fn=input_fn_eval,
+                        every_n_steps=eval_every,
+                        metrics=eval_metrics,
+                        early_stopping_rounds=early_stopping_rounds,
+                        early_stopping_metric=early_stopping_metric,
+                        early_stopping_metric_minimize=early_stopping_metric_minimize)
+    if checkpoint_policy is not None:
+        checkpoint_hook = AsyncCheckpointHook(model_dir, checkpoint_policy, minimize=early_stopping_metric_minimize)
+        eval_monitor = CheckpointValidationMonitor(checkpoint_hook, metric=early_stopping_metric, **monitor_args)
+        monitors = [checkpoint_hook, eval_monitor] + (hooks or [])
+    else:
+        eval_monitor = tf.contrib.learn.monitors.ValidationMonitor(**monitor_args)
+        monitors = [eval_monitor] + (hooks or [])
+
+    if max_steps is not None:
+        estimator.fit(input_fn=input_fn_train, max_steps=max_steps, monitors=monitors)
+    else:
+        estimator.fit(input_fn=input_fn_train, steps=steps, monitors=monitors)
+    return estimator.evaluate(input_fn=input_fn_eval, metrics=eval_metrics)
+
+
+def create_checkpoint_policy():
+    '''
+    :return: CheckpointPolicy from the flags, None if the async checkpoints are disabled
+    '''
+    if not FLAGS.async_checkpoints:
+        return None
+    return CheckpointPolicy(every_n_secs=FLAGS.checkpoint_every_secs,
+                            every_n_steps=None,
+                            keep_latest=FLAGS.keep_latest,
+                            keep_best=FLAGS.keep_best)
 
 
 def main(unused_argv):
-    for h_layer in ["gated_dense_layer_ot", "gated_res_net_layer_ot", "highway_dense_layer_ot"]:
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    for h_layer in HIDDEN_LAYER_TYPES:
         TIMESTAMP = int(time.time())
-        hparams = net_hparams.create_hparams(hidden_layer_type=h_layer)
-
-
-        model_impl = eval(hparams.model_type)
-
-        model_fn = model.create_model_fn(
-            hparams,
-            model_impl=model_impl)
-
-        estimator = tf.contrib.learn.Estimator(
-            model_fn=model_fn,
-            model_dir=MODEL_DIR.format(TIMESTAMP),
-            config=tf.contrib.learn.RunConfig(save_checkpoints_secs=320))
-
-        input_fn_train = data_set.create_input_fn(
-            mode=tf.contrib.learn.ModeKeys.TRAIN,
-            input_files=[TRAIN_FILE.format(OUTPUT_NAME_SUFFIX, hparams.e_type)],
-            batch_size=hparams.batch_size,
-            num_epochs=FLAGS.num_epochs,
-            h_params=hparams
-        )
-
-        input_fn_eval = data_set.create_input_fn(
-            mode=tf.contrib.learn.ModeKeys.EVAL,
-            input_files=[VALIDATION_FILE.format(OUTPUT_NAME_SUFFIX, hparams.e_type)],
-            batch_size=hparams.eval_batch_size,
-            num_epochs=1,
-            h_params=hparams)
-
-        eval_metrics = create_evaluation_metrics(hparams.e_type)
-
-        eval_monitor = tf.contrib.learn.monitors.ValidationMonitor(
-            input_fn=input_fn_eval,
-            every_n_steps=FLAGS.eval_every,
-            metrics=eval_metrics)
-
-        estimator.fit(input_fn=input_fn_train, steps=10**5, monitors=[eval_monitor])
+        model_dir = MODEL_DIR.format(TIMESTAMP)
+        hparams = net_hparams.create_hparams(hidden_layer_type=h_layer)._replace(multi_task=FLAGS.multi_task,
+                                                                                 accumulate_steps=FLAGS.accumulate_steps,
+                                                                                 lr_scaling=FLAGS.lr_scaling,
+                                                                                 warmup_steps=FLAGS.warmup_steps,
+                                                                                 input_normalization=FLAGS.input_normalization,
+                                                                                 batch_norm=FLAGS.batch_norm)
+
+        # the batch size changes the optimization, only the tuned threads are used for the training
+        tune_config = autotune.load_best_config(hparams.model_type, "train") if FLAGS.use_autotune else autotune.DEFAULT_CONFIG
+        checkpoint_policy = create_checkpoint_policy()
+        config = model.create_run_config(hparams,
+                                         save_checkpoints_secs=None if checkpoint_policy else FLAGS.checkpoint_every_secs,
+                                         intra_op_threads=tune_config.intra_op_threads,
+                                         inter_op_threads=tune_config.inter_op_threads)
+
+        hooks = []
+        if FLAGS.profile_every_n_steps > 0:
+            hooks.append(ProfilerHook(FLAGS.profile_dir or os.path.join(model_dir, "profile"),
+                                      every_n_steps=FLAGS.profile_every_n_steps))
+
+        train(hparams,
+              model_dir=model_dir,
+              input_dir=FLAGS.input_dir,
+              eval_every=FLAGS.eval_every,
+              num_epochs=FLAGS.num_epochs,
+              config=config,
+              hooks=hooks,
+              reader_num_threads=tune_config.reader_threads,
+              checkpoint_policy=checkpoint_policy)
 
 
 if __name__ == "__main__":
@@ -3,9 +3,12 @@ from tensorflow.contrib.layers.python.layers import initializers
 import utils.summarizer as s
 import models.layers.conv_layer as conv_layer
 import models.layers.output_layer as output_layer
+import utils.func_utils as fu
 from utils.func_utils import leaky_relu, is_training
+from models.registry import register_model
 
 
+@register_model("cnn_rnn")
 def cnn_rnn(h_params, mode, features_map, target):
     features = features_map['features']
     sequence_length = features_map['length']
@@ -40,11 +43,12 @@ def cnn_rnn(h_params, mode, features_map, target):
     # filtered = tf.add(filtered, features)     # skip-trough connection
 
     filtered = tf.squeeze(filtered, axis=-1)
-    filtered = tf.contrib.layers.batch_norm(filtered,
-                                            center=True,
-                                            scale=False,
-                                            is_training=is_training(mode),
-                                            scope='bn')
+    if h_params.batch_norm:
+        filtered = tf.contrib.layers.batch_norm(filtered,
+                                                center=True,
+                                                scale=False,
+                                                is_training=is_training(mode),
+                                                scope='bn')
     # Concatenate the different filtered time_series
     # filtered = tf.unstack(filtered_one, axis=3)
     # filtered.extend(tf.unstack(filtered_all, axis=3))
@@ -64,7 +68,9 @@ def cnn_rnn(h_params, mode, features_map, target):
         # Get lstm cell output
         outputs, states = tf.contrib.rnn.static_rnn(cell, tf.unstack(filtered, axis=1),
                                                     sequence_length=sequence_length,
+                                                    initial_state=features_map.get('initial_state'),
                                                     dtype=tf.float32)
+        tf.add_to_collection(fu.RNN_STATE_COLLECTION, states)       # state carried by the streaming inference
 
         s.add_hidden_layer_summary(activation=outputs[-1], name=vs.name + "_output")
         if isinstance(states, list) or isinstance(states, tuple):
@@ -73,10 +79,13 @@ def cnn_rnn(h_params, mode, features_map, target):
             s.add_hidden_layer_summary(states, vs.name + "_state")
 
     with tf.variable_scope('logits') as vs:
-        logits = tf.contrib.layers.fully_connected(inputs=outputs[-1],
-                                                   num_outputs=h_params.num_class[h_params.e_type],
-                                                   activation_fn=None,
-                                                   scope=vs)
+        if h_params.multi_task:
+            logits = output_layer.multi_task_logits(outputs[-1], h_params.h_layer_size[-1], features_map['ticker'], h_params)
+        else:
+            logits = tf.contrib.layers.fully_connected(inputs=outputs[-1],
+                                                       num_outputs=h_params.num_class[h_params.e_type],
+                                                       activation_fn=None,
+                                                       scope=vs)
         s.add_hidden_layer_summary(logits, vs.name)
 
         predictions, losses = output_layer.losses(logits, target, mode=mode, h_params=h_params)
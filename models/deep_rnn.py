@@ -2,20 +2,22 @@ import tensorflow as tf
 from tensorflow.contrib.layers.python.layers import initializers
 import utils.summarizer as s
 import models.layers.output_layer as output_layer
-from models.layers.dense_layer import *
+from models.layers.dense_layer import dense_layer
 import utils.func_utils as fu
 from utils.func_utils import leaky_relu
+from models.registry import register_model, get_layer
 
 
+@register_model("deep_rnn")
 def deep_rnn(h_params, mode, features_map, target):
     features = features_map['features']
     sequence_length = features_map['length']
-    hidden_layer = eval(h_params.hidden_layer_type)
+    hidden_layer = get_layer(h_params.hidden_layer_type)
 
     #apply unlinera transformation
     in_size = h_params.input_size
     filtered = features
-    batch_norm_data = fu.create_BNParams(apply=True,
+    batch_norm_data = fu.create_BNParams(apply=h_params.batch_norm,
                                          phase=fu.is_training(mode))
 
     for layer_idx, h_layer_dim in enumerate(h_params.h_layer_size[:-1]):
@@ -32,12 +34,15 @@ def deep_rnn(h_params, mode, features_map, target):
         # Define a lstm cell with tensorflow
         cell = tf.contrib.rnn.GRUCell(h_params.h_layer_size[-1],
                                       activation=tf.nn.tanh)
-        cell = tf.contrib.rnn.DropoutWrapper(cell, output_keep_prob=h_params.dropout)
+        if mode == tf.contrib.learn.ModeKeys.TRAIN:
+            cell = tf.contrib.rnn.DropoutWrapper(cell, output_keep_prob=h_params.dropout)
 
         # Get lstm cell output
         outputs, states = tf.contrib.rnn.static_rnn(cell, tf.unstack(filtered, axis=1),
                                                     sequence_length=sequence_length,
+                                                    initial_state=features_map.get('initial_state'),
                                                     dtype=tf.float32)
+        tf.add_to_collection(fu.RNN_STATE_COLLECTION, states)       # state carried by the streaming inference
 
         s.add_hidden_layer_summary(activation=outputs[-1], name=vs.name + "_output")
         if isinstance(states, list) or isinstance(states, tuple):
@@ -46,11 +51,14 @@ def deep_rnn(h_params, mode, features_map, target):
             s.add_hidden_layer_summary(states, vs.name + "_state")
 
     with tf.variable_scope('logits') as vs:
-        logits = dense_layer(x=outputs[-1],
-                             in_size=h_params.h_layer_size[-1],
-                             out_size=h_params.num_class[h_params.e_type],
-                             scope=vs,
-                             activation_fn=None)
+        if h_params.multi_task:
+            logits = output_layer.multi_task_logits(outputs[-1], h_params.h_layer_size[-1], features_map['ticker'], h_params)
+        else:
+            logits = dense_layer(x=outputs[-1],
+                                 in_size=h_params.h_layer_size[-1],
+                                 out_size=h_params.num_class[h_params.e_type],
+                                 scope=vs,
+                                 activation_fn=None)
 
         s.add_hidden_layer_summary(logits, vs.name)
 
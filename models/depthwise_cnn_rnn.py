@@ -4,12 +4,14 @@ import utils.summarizer as s
 import models.layers.conv_layer as conv_layer
 import models.layers.output_layer as output_layer
 import utils.func_utils as fu
+from models.registry import register_model
 
 
+@register_model("dw_cnn_rnn")
 def dw_cnn_rnn(h_params, mode, features_map, target):
     features = features_map['features']
     sequence_length = features_map['length']
-    batch_norm_data = fu.create_BNParams(apply=True,
+    batch_norm_data = fu.create_BNParams(apply=h_params.batch_norm,
                                          phase=fu.is_training(mode))
 
     channel_multiply = 3
@@ -54,12 +56,15 @@ def dw_cnn_rnn(h_params, mode, features_map, target):
         # Define a lstm cell with tensorflow
         cell = tf.contrib.rnn.GRUCell(h_params.h_layer_size[-1],
                                       activation=tf.nn.tanh)
-        cell = tf.contrib.rnn.DropoutWrapper(cell, output_keep_prob=h_params.dropout)
+        if mode == tf.contrib.learn.ModeKeys.TRAIN:
+            cell = tf.contrib.rnn.DropoutWrapper(cell, output_keep_prob=h_params.dropout)
 
         # Get lstm cell output
         outputs, states = tf.contrib.rnn.static_rnn(cell, tf.unstack(filtered, axis=1),
                                                     sequence_length=sequence_length,
+                                                    initial_state=features_map.get('initial_state'),
                                                     dtype=tf.float32)
+        tf.add_to_collection(fu.RNN_STATE_COLLECTION, states)       # state carried by the streaming inference
 
         s.add_hidden_layer_summary(activation=outputs[-1], name=vs.name + "_output")
         if isinstance(states, list) or isinstance(states, tuple):
@@ -68,10 +73,13 @@ def dw_cnn_rnn(h_params, mode, features_map, target):
             s.add_hidden_layer_summary(states, vs.name + "_state")
 
     with tf.variable_scope('logits') as vs:
-        logits = tf.contrib.layers.fully_connected(inputs=outputs[-1],
-                                                   num_outputs=h_params.num_class[h_params.e_type],
-                                                   activation_fn=None,
-                                                   scope=vs)
+        if h_params.multi_task:
+            logits = output_layer.multi_task_logits(outputs[-1], h_params.h_layer_size[-1], features_map['ticker'], h_params)
+        else:
+            logits = tf.contrib.layers.fully_connected(inputs=outputs[-1],
+                                                       num_outputs=h_params.num_class[h_params.e_type],
+                                                       activation_fn=None,
+                                                       scope=vs)
         s.add_hidden_layer_summary(logits, vs.name)
 
         predictions, losses = output_layer.losses(logits, target, mode=mode, h_params=h_params)
@@ -2,6 +2,7 @@ import tensorflow as tf
 from tensorflow.contrib.layers.python.layers import initializers
 from models.layers import output_layer
 import utils.summarizer as s
+from models.registry import register_model
 
 
 def conv2d(x, W):
@@ -14,6 +15,7 @@ def leaky_relu(x, alpha=.5, max_value=None):
     '''
     return tf.maximum(alpha * x, x)
 
+@register_model("h_cnn_rnn")
 def h_cnn_rnn(h_params, mode, features_map, target):
     features = features_map['features']
     sequence_length = features_map['length']
@@ -83,10 +85,13 @@ def h_cnn_rnn(h_params, mode, features_map, target):
         s.add_hidden_layers_summary(tensors=states, name=vs.name + "_state")
 
     with tf.variable_scope('logits') as vs:
-        logits = tf.contrib.layers.fully_connected(inputs=outputs[-1],
-                                                   num_outputs=h_params.num_class[h_params.e_type],
-                                                   activation_fn=None,
-                                                   scope=vs)
+        if h_params.multi_task:
+            logits = output_layer.multi_task_logits(outputs[-1], h_params.h_layer_size[-1], features_map['ticker'], h_params)
+        else:
+            logits = tf.contrib.layers.fully_connected(inputs=outputs[-1],
+                                                       num_outputs=h_params.num_class[h_params.e_type],
+                                                       activation_fn=None,
+                                                       scope=vs)
         s.add_hidden_layer_summary(logits, vs.name)
 
         predictions, losses = output_layer.losses(logits, target, mode=mode, h_params=h_params)
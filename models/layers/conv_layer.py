@@ -83,16 +83,72 @@ def gated_conv2d_trough_time(x, filter_size, in_channel, out_channel, rate=[1,1]
         T = tf.sigmoid(conv_gate, name='transform_gate')
 
         # debugging
-        tf.summary.histogram(vs.name + "_weight_filter", W)
-        tf.summary.histogram(vs.name + '_bias_filter', b)
-        tf.summary.histogram(vs.name + '_weight_gate', W_t)
-        tf.summary.histogram(vs.name + '_bias_gate', b_t)
+        s.histogram(vs.name + "_weight_filter", W)
+        s.histogram(vs.name + '_bias_filter', b)
+        s.histogram(vs.name + '_weight_gate', W_t)
+        s.histogram(vs.name + '_bias_gate', b_t)
         s._norm_summary(W, vs.name)
         s._norm_summary(W_t, vs.name)
 
         return tf.multiply(H, T)
 
 
+def causal_gated_conv1d(x, filter_size, in_channel, out_channel, rate=1, name="gated_causal_cnn"):
+    '''
+    Compute a gated convolution trough time that never looks at future time_stamps.
+    tanh(conv(x, W)) * sigmoid(conv(x, W_t)) as in gated_conv1d, but the filter slides over the time dimension
+    with the given dilation rate. The input is left padded, so the output at time t only depends on
+    x[t - (filter_size - 1) * rate], ..., x[t] and all the time_stamps are computed in parallel.
+    :param x: input data -> [mini batch, 1, time_stamp, in_channel]
+    :param filter_size: filter size in time
+    :param in_channel: number of input channel
+    :param out_channel: number of output channel
+    :param rate: dilation rate trough time
+    :param name: scope name
+    :return: [mini batch, 1, time_stamp, out_channel]
+    '''
+    with tf.variable_scope(name) as vs:
+        filter_shape = [1, filter_size, in_channel, out_channel]
+        # variable definition
+        W = tf.get_variable('weight_filter', shape=filter_shape,
+                            initializer=tf.contrib.layers.xavier_initializer_conv2d(),
+                            regularizer=None)
+
+        b = tf.get_variable('bias_filter', shape=[out_channel],
+                            initializer=tf.constant_initializer(0.))
+
+        W_t = tf.get_variable('weight_gate', shape=filter_shape,
+                              initializer=tf.contrib.layers.xavier_initializer_conv2d())
+
+        b_t = tf.get_variable('bias_gate', shape=out_channel,
+                              initializer=tf.constant_initializer(0.))
+
+        # causal padding -> only the past is visible
+        padding = (filter_size - 1) * rate
+        x = tf.pad(x, [[0, 0], [0, 0], [padding, 0], [0, 0]])
+
+        # convolution
+        conv_filter = dilatete_trough_time_conv2d(x, W, strides=[1, 1, 1, 1], padding="VALID", rate=[1, rate])
+        conv_gate = dilatete_trough_time_conv2d(x, W_t, strides=[1, 1, 1, 1], padding="VALID", rate=[1, rate])
+
+        conv_filter = tf.add(conv_filter, b)
+        conv_gate = tf.add(conv_gate, b_t)
+
+        # gates
+        H = tf.tanh(conv_filter, name='activation')
+        T = tf.sigmoid(conv_gate, name='transform_gate')
+
+        # debugging
+        s.histogram(vs.name + "_weight_filter", W)
+        s.histogram(vs.name + '_bias_filter', b)
+        s.histogram(vs.name + '_weight_gate', W_t)
+        s.histogram(vs.name + '_bias_gate', b_t)
+        s._norm_summary(W, vs.name + '_filter')
+        s._norm_summary(W_t, vs.name + '_gate')
+
+        return tf.multiply(H, T)
+
+
 def depthwise_gated_conv1d(x, filter_size, in_channel, channel_multiply,
                           strides=[1, 1, 1, 1],
                           padding="VALID",
@@ -150,11 +206,11 @@ def depthwise_gated_conv1d(x, filter_size, in_channel, channel_multiply,
         T = tf.sigmoid(conv_gate, name='transform_gate')
 
         # debugging
-        tf.summary.histogram(vs.name + "_weight_filter", W)
-        tf.summary.histogram(vs.name + '_weight_gate', W_t)
-        tf.summary.histogram(vs.name + '_bias_gate', b_t)
+        s.histogram(vs.name + "_weight_filter", W)
+        s.histogram(vs.name + '_weight_gate', W_t)
+        s.histogram(vs.name + '_bias_gate', b_t)
         if not batch_norm.apply:
-            tf.summary.histogram(vs.name + '_bias_filter', b)
+            s.histogram(vs.name + '_bias_filter', b)
 
         s._norm_summary(W, vs.name + '_filter')
         s._norm_summary(W_t, vs.name + '_gate')
@@ -190,10 +246,10 @@ def gated_conv1d(x, filter_size, in_channel, out_channel, strides=[1, 1, 1, 1],
         T = tf.sigmoid(conv_gate, name='transform_gate')
 
         # debugging
-        tf.summary.histogram(vs.name + "_weight_filter", W)
-        tf.summary.histogram(vs.name + '_bias_filter', b)
-        tf.summary.histogram(vs.name + '_weight_gate', W_t)
-        tf.summary.histogram(vs.name + '_bias_gate', b_t)
+        s.histogram(vs.name + "_weight_filter", W)
+        s.histogram(vs.name + '_bias_filter', b)
+        s.histogram(vs.name + '_weight_gate', W_t)
+        s.histogram(vs.name + '_bias_gate', b_t)
         s._norm_summary(W, vs.name + '_filter')
         s._norm_summary(W_t, vs.name + '_gate')
 
@@ -232,10 +288,10 @@ def highway_conv1d(x, filter_size, in_channel, out_channel, strides=[1, 1, 1, 1]
         C = tf.subtract(1.0, T, name='carry_gate')
 
         # debugging
-        tf.summary.histogram(vs.name + "_weight_filter", W)
-        tf.summary.histogram(vs.name + '_bias_filter', b)
-        tf.summary.histogram(vs.name + '_weight_gate', W_t)
-        tf.summary.histogram(vs.name + '_bias_gate', b_t)
+        s.histogram(vs.name + "_weight_filter", W)
+        s.histogram(vs.name + '_bias_filter', b)
+        s.histogram(vs.name + '_weight_gate', W_t)
+        s.histogram(vs.name + '_bias_gate', b_t)
         s._norm_summary(W, vs.name)
         s._norm_summary(W_t, vs.name)
 
@@ -270,8 +326,8 @@ def conv1d(x, filter_size, in_channel, out_channel,
         if activation_fn:
             activation = activation_fn(activation)
 
-        tf.summary.histogram(vs.name + '_filter', W)
+        s.histogram(vs.name + '_filter', W)
         if not batch_norm.apply:
-            tf.summary.histogram(vs.name + '_biases_filter', b)
+            s.histogram(vs.name + '_biases_filter', b)
         s._norm_summary(W, vs.name)
     return activation
\ No newline at end of file
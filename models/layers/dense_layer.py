@@ -4,10 +4,12 @@ from tensorflow.python.ops import nn, init_ops, standard_ops
 from tensorflow.contrib.layers.python.layers import initializers
 import utils.summarizer as s
 import utils.func_utils as fu
+from models.registry import register_layer
 
 
 
 
+@register_layer("highway_dense_layer_ot")
 def highway_dense_layer_ot(x, in_size, out_size, sequence_length, scope_name,
                                   activation_fn=tf.nn.elu,
                                   batch_norm=fu.create_BNParams()
@@ -19,6 +21,7 @@ def highway_dense_layer_ot(x, in_size, out_size, sequence_length, scope_name,
     return x
 
 
+@register_layer("gated_res_net_layer_ot")
 def gated_res_net_layer_ot(x, in_size, out_size, sequence_length, scope_name,
                         activation_fn=tf.nn.elu,
                         batch_norm=fu.create_BNParams()):
@@ -34,6 +37,7 @@ def gated_res_net_layer_ot(x, in_size, out_size, sequence_length, scope_name,
     return x
 
 
+@register_layer("gated_dense_layer_ot")
 def gated_dense_layer_ot(x, in_size, out_size, sequence_length, scope_name,
                          activation_fn=tf.nn.elu,
                          batch_norm=fu.create_BNParams(),
@@ -112,11 +116,11 @@ def gated_dense_layer_ot(x, in_size, out_size, sequence_length, scope_name,
         # proved to be the same weights
         s.add_hidden_layer_summary(layers_output[-1], vs.name)
 
-        tf.summary.histogram(vs.name + "_weight_filter", W)
-        tf.summary.histogram(vs.name + '_weight_gate', W_t)
+        s.histogram(vs.name + "_weight_filter", W)
+        s.histogram(vs.name + '_weight_gate', W_t)
         if not batch_norm.apply:
-            tf.summary.histogram(vs.name + '_bias_filter', b)
-            tf.summary.histogram(vs.name + '_bias_gate', b_t)
+            s.histogram(vs.name + '_bias_filter', b)
+            s.histogram(vs.name + '_bias_gate', b_t)
 
         s._norm_summary(W, vs.name + '_filter')
         s._norm_summary(W_t, vs.name + '_gate')
@@ -127,6 +131,7 @@ def gated_dense_layer_ot(x, in_size, out_size, sequence_length, scope_name,
 
 
 
+@register_layer("dense_layer_ot")
 def dense_layer_ot(x, in_size, out_size, sequence_length, scope_name,
                           activation_fn=tf.nn.elu,
                           batch_norm=fu.create_BNParams()
@@ -180,7 +185,7 @@ def dense_layer_ot(x, in_size, out_size, sequence_length, scope_name,
         # proved to be the same weights
         s.add_hidden_layer_summary(layers_output[-1], vs.name, weight=W)
         if not batch_norm.apply:
-            tf.summary.histogram(vs.name + '_bias', b)
+            s.histogram(vs.name + '_bias', b)
 
     return tf.concat(layers_output, axis=1)
 
@@ -1,4 +1,5 @@
 import tensorflow as tf
+import utils.summarizer as s
 
 def prediction_fn(logits, h_params):
     if "class" in h_params.e_type:
@@ -9,6 +10,34 @@ def prediction_fn(logits, h_params):
         return ValueError("Experiment type not defined")
 
 
+def multi_task_logits(x, in_size, ticker, h_params):
+    '''
+    Output layer with a different set of weights for every ticker, selected by the ticker id of the example.
+    The model below this layer is shared by all the tickers
+    :param x: output of the shared model [mini batch, in_size]
+    :param in_size: size of the shared output
+    :param ticker: ticker id of every example [mini batch]
+    :param h_params: hiper-parameters containing the tickers of the universe
+    :return: logits [mini batch, num_class]
+    '''
+    num_tickers = len(h_params.tickers)
+    out_size = h_params.num_class[h_params.e_type]
+    limit = (6. / (in_size + out_size)) ** 0.5
+
+    W = tf.get_variable('ticker_weights', shape=[num_tickers, in_size, out_size],
+                        initializer=tf.random_uniform_initializer(-limit, limit),
+                        collections=[tf.GraphKeys.WEIGHTS, tf.GraphKeys.GLOBAL_VARIABLES],
+                        trainable=True)
+    b = tf.get_variable('ticker_bias', shape=[num_tickers, out_size],
+                        initializer=tf.constant_initializer(0.),
+                        collections=[tf.GraphKeys.BIASES, tf.GraphKeys.GLOBAL_VARIABLES],
+                        trainable=True)
+
+    # [mini batch, 1, in_size] x [mini batch, in_size, out_size]
+    logits = tf.matmul(tf.expand_dims(x, 1), tf.gather(W, ticker))
+    return tf.squeeze(logits, axis=1) + tf.gather(b, ticker)
+
+
 def losses(logits, target, mode, h_params):
     predictions = prediction_fn(logits, h_params)
 
@@ -19,14 +48,14 @@ def losses(logits, target, mode, h_params):
         if "class" in h_params.e_type:
             if mode == tf.contrib.learn.ModeKeys.TRAIN:
                 t_accuracy = tf.contrib.metrics.streaming_accuracy(predictions, target)
-                tf.summary.scalar('train_accuracy', tf.reduce_mean(t_accuracy))
+                s.scalar('train_accuracy', tf.reduce_mean(t_accuracy))
 
             # Calculate the binary cross-entropy loss
             losses = tf.nn.sparse_softmax_cross_entropy_with_logits(logits=logits, labels=target, name='entropy')
         else:
             if mode == tf.contrib.learn.ModeKeys.TRAIN:
                 t_performance = tf.contrib.metrics.streaming_mean_squared_error(predictions, target)
-                tf.summary.scalar('train_MSE', tf.reduce_mean(t_performance))
+                s.scalar('train_MSE', tf.reduce_mean(t_performance))
 
             # Calculate the binary cross-entropy loss
             losses = tf.sqrt(tf.losses.mean_squared_error(predictions=predictions, labels=target))  # RMSE
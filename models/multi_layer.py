@@ -1,8 +1,10 @@
 import tensorflow as tf
 import utils.summarizer as s
+from models.registry import register_model
 
 
 
+@register_model("mlp")
 def mlp(h_params, mode, features_map, target):
     layers_output = []
     features = features_map['features']
@@ -45,7 +47,7 @@ def mlp(h_params, mode, features_map, target):
 
         elif mode == tf.contrib.learn.ModeKeys.TRAIN:
             t_accuracy = tf.contrib.metrics.streaming_accuracy(predictions, target)
-            tf.summary.scalar('train_accuracy', tf.reduce_mean(t_accuracy))
+            s.scalar('train_accuracy', tf.reduce_mean(t_accuracy))
 
         # Calculate the binary cross-entropy loss
         losses = tf.nn.sparse_softmax_cross_entropy_with_logits(logits=logits, labels=target, name='entropy')
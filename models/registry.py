@@ -0,0 +1,69 @@
+import importlib
+
+# module implementing every model, imported only when the model is requested
+MODEL_MODULES = {
+    "mlp": "models.multi_layer",
+    "simple_rnn": "models.simple_rnn",
+    "deep_rnn": "models.deep_rnn",
+    "cnn_rnn": "models.cnn_rnn",
+    "h_cnn_rnn": "models.hierarcical_cnn_rnn",
+    "dw_cnn_rnn": "models.depthwise_cnn_rnn",
+    "tcn": "models.temporal_cnn",
+}
+
+# module implementing every hidden layer usable as hidden_layer_type
+LAYER_MODULES = {
+    "dense_layer_ot": "models.layers.dense_layer",
+    "gated_dense_layer_ot": "models.layers.dense_layer",
+    "gated_res_net_layer_ot": "models.layers.dense_layer",
+    "highway_dense_layer_ot": "models.layers.dense_layer",
+}
+
+_models = {}
+_layers = {}
+
+
+def register_model(name):
+    '''
+    decorator used to register a model implementation under the given model_type
+    :param name: name used in hparams.model_type
+    '''
+    def decorator(model_impl):
+        _models[name] = model_impl
+        return model_impl
+    return decorator
+
+def register_layer(name):
+    '''
+    decorator used to register a hidden layer implementation under the given hidden_layer_type
+    :param name: name used in hparams.hidden_layer_type
+    '''
+    def decorator(layer_impl):
+        _layers[name] = layer_impl
+        return layer_impl
+    return decorator
+
+def get_model(name):
+    '''
+    get the implementation of a model, importing only its module
+    :param name: model type
+    :return: model implementation
+    '''
+    return _lookup(name, _models, MODEL_MODULES, "model")
+
+def get_layer(name):
+    '''
+    get the implementation of a hidden layer, importing only its module
+    :param name: hidden layer type
+    :return: layer implementation
+    '''
+    return _lookup(name, _layers, LAYER_MODULES, "hidden layer")
+
+def _lookup(name, registry, modules, kind):
+    if name not in registry:
+        if name not in modules:
+            raise ValueError("Unknown {} {}. Available: {}".format(kind, name, sorted(modules)))
+        importlib.import_module(modules[name])
+        if name not in registry:
+            raise ValueError("{} {} is not registered by {}".format(kind, name, modules[name]))
+    return registry[name]
@@ -1,6 +1,7 @@
 import tensorflow as tf
 from tensorflow.python.ops import nn
 import utils.summarizer as s
+from models.registry import register_model
 
 def parametric_relu(_x):
   alphas = tf.get_variable('alpha', _x.get_shape()[-1],
@@ -18,6 +19,7 @@ def leaky_relu(x, alpha=5., max_value=None):
     '''
     return tf.maximum(alpha * x, x)
 
+@register_model("simple_rnn")
 def simple_rnn(h_params, mode, features_map, target):
     features = features_map['features']
     sequence_length = features_map['length']
@@ -34,7 +36,8 @@ def simple_rnn(h_params, mode, features_map, target):
         # Define a lstm cell with tensorflow
         cell = tf.contrib.rnn.GRUCell(h_params.h_layer_size[-1],
                                        activation=tf.nn.tanh)
-        cell = tf.contrib.rnn.DropoutWrapper(cell, output_keep_prob=h_params.dropout)
+        if mode == tf.contrib.learn.ModeKeys.TRAIN:
+            cell = tf.contrib.rnn.DropoutWrapper(cell, output_keep_prob=h_params.dropout)
 
         # Get lstm cell output
         outputs, states = tf.contrib.rnn.static_rnn(cell, tf.unstack(features, axis=1),
@@ -62,7 +65,7 @@ def simple_rnn(h_params, mode, features_map, target):
 
         elif mode == tf.contrib.learn.ModeKeys.TRAIN:
             t_accuracy = tf.contrib.metrics.streaming_accuracy(predictions, target)
-            tf.summary.scalar('train_accuracy', tf.reduce_mean(t_accuracy))
+            s.scalar('train_accuracy', tf.reduce_mean(t_accuracy))
 
         # Calculate the binary cross-entropy loss
         losses = tf.nn.sparse_softmax_cross_entropy_with_logits(logits=logits, labels=target, name='entropy')
@@ -0,0 +1,69 @@
+import tensorflow as tf
+import utils.summarizer as s
+import models.layers.conv_layer as conv_layer
+import models.layers.output_layer as output_layer
+from models.registry import register_model
+
+
+@register_model("tcn")
+def tcn(h_params, mode, features_map, target):
+    '''
+    Temporal convolutional network.
+    Stack of residual blocks of dilated causal gated convolutions, every block doubling the receptive field.
+    Differently from the rnn models all the time_stamps are computed in parallel.
+    '''
+    features = features_map['features']
+    sequence_length = features_map['length']
+    n_channel = h_params.h_layer_size[-1]
+
+    # [mini batch, time_stamp, feature] -> [mini batch, 1, time_stamp, feature]: the features are the input channels
+    filtered = tf.expand_dims(features, 1)
+
+    filtered = conv_layer.conv1d(filtered,
+                                 filter_size=1,
+                                 in_channel=h_params.input_size,
+                                 out_channel=n_channel,
+                                 name="cnn_input_projection",
+                                 activation_fn=None)
+
+    for layer_idx, rate in enumerate(h_params.dilation_rates):
+        with tf.variable_scope('residual_{}'.format(layer_idx)):
+            gated = conv_layer.causal_gated_conv1d(filtered,
+                                                   filter_size=h_params.causal_filter_size,
+                                                   in_channel=n_channel,
+                                                   out_channel=n_channel,
+                                                   rate=rate,
+                                                   name="gated_causal_cnn")
+
+            residual = conv_layer.conv1d(gated,
+                                         filter_size=1,
+                                         in_channel=n_channel,
+                                         out_channel=n_channel,
+                                         name="cnn_residual",
+                                         activation_fn=None)
+            filtered = tf.add(filtered, residual)     # skip-trough connection
+
+    with tf.variable_scope('tcn') as vs:
+        outputs = tf.squeeze(filtered, axis=1)
+        # output of the last valid time_stamp of every sequence
+        last_idx = tf.stack([tf.range(tf.shape(outputs)[0]),
+                             tf.cast(sequence_length, tf.int32) - 1], axis=1)
+        output = tf.gather_nd(outputs, last_idx)
+        s.add_hidden_layer_summary(activation=output, name=vs.name + "_output")
+
+    with tf.variable_scope('logits') as vs:
+        if h_params.multi_task:
+            logits = output_layer.multi_task_logits(output, n_channel, features_map['ticker'], h_params)
+        else:
+            logits = tf.contrib.layers.fully_connected(inputs=output,
+                                                       num_outputs=h_params.num_class[h_params.e_type],
+                                                       activation_fn=None,
+                                                       scope=vs)
+        s.add_hidden_layer_summary(logits, vs.name)
+
+        predictions, losses = output_layer.losses(logits, target, mode=mode, h_params=h_params)
+        if mode == tf.contrib.learn.ModeKeys.INFER:
+            return predictions, None
+
+    mean_loss = tf.reduce_mean(losses, name='mean_loss')
+    return predictions, mean_loss
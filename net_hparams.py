@@ -1,11 +1,31 @@
+import json
+import os
 from collections import namedtuple
 from utils.extraction_functions import compute_return
 
 KEYS = ['Open', 'High', 'Low', 'Close', 'Volume', 'A/D', 'Adj_Open', 'Adj_High','Adj_Low', 'Adj_Close', 'Adj_Volume',
         'MA_long', 'MA_short', 'MA_medium', 'MACD_long', 'MACD_short', 'PPO_long', 'PPO_short', 'SL']
 SL = 20
+TICKERS = ['apple']             # universe of the multi-task model, the position in the list is the ticker id
 EXPERIMENT_TYPE = "reg"         # reg, class
-MODEL_TYPE = "deep_rnn"         # deep_rnn, cnn_rnn, ecc.
+HPARAMS_FILE = "hparams.json"
+MODEL_TYPE = "deep_rnn"         # deep_rnn, cnn_rnn, tcn, ecc.
+
+def is_sequential(model_type):
+    '''
+    check if the model consume the features as a sequence of time_stamps
+    :param model_type: name of the model
+    '''
+    return "rnn" in model_type or "tcn" in model_type
+
+
+def feature_keys(h_params):
+    '''
+    order of the features along the last dimension of the sequential features tensor
+    :param h_params: hiper-parameters containing the KEYS
+    '''
+    return sorted(h_params.KEYS)
+
 
 FPramas = namedtuple(
     "FPramas",
@@ -16,7 +36,8 @@ FPramas = namedtuple(
         "e_type",
         "return_type",
         "sequence_length",
-        "model_type"
+        "model_type",
+        "tickers"
     ]
 )
 
@@ -30,7 +51,8 @@ def create_fparams(model_type=MODEL_TYPE):
         e_type=EXPERIMENT_TYPE,
         return_type={"raw": lambda x: x,
                      "relative": compute_return},
-        model_type=model_type
+        model_type=model_type,
+        tickers=TICKERS
     )
 
 
@@ -41,6 +63,10 @@ HParams = namedtuple(
         "eval_batch_size",
         "learning_rate",
         "optimizer",
+        "clip_gradients",
+        "accumulate_steps",
+        "lr_scaling",
+        "warmup_steps",
         "h_layer_size",
         "input_size",
         "num_class",
@@ -51,9 +77,19 @@ HParams = namedtuple(
         "model_type",
         "one_by_one_out_filters",
         "one_by_all_out_filters",
+        "causal_filter_size",
+        "dilation_rates",
         "KEYS",
         "hidden_layer_type",
-        "e_type"
+        "e_type",
+        "summary_level",
+        "summary_every_n_steps",
+        "tickers",
+        "multi_task",
+        "input_normalization",
+        "feature_shift",
+        "feature_scale",
+        "batch_norm"
     ])
 
 def create_hparams(model_type=MODEL_TYPE, hidden_layer_type="dense_layer_over_time"):
@@ -64,6 +100,10 @@ def create_hparams(model_type=MODEL_TYPE, hidden_layer_type="dense_layer_over_ti
         eval_batch_size=30,
         optimizer="Adam",
         learning_rate=0.01,
+        clip_gradients=2.0,                 # max global norm of the (accumulated) gradient
+        accumulate_steps=1,                 # micro-batches accumulated before an update, effective batch of batch_size * accumulate_steps
+        lr_scaling="none",                  # none, linear, sqrt: scale learning_rate with accumulate_steps
+        warmup_steps=0,                     # training steps of linear learning rate warm-up
         h_layer_size=[19, 19, 47],
         input_size=19,
         num_class={"reg":1,
@@ -73,8 +113,44 @@ def create_hparams(model_type=MODEL_TYPE, hidden_layer_type="dense_layer_over_ti
         l2_reg=0.00,
         one_by_one_out_filters=5,
         one_by_all_out_filters=3,
+        causal_filter_size=2,
+        dilation_rates=[1, 2, 4, 8, 16],    # receptive field of 1 + (causal_filter_size - 1) * sum(dilation_rates) days
         KEYS=KEYS,
         hidden_layer_type=hidden_layer_type,
-        e_type=EXPERIMENT_TYPE
+        e_type=EXPERIMENT_TYPE,
+        summary_level="scalars",            # off, scalars, full
+        summary_every_n_steps=100,
+        tickers=TICKERS,
+        multi_task=False,                   # one model with a shared trunk and an output layer per ticker
+        input_normalization="none",         # none, zscore, robust: normalize the features with the train split statistics
+        feature_shift=None,                 # [tickers][features] set from the dataset manifests by the training
+        feature_scale=None,
+        batch_norm=True                     # batch norm in the hidden layers, can be dropped with normalized inputs
+
+    )
+
+
+def save_hparams(hparams, model_dir):
+    '''
+    save the hiper-parameters used to train a model next to its checkpoints
+    :param hparams: hiper-parameters to save
+    :param model_dir: directory of the model
+    '''
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, HPARAMS_FILE), 'w') as f:
+        json.dump(hparams._asdict(), f, indent=2, sort_keys=True)
 
-    )
\ No newline at end of file
+def load_hparams(model_dir, **kwargs):
+    '''
+    load the hiper-parameters saved in a model directory.
+    Fields missing in the file (or the whole file) fall back to the defaults of create_hparams
+    :param model_dir: directory of the model
+    :param kwargs: arguments passed to create_hparams to create the defaults
+    '''
+    hparams = create_hparams(**kwargs)
+    full_path = os.path.join(model_dir, HPARAMS_FILE)
+    if os.path.exists(full_path):
+        with open(full_path) as f:
+            values = json.load(f)
+        hparams = hparams._replace(**{key: value for key, value in values.items() if key in hparams._fields})
+    return hparams
@@ -0,0 +1,123 @@
+import json
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import tensorflow as tf
+
+from utils.inference import FrozenPredictor
+from utils.serving import MicroBatcher
+
+tf.flags.DEFINE_integer("loglevel", 20, "Tensorflow log level")
+tf.flags.DEFINE_string("export_dir", None, "Directory of the graph exported by export_model.py")
+tf.flags.DEFINE_string("host", "localhost", "Address the server listens on")
+tf.flags.DEFINE_integer("port", 8500, "Port the server listens on")
+tf.flags.DEFINE_integer("max_batch_size", 256, "Max windows predicted in a single batch")
+tf.flags.DEFINE_float("max_latency_ms", 5., "Max time a request waits to be batched with other requests")
+tf.flags.DEFINE_integer("intra_op_threads", 0, "Threads used inside a single op, 0 lets tensorflow decide")
+tf.flags.DEFINE_integer("inter_op_threads", 0, "Ops executed in parallel, 0 lets tensorflow decide")
+FLAGS = tf.flags.FLAGS
+
+
+def parse_request(body, hparams):
+    '''
+    :param body: JSON with "features" [windows, sequence_length, input_size], optionally "length" and "ticker".
+        The ticker ids are required by the multi-task and the normalized models
+    :param hparams: hiper-parameters of the exported model
+    :return: features, length, ticker arrays
+    '''
+    request = json.loads(body.decode("utf-8"))
+    features = np.asarray(request["features"], dtype=np.float32)
+    if features.ndim == 2:
+        features = features[np.newaxis]
+    if features.shape[1:] != (hparams.sequence_length, hparams.input_size):
+        raise ValueError("Wrong window shape {}, expected [windows, {}, {}]".format(
+            list(features.shape), hparams.sequence_length, hparams.input_size))
+
+    num_windows = len(features)
+    if "ticker" not in request and (hparams.multi_task or hparams.input_normalization != "none"):
+        raise ValueError("The model needs the ticker of every window")
+    length = np.asarray(request.get("length", [hparams.sequence_length] * num_windows), dtype=np.int64).reshape(-1)
+    ticker = np.asarray(request.get("ticker", [0] * num_windows), dtype=np.int64).reshape(-1)
+    if len(length) != num_windows or len(ticker) != num_windows:
+        raise ValueError("length and ticker need a value per window")
+    # checked here, a bad id inside a micro-batch would fail the requests of the other clients too
+    if ((ticker < 0) | (ticker >= len(hparams.tickers))).any():
+        raise ValueError("Ticker ids have to be in [0, {})".format(len(hparams.tickers)))
+    return features, length, ticker
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def create_handler(batcher, hparams):
+
+    class PredictionHandler(BaseHTTPRequestHandler):
+        """POST /predict returns the predictions of the windows, GET /stats the latency and queue depth."""
+
+        def do_POST(self):
+            if self.path != "/predict":
+                return self._reply(404, {"error": "unknown path {}".format(self.path)})
+            try:
+                features, length, ticker = parse_request(self.rfile.read(int(self.headers["Content-Length"])), hparams)
+            except (ValueError, KeyError, TypeError) as e:
+                return self._reply(400, {"error": str(e)})
+            try:
+                predictions = batcher.submit(features, length, ticker).result()
+            except Exception as e:
+                return self._reply(500, {"error": str(e)})
+            self._reply(200, {"predictions": predictions.tolist()})
+
+        def do_GET(self):
+            if self.path == "/stats":
+                stats = batcher.stats.summary()
+                stats["queue_depth"] = batcher.queue_depth()
+                self._reply(200, stats)
+            elif self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            else:
+                self._reply(404, {"error": "unknown path {}".format(self.path)})
+
+        def _reply(self, code, content):
+            body = json.dumps(content).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # one line per request would dominate the latency
+            pass
+
+    return PredictionHandler
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.export_dir:
+        raise ValueError("You must specify the export directory")
+
+    predictor = FrozenPredictor(FLAGS.export_dir,
+                                intra_op_threads=FLAGS.intra_op_threads,
+                                inter_op_threads=FLAGS.inter_op_threads)
+    batcher = MicroBatcher(lambda features, length, ticker: predictor.predict(features, length, ticker)['predictions'],
+                           max_batch_size=FLAGS.max_batch_size,
+                           max_latency_ms=FLAGS.max_latency_ms)
+
+    server = ThreadingHTTPServer((FLAGS.host, FLAGS.port), create_handler(batcher, predictor.hparams))
+    tf.logging.info("serving {} on http://{}:{}".format(FLAGS.export_dir, FLAGS.host, FLAGS.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        predictor.close()
+        print(json.dumps(batcher.stats.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    tf.app.run()
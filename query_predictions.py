@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+
+import data_set_helper as data_set
+import model_train
+import net_hparams
+from utils import predictions as pred
+from utils.prediction_cache import PredictionCache, checkpoint_fingerprint
+from utils.streaming import WindowedPredictor
+
+tf.flags.DEFINE_string("model_dir", None, "Directory to load model checkpoints from")
+tf.flags.DEFINE_string("cache_dir", None, "Directory of the prediction cache. Defaults to <model_dir>/prediction_cache")
+tf.flags.DEFINE_string("split", "test", "Dataset split containing the requested dates")
+tf.flags.DEFINE_string("tickers", None, "Comma separated tickers. Defaults to all the tickers of the model")
+tf.flags.DEFINE_string("start_date", None, "First date of the query, YYYY-MM-DD")
+tf.flags.DEFINE_string("end_date", None, "Last date of the query, YYYY-MM-DD")
+tf.flags.DEFINE_string("output_file", None, "CSV file of the result. Printed if not given")
+FLAGS = tf.flags.FLAGS
+
+
+def compute_missing(hparams, checkpoint_path, cache, fingerprint, windows, tickers, dates):
+    '''
+    predict only the requested windows that are not already in the cache
+    :return: number of computed predictions
+    '''
+    missing = cache.missing(fingerprint, tickers, dates)
+    if not missing.any():
+        return 0
+
+    # the mask is applied once, the batches are views of the selected windows
+    todo = {key: values[missing] for key, values in windows.items()}
+    predictor = WindowedPredictor(hparams, checkpoint_path)
+    predictions = np.concatenate([predictor.predict(todo['features'][start:start + hparams.eval_batch_size],
+                                                    todo['ticker'][start:start + hparams.eval_batch_size],
+                                                    todo['length'][start:start + hparams.eval_batch_size])
+                                  for start in range(0, len(todo['targets']), hparams.eval_batch_size)])
+    predictor.close()
+    cache.add(fingerprint, tickers[missing], dates[missing], predictions, todo['targets'])
+    return len(predictions)
+
+
+def write_result(result):
+    if FLAGS.output_file:
+        result.to_csv(FLAGS.output_file, index=False)
+        print("Wrote to {}".format(FLAGS.output_file))
+    else:
+        print(result.to_string(index=False))
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.model_dir:
+        raise ValueError("You must specify a model directory")
+
+    hparams = net_hparams.load_hparams(FLAGS.model_dir)
+    fingerprint, checkpoint_path = checkpoint_fingerprint(FLAGS.model_dir)
+    cache = PredictionCache(FLAGS.cache_dir or os.path.join(FLAGS.model_dir, "prediction_cache"))
+    removed = cache.invalidate(fingerprint)
+    if removed:
+        tf.logging.info("new checkpoint {}, removed the cache of {}".format(checkpoint_path, removed))
+
+    requested_tickers = FLAGS.tickers.split(",") if FLAGS.tickers else hparams.tickers
+    if cache.covered(fingerprint, FLAGS.split, requested_tickers, FLAGS.start_date, FLAGS.end_date):
+        result = cache.query(fingerprint, requested_tickers, FLAGS.start_date, FLAGS.end_date)
+        tf.logging.info("{} predictions from the cache".format(len(result)))
+        write_result(result)
+        return
+
+    files = [file_pattern for ticker in requested_tickers
+             for file_pattern in data_set.input_files(FLAGS.input_dir, ticker, FLAGS.split, hparams._replace(multi_task=False),
+                                                      model_train.OUTPUT_NAME_SUFFIX)]
+    windows = data_set.read_windows(files, hparams)
+    tickers = np.asarray(hparams.tickers)[windows['ticker']]
+    dates = pred.to_dates(windows['date'])
+
+    # examples exported without the date can not be cached
+    in_range = np.isin(tickers, requested_tickers) & ~np.isnat(dates)
+    if FLAGS.start_date:
+        in_range &= dates >= np.datetime64(FLAGS.start_date)
+    if FLAGS.end_date:
+        in_range &= dates <= np.datetime64(FLAGS.end_date)
+    windows = {key: values[in_range] for key, values in windows.items()}
+
+    computed = compute_missing(hparams, checkpoint_path, cache, fingerprint, windows, tickers[in_range], dates[in_range])
+    cache.add_coverage(fingerprint, FLAGS.split, requested_tickers, FLAGS.start_date, FLAGS.end_date)
+    result = cache.query(fingerprint, requested_tickers, FLAGS.start_date, FLAGS.end_date)
+    tf.logging.info("{} predictions, {} computed, {} from the cache".format(len(result), computed, len(result) - computed))
+    write_result(result)
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import data_set_helper as data_set
+import model_train
+import net_hparams
+from utils import streaming
+
+tf.flags.DEFINE_string("model_dir", None, "Directory to load model checkpoints from")
+tf.flags.DEFINE_integer("num_windows", 512, "Test windows used by the consistency check")
+tf.flags.DEFINE_float("tolerance", 1e-4, "Max absolute difference between streaming and windowed predictions")
+tf.flags.DEFINE_integer("benchmark_updates", 100, "Daily updates timed for the streaming and the windowed inference")
+FLAGS = tf.flags.FLAGS
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    if not FLAGS.model_dir:
+        raise ValueError("You must specify a model directory")
+
+    hparams = net_hparams.load_hparams(FLAGS.model_dir)
+    checkpoint_path = tf.train.latest_checkpoint(FLAGS.model_dir)
+    windows = data_set.read_windows(data_set.input_files(FLAGS.input_dir, model_train.COMPANY_NAME, "test", hparams,
+                                                         model_train.OUTPUT_NAME_SUFFIX),
+                                    hparams)
+    full = windows['length'] == hparams.sequence_length
+    features = windows['features'][full][:FLAGS.num_windows]
+    tickers = windows['ticker'][full][:FLAGS.num_windows]
+    length = windows['length'][full][:FLAGS.num_windows]
+
+    windowed = streaming.WindowedPredictor(hparams, checkpoint_path)
+    reference = windowed.predict(features, tickers, length)
+    predictor = streaming.StreamingPredictor(hparams, checkpoint_path)
+    max_diff = streaming.consistency_check(predictor, reference, features, tickers)
+    print("streaming vs windowed on {} windows: max abs difference {:.2e}".format(len(features), max_diff))
+
+    # cost of a daily update of every ticker: one time_stamp per ticker against a full window per ticker
+    universe = sorted(set(tickers.tolist()))
+    observations = features[:len(universe), -1, :]
+    start_time = time.time()
+    for _ in range(FLAGS.benchmark_updates):
+        predictor.update(universe, observations)
+    streaming_secs = (time.time() - start_time) / FLAGS.benchmark_updates
+
+    start_time = time.time()
+    for _ in range(FLAGS.benchmark_updates):
+        windowed.predict(features[:len(universe)], np.asarray(universe))
+    windowed_secs = (time.time() - start_time) / FLAGS.benchmark_updates
+    predictor.close()
+    windowed.close()
+    print("daily update of {} tickers: streaming {:.2f}ms, windowed {:.2f}ms".format(
+        len(universe), streaming_secs * 1000., windowed_secs * 1000.))
+
+    if max_diff > FLAGS.tolerance:
+        raise ValueError("Streaming predictions differ from the windowed ones by {}".format(max_diff))
+
+
+if __name__ == "__main__":
+    tf.app.run()
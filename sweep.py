@@ -0,0 +1,286 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import random
+import time
+import traceback
+from collections import namedtuple
+
+import pandas as pd
+import tensorflow as tf
+
+import model_helper as model
+import model_train
+import net_hparams
+from utils.trial_scheduler import SuccessiveHalving
+
+tf.flags.DEFINE_string("sweep_type", "grid", "Search over SEARCH_SPACE: grid or random")
+tf.flags.DEFINE_integer("num_trials", 10, "Number of trials sampled by the random search")
+tf.flags.DEFINE_integer("max_workers", 3, "Number of trials trained in parallel")
+tf.flags.DEFINE_integer("intra_op_threads", 0, "Threads used inside a single op by every trial. 0 splits the cores among the workers")
+tf.flags.DEFINE_integer("inter_op_threads", 0, "Ops executed in parallel by every trial. 0 splits the cores among the workers")
+tf.flags.DEFINE_integer("train_steps", model_train.TRAIN_STEPS, "Number of training steps of every trial")
+tf.flags.DEFINE_integer("seed", None, "Seed of the random search")
+tf.flags.DEFINE_string("scheduler", "none", "Trial scheduler: none trains every trial for train_steps, asha uses successive halving")
+tf.flags.DEFINE_integer("min_steps", 1000, "Training steps of the first rung of the successive halving")
+tf.flags.DEFINE_integer("reduction_factor", 3, "Successive halving: keep the top 1/reduction_factor trials of every rung")
+tf.flags.DEFINE_string("sweep_metric", "loss", "Validation metric used to compare and early stop the trials")
+tf.flags.DEFINE_boolean("sweep_metric_minimize", True, "True if the sweep_metric has to be minimized")
+tf.flags.DEFINE_integer("early_stopping_rounds", 0, "Stop a trial if the sweep_metric didn't improve for this many steps. 0 disables it")
+tf.flags.DEFINE_integer("trial_timeout_secs", 0, "Successive halving: a job without a result after this many seconds is failed. 0 disables it")
+FLAGS = tf.flags.FLAGS
+
+SWEEP_DIR = os.path.abspath("./debug/sweep_{}")
+SUMMARY_FILE = "summary.csv"
+
+# values explored for every HParams field
+SEARCH_SPACE = {
+    "hidden_layer_type": model_train.HIDDEN_LAYER_TYPES,
+}
+
+Trial = namedtuple(
+    "Trial",
+    [
+        "trial_id",
+        "overrides",        # HParams fields changed respect to create_hparams
+        "model_dir"
+    ])
+
+TrainArgs = namedtuple(
+    "TrainArgs",
+    [
+        "input_dir",
+        "steps",
+        "eval_every",
+        "num_epochs",
+        "intra_op_threads",
+        "inter_op_threads",
+        "early_stopping_rounds",
+        "early_stopping_metric",
+        "early_stopping_metric_minimize",
+        "checkpoint_policy"         # CheckpointPolicy of the async checkpoints, None for the estimator checkpoints
+    ])
+
+
+def grid_search(space):
+    '''
+    all the combinations of the values in the search space
+    :param space: dictionary HParams field -> list of values
+    :return: list of HParams overrides
+    '''
+    keys = sorted(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*[space[key] for key in keys])]
+
+def random_search(space, num_trials, seed=None):
+    '''
+    sample uniformly the values in the search space
+    :param space: dictionary HParams field -> list of values
+    :param num_trials: number of configuration to sample
+    :param seed: random seed
+    :return: list of HParams overrides
+    '''
+    rng = random.Random(seed)
+    return [{key: rng.choice(space[key]) for key in sorted(space)} for _ in range(num_trials)]
+
+def create_trials(overrides, sweep_dir):
+    return [Trial(trial_id=trial_id,
+                  overrides=trial_overrides,
+                  model_dir=os.path.join(sweep_dir, "trial_{}".format(trial_id)))
+            for trial_id, trial_overrides in enumerate(overrides)]
+
+def thread_budget(max_workers, num_threads=0):
+    '''
+    threads given to every trial. If not specified the cores are split among the workers
+    '''
+    if num_threads > 0:
+        return num_threads
+    return max(1, multiprocessing.cpu_count() // max_workers)
+
+
+def run_trial(trial, train_args, max_steps=None, rung=None):
+    '''
+    train a single configuration
+    :param trial: trial to train
+    :param train_args: TrainArgs
+    :param max_steps: if given train up to this global step, resuming from the last checkpoint of the trial
+    :param rung: rung of the successive halving, only reported in the summary
+    :return: a row of the summary table
+    '''
+    hparams = net_hparams.create_hparams()._replace(**trial.overrides)
+    config = model.create_run_config(hparams,
+                                     save_checkpoints_secs=None if train_args.checkpoint_policy else FLAGS.checkpoint_every_secs,
+                                     intra_op_threads=train_args.intra_op_threads,
+                                     inter_op_threads=train_args.inter_op_threads)
+
+    row = {"trial_id": trial.trial_id, "model_dir": trial.model_dir, "rung": rung, "max_steps": max_steps}
+    row.update(trial.overrides)
+    start_time = time.time()
+    try:
+        metrics = model_train.train(hparams, trial.model_dir,
+                                    input_dir=train_args.input_dir,
+                                    steps=train_args.steps,
+                                    eval_every=train_args.eval_every,
+                                    num_epochs=train_args.num_epochs,
+                                    config=config,
+                                    max_steps=max_steps,
+                                    early_stopping_rounds=train_args.early_stopping_rounds,
+                                    early_stopping_metric=train_args.early_stopping_metric,
+                                    early_stopping_metric_minimize=train_args.early_stopping_metric_minimize,
+                                    checkpoint_policy=train_args.checkpoint_policy)
+        row.update({key: value.item() if hasattr(value, "item") else value for key, value in metrics.items()})
+    except Exception:
+        # a failing configuration must not stop the whole sweep
+        row["error"] = traceback.format_exc()
+    row["train_secs"] = time.time() - start_time
+    return row
+
+def _run_trial(args):
+    return run_trial(*args)
+
+def failed_row(trial, max_steps, rung, error, train_secs):
+    '''
+    summary row of a job that did not return its own row, e.g. a worker killed by the OS or a timeout
+    '''
+    row = {"trial_id": trial.trial_id, "model_dir": trial.model_dir, "rung": rung, "max_steps": max_steps,
+           "error": error, "train_secs": train_secs}
+    row.update(trial.overrides)
+    return row
+
+
+def run_sweep(trials, train_args, max_workers):
+    '''
+    Train the trials in a pool of processes. Every trial runs in a new process with its own thread budget
+    :param trials: list of Trial
+    :param train_args: TrainArgs shared by all the trials
+    :param max_workers: number of trials trained in parallel
+    :return: DataFrame with one row per trial
+    '''
+    pool = multiprocessing.Pool(processes=max_workers, maxtasksperchild=1)
+    rows = []
+    try:
+        for row in pool.imap_unordered(_run_trial, [(trial, train_args) for trial in trials]):
+            tf.logging.info("trial {} finished in {:.1f}s".format(row["trial_id"], row["train_secs"]))
+            rows.append(row)
+    finally:
+        pool.close()
+        pool.join()
+    return pd.DataFrame(rows).sort_values("trial_id")
+
+
+def run_successive_halving(trials, train_args, max_workers, scheduler, metric, timeout_secs=None):
+    '''
+    Train the trials in a pool of processes, allocating the steps with the successive halving scheduler.
+    Stalled trials are stopped by the early stopping of train_args, promoted trials resume from their checkpoint
+    :param trials: list of Trial
+    :param train_args: TrainArgs shared by all the trials
+    :param max_workers: number of jobs trained in parallel
+    :param scheduler: SuccessiveHalving scheduler
+    :param metric: validation metric reported to the scheduler
+    :param timeout_secs: a job without a result after this many seconds is reported as failed, None to wait forever.
+        A worker killed by the OS never returns its result, without a timeout the sweep would wait for it
+    :return: DataFrame with one row per job, a trial has a row for every rung it reached
+    '''
+    pool = multiprocessing.Pool(processes=max_workers, maxtasksperchild=1)
+    finished = queue.Queue()
+    rows = []
+    running = {}            # (trial_id, rung) -> start time of the jobs waiting for a result
+    timed_out = False
+
+    def report_failure(trial, max_steps, rung, start_time):
+        # the pool calls it with the exception of a job that could not return its row
+        return lambda error: finished.put(failed_row(trial, max_steps, rung, repr(error), time.time() - start_time))
+
+    try:
+        while True:
+            while len(running) < max_workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                trial_id, rung = job
+                max_steps = scheduler.rung_steps[rung]
+                start_time = time.time()
+                pool.apply_async(_run_trial,
+                                 ((trials[trial_id], train_args, max_steps, rung),),
+                                 callback=finished.put,
+                                 error_callback=report_failure(trials[trial_id], max_steps, rung, start_time))
+                running[job] = start_time
+
+            if not running:
+                break
+
+            try:
+                wait_secs = None if timeout_secs is None else max(0., min(running.values()) + timeout_secs - time.time())
+                row = finished.get(timeout=wait_secs)
+            except queue.Empty:
+                job = min(running, key=running.get)
+                timed_out = True
+                row = failed_row(trials[job[0]], scheduler.rung_steps[job[1]], job[1],
+                                 "no result after {}s".format(timeout_secs), time.time() - running[job])
+            if (row["trial_id"], row["rung"]) not in running:
+                # late result of a job already reported as failed
+                continue
+            del running[(row["trial_id"], row["rung"])]
+            scheduler.report(row["trial_id"], row["rung"], row.get(metric))
+            tf.logging.info("trial {} rung {} finished in {:.1f}s: {} {}".format(row["trial_id"], row["rung"],
+                                                                                row["train_secs"], metric,
+                                                                                row.get(metric)))
+            rows.append(row)
+    finally:
+        if timed_out:
+            # a hung worker would block the join forever
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    return pd.DataFrame(rows).sort_values(["trial_id", "rung"])
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    sweep_dir = SWEEP_DIR.format(int(time.time()))
+
+    if FLAGS.sweep_type == "grid":
+        overrides = grid_search(SEARCH_SPACE)
+    elif FLAGS.sweep_type == "random":
+        overrides = random_search(SEARCH_SPACE, FLAGS.num_trials, seed=FLAGS.seed)
+    else:
+        raise ValueError("Wrong sweep type {}".format(FLAGS.sweep_type))
+
+    train_args = TrainArgs(input_dir=FLAGS.input_dir,
+                           steps=FLAGS.train_steps,
+                           eval_every=FLAGS.eval_every,
+                           num_epochs=FLAGS.num_epochs,
+                           intra_op_threads=thread_budget(FLAGS.max_workers, FLAGS.intra_op_threads),
+                           inter_op_threads=thread_budget(FLAGS.max_workers, FLAGS.inter_op_threads),
+                           early_stopping_rounds=FLAGS.early_stopping_rounds or None,
+                           early_stopping_metric=FLAGS.sweep_metric,
+                           early_stopping_metric_minimize=FLAGS.sweep_metric_minimize,
+                           checkpoint_policy=model_train.create_checkpoint_policy())
+    trials = create_trials(overrides, sweep_dir)
+
+    if FLAGS.scheduler == "none":
+        summary = run_sweep(trials, train_args, FLAGS.max_workers)
+    elif FLAGS.scheduler == "asha":
+        scheduler = SuccessiveHalving(num_trials=len(trials),
+                                      min_steps=FLAGS.min_steps,
+                                      max_steps=FLAGS.train_steps,
+                                      reduction_factor=FLAGS.reduction_factor,
+                                      minimize=FLAGS.sweep_metric_minimize)
+        summary = run_successive_halving(trials, train_args, FLAGS.max_workers, scheduler, FLAGS.sweep_metric,
+                                         timeout_secs=FLAGS.trial_timeout_secs or None)
+        best = scheduler.best()
+        if best is not None:
+            print("best trial {} (rung {}): {} {}".format(best[0], best[1], FLAGS.sweep_metric, best[2]))
+    else:
+        raise ValueError("Wrong scheduler {}".format(FLAGS.scheduler))
+
+    full_path = os.path.join(sweep_dir, SUMMARY_FILE)
+    os.makedirs(sweep_dir, exist_ok=True)
+    summary.to_csv(full_path, index=False)
+    print(summary.drop(["model_dir", "error"], axis=1, errors="ignore").to_string(index=False))
+    print("Wrote to {}".format(full_path))
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,45 @@
+import numpy as np
+
+from utils import backtest
+
+# 1 model, 3 days, 2 tickers. The second ticker has no target on the second day
+PREDICTIONS = np.array([[[0.5, -0.5],
+                         [0.5, 0.5],
+                         [-0.5, 0.5]]])
+TARGETS = np.array([[0.01, 0.02],
+                    [0.02, np.nan],
+                    [-0.01, 0.03]])
+
+
+def test_positions_hold_signals_for_the_holding_period():
+    signals = backtest.signals(PREDICTIONS, [0.])
+    position = backtest.positions(signals, [1, 2])
+
+    np.testing.assert_allclose(position[0, 0, 0], [[1, -1], [1, 1], [-1, 1]])
+    # mean of the signals of the last 2 days, the day before the first counts as flat
+    np.testing.assert_allclose(position[0, 0, 1], [[0.5, -0.5], [1, 0], [0, 1]])
+
+
+def test_signals_threshold():
+    signals = backtest.signals(PREDICTIONS, [0., 0.6])
+    np.testing.assert_allclose(signals[0, 1], np.zeros((3, 2)))
+
+
+def test_run_backtest_daily_returns_with_costs_and_missing_targets():
+    results = backtest.run_backtest(PREDICTIONS, TARGETS, thresholds=[0.], holding_periods=[1, 2], cost_bps=10.)
+
+    # holding 1 day: gross (pos * target) averaged on the tickers with a target, minus 10bps of the traded value
+    # day 0: (0.01 - 0.02) / 2 - 2 / 2 * 0.001, day 1: 0.02 / 1 - 1 / 1 * 0.001, day 2: (0.01 + 0.03) / 2 - 3 / 2 * 0.001
+    np.testing.assert_allclose(results["daily_returns"][0, 0, 0], [-0.006, 0.019, 0.0185])
+    # holding 2 days, the position of the ticker without target is closed on day 1
+    np.testing.assert_allclose(results["daily_returns"][0, 0, 1], [-0.003, 0.019, 0.014])
+
+    np.testing.assert_allclose(results["total_return"][0, 0, 0], 0.994 * 1.019 * 1.0185 - 1.)
+    np.testing.assert_allclose(results["turnover"][0, 0], [(1. + 1. + 1.5) / 3, (0.5 + 1. + 1.) / 3])
+    # the day without target is not invested, so it is neither a hit nor a miss
+    np.testing.assert_allclose(results["hit_rate"][0, 0], [4. / 5., 3. / 4.])
+
+
+def test_max_drawdown():
+    returns = np.array([0.1, -0.5, 0.2])
+    np.testing.assert_allclose(backtest.max_drawdown(returns), 0.5)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from utils import bootstrap
+
+# two tickers of 5 and 3 days, sorted by ticker and date as evaluate_predictions.align_models
+GROUPS = np.array(["AAA"] * 5 + ["BBB"] * 3)
+
+
+def test_group_sizes():
+    assert bootstrap.group_sizes(GROUPS) == [5, 3]
+    with pytest.raises(ValueError):
+        bootstrap.group_sizes(np.array(["AAA", "BBB", "AAA"]))
+
+
+def test_blocks_stay_in_their_ticker():
+    indices = bootstrap.grouped_block_bootstrap_indices([5, 3], 200, 4, np.random.RandomState(0))
+    assert indices.shape == (200, 8)
+    # every resample keeps the rows of a ticker in the positions of that ticker
+    assert (GROUPS[indices] == GROUPS).all()
+    # consecutive rows of a block are consecutive days of the ticker, wrapping around its own end
+    first = indices[:, :4]
+    assert (((first[:, 1:] - first[:, :-1]) % 5) == 1).all()
+
+
+def test_bootstrap_single_series():
+    predictions = np.array([[1., 2., 3., 4.]])
+    targets = np.array([1., 2., 3., 4.])
+    samples = bootstrap.bootstrap(predictions, targets, ["MAE"], num_resamples=10, block_size=2)
+    assert samples["MAE"].shape == (1, 10)
+    assert (samples["MAE"] == 0).all()
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+import model_helper
+import net_hparams
+import utils.summarizer as s
+
+
+def test_accumulated_train_op_with_summaries():
+    with tf.Graph().as_default():
+        global_step = tf.contrib.framework.get_or_create_global_step()
+        weights = tf.Variable([1., -1.], name="weights")
+        loss = tf.reduce_sum(tf.square(weights - [3., 2.]))
+
+        s.set_summary_level("scalars")
+        hparams = net_hparams.create_hparams()._replace(accumulate_steps=2, summary_level="scalars")
+        train_op = model_helper.create_train_op(loss, hparams)
+        summary_op = tf.summary.merge_all()
+
+        with tf.Session() as session:
+            session.run(tf.global_variables_initializer())
+            values = []
+            for _ in range(4):
+                # the summaries are fetched on the accumulation steps too
+                session.run([train_op, summary_op])
+                values.append(session.run(weights))
+
+            assert session.run(global_step) == 4
+            # the variables only change on the update steps, every accumulate_steps micro-batches
+            np.testing.assert_allclose(values[0], [1., -1.])
+            assert not np.allclose(values[1], values[0])
+            np.testing.assert_allclose(values[2], values[1])
+            assert not np.allclose(values[3], values[2])
@@ -0,0 +1,68 @@
+import json
+import multiprocessing
+import os
+import socket
+from collections import namedtuple
+
+AUTOTUNE_FILE = os.path.abspath("./debug/autotune.json")
+
+TuneConfig = namedtuple(
+    "TuneConfig",
+    [
+        "intra_op_threads",     # threads used inside a single op, 0 lets tensorflow decide
+        "inter_op_threads",     # ops executed in parallel, 0 lets tensorflow decide
+        "reader_threads",       # threads reading and parsing the TFRecords
+        "batch_size"
+    ])
+
+# used when no configuration was tuned for the model on this host
+DEFAULT_CONFIG = TuneConfig(intra_op_threads=0, inter_op_threads=0, reader_threads=1, batch_size=None)
+
+
+def config_key(model_type, mode, host=None):
+    '''
+    key of a tuned configuration: the best threads depend on the machine, the model and the graph executed
+    :param model_type: type of the model
+    :param mode: "train" or "infer"
+    :param host: host name, default to the current one
+    '''
+    host = host or socket.gethostname()
+    return "{}-{}cpu/{}/{}".format(host, multiprocessing.cpu_count(), model_type, mode)
+
+def load_best_config(model_type, mode, path=AUTOTUNE_FILE):
+    '''
+    load the best configuration tuned on this host
+    :param model_type: type of the model
+    :param mode: "train" or "infer"
+    :param path: file of the tuned configurations
+    :return: TuneConfig, DEFAULT_CONFIG if the model was never tuned on this host
+    '''
+    if not os.path.exists(path):
+        return DEFAULT_CONFIG
+    with open(path) as f:
+        configs = json.load(f)
+    values = configs.get(config_key(model_type, mode))
+    if values is None:
+        return DEFAULT_CONFIG
+    return DEFAULT_CONFIG._replace(**{key: value for key, value in values.items() if key in TuneConfig._fields})
+
+def save_best_config(model_type, mode, config, path=AUTOTUNE_FILE, **stats):
+    '''
+    save the best configuration of a model on this host, keeping the ones of the other models and hosts
+    :param model_type: type of the model
+    :param mode: "train" or "infer"
+    :param config: TuneConfig
+    :param path: file of the tuned configurations
+    :param stats: additional values stored with the configuration, e.g. the measured examples/sec
+    '''
+    configs = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            configs = json.load(f)
+    values = config._asdict()
+    values.update(stats)
+    configs[config_key(model_type, mode)] = values
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(configs, f, indent=2, sort_keys=True)
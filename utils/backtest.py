@@ -0,0 +1,116 @@
+"""Vectorized backtest of long/short strategies driven by the model predictions.
+All the models, thresholds and holding periods are evaluated together over a [dates, tickers] panel:
+the arrays have shape [models, thresholds, holding periods, dates, tickers]."""
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+
+def to_panel(table, columns, dates=None, tickers=None):
+    '''
+    pivot a prediction table in [dates, tickers] panels
+    :param table: DataFrame with date, ticker and the columns
+    :param columns: columns to pivot
+    :param dates: dates of the panel, default to the dates of the table
+    :param tickers: tickers of the panel, default to the tickers of the table
+    :return: dictionary column -> array [dates, tickers], NaN where the table has no row; dates; tickers
+    '''
+    dates = np.sort(table["date"].unique()) if dates is None else dates
+    tickers = np.sort(table["ticker"].unique()) if tickers is None else tickers
+    panels = {}
+    for column in columns:
+        panels[column] = table.pivot_table(index="date", columns="ticker", values=column, aggfunc="last")\
+            .reindex(index=dates, columns=tickers).values.astype(np.float64)
+    return panels, dates, tickers
+
+
+def signals(predictions, thresholds):
+    '''
+    long if the prediction is above the threshold, short if it is below -threshold, flat otherwise
+    :param predictions: array [models, dates, tickers]
+    :param thresholds: array [thresholds]
+    :return: array [models, thresholds, dates, tickers] in {-1, 0, 1}, 0 where the prediction is missing
+    '''
+    predictions = np.nan_to_num(predictions)[:, np.newaxis]
+    thresholds = np.asarray(thresholds, dtype=np.float64)[np.newaxis, :, np.newaxis, np.newaxis]
+    return np.sign(predictions) * (np.abs(predictions) > thresholds)
+
+def positions(signals, holding_periods):
+    '''
+    every signal is held for a holding period, overlapping with the signals of the following days:
+    the position of a day is the mean of the signals of the last holding_period days
+    :param signals: array [models, thresholds, dates, tickers]
+    :param holding_periods: array [holding periods]
+    :return: array [models, thresholds, holding periods, dates, tickers]
+    '''
+    num_dates = signals.shape[2]
+    holding_periods = np.asarray(holding_periods, dtype=np.int64)
+    # running sums with a leading zero day: the sum of the days (t - h, t] is cumsum[t + 1] - cumsum[t + 1 - h]
+    cumsum = np.concatenate([np.zeros_like(signals[:, :, :1]), np.cumsum(signals, axis=2)], axis=2)
+    end = np.arange(1, num_dates + 1)[np.newaxis, :]
+    start = np.maximum(end - holding_periods[:, np.newaxis], 0)
+    window_sums = cumsum[:, :, end] - cumsum[:, :, start]           # [models, thresholds, holding periods, dates, tickers]
+    return window_sums / holding_periods[np.newaxis, np.newaxis, :, np.newaxis, np.newaxis]
+
+
+def max_drawdown(returns):
+    '''
+    :param returns: array [..., dates] of daily returns
+    :return: array [...] with the largest relative loss from a peak of the equity curve
+    '''
+    equity = np.cumprod(1. + returns, axis=-1)
+    peaks = np.maximum.accumulate(np.maximum(equity, 1.), axis=-1)
+    return np.max(1. - equity / peaks, axis=-1)
+
+
+def run_backtest(predictions, targets, thresholds, holding_periods, cost_bps=0.):
+    '''
+    backtest every model with every threshold and holding period in one batched computation.
+    The portfolio is equal weighted on the tickers with a target on the day
+    :param predictions: array [models, dates, tickers] of predicted returns
+    :param targets: array [dates, tickers] of the realized returns the predictions refer to, NaN if missing
+    :param thresholds: array [thresholds] of min absolute prediction to open a position
+    :param holding_periods: array [holding periods] of days a position is kept
+    :param cost_bps: cost of trading, in basis points of the traded value
+    :return: dictionary metric -> array [models, thresholds, holding periods], plus "daily_returns"
+        [models, thresholds, holding periods, dates]
+    '''
+    available = ~np.isnan(targets)
+    targets = np.nan_to_num(targets)
+    position = positions(signals(predictions, thresholds), holding_periods) * available
+
+    num_tickers = np.maximum(available.sum(axis=1), 1)                                 # [dates]
+    gross = (position * targets).sum(axis=-1) / num_tickers
+    traded = np.abs(np.diff(position, axis=-2, prepend=0.)).sum(axis=-1) / num_tickers
+    daily_returns = gross - traded * cost_bps / 10000.
+
+    mean = daily_returns.mean(axis=-1)
+    std = daily_returns.std(axis=-1)
+    invested = position != 0
+    hits = invested & (np.sign(position) == np.sign(targets))
+    return {"total_return": np.prod(1. + daily_returns, axis=-1) - 1.,
+            "annual_return": mean * TRADING_DAYS,
+            "annual_volatility": std * np.sqrt(TRADING_DAYS),
+            "sharpe": np.where(std > 0, mean / np.where(std > 0, std, 1.) * np.sqrt(TRADING_DAYS), 0.),
+            "hit_rate": hits.sum(axis=(-2, -1)) / np.maximum(invested.sum(axis=(-2, -1)), 1),
+            "max_drawdown": max_drawdown(daily_returns),
+            "turnover": traded.mean(axis=-1),
+            "exposure": np.abs(position).sum(axis=-1).mean(axis=-1) / num_tickers.mean(),
+            "daily_returns": daily_returns}
+
+
+def results_table(results, model_names, thresholds, holding_periods):
+    '''
+    flatten the metrics of run_backtest in a table with a row per model and variant
+    '''
+    grid = np.meshgrid(np.arange(len(model_names)), np.arange(len(thresholds)), np.arange(len(holding_periods)),
+                       indexing="ij")
+    model_idx, threshold_idx, holding_idx = [axis.ravel() for axis in grid]
+    table = pd.DataFrame({"model": np.asarray(model_names)[model_idx],
+                          "threshold": np.asarray(thresholds)[threshold_idx],
+                          "holding_period": np.asarray(holding_periods)[holding_idx]})
+    for metric, values in results.items():
+        if metric != "daily_returns":
+            table[metric] = values.ravel()
+    return table
@@ -0,0 +1,180 @@
+"""Block bootstrap of the evaluation metrics on exported predictions.
+The resamples are index matrices [resamples, rows]: every metric is computed for all the resamples of a chunk
+with one vectorized expression, and the chunks are spread over a process pool.
+Blocks of consecutive rows of a ticker keep the autocorrelation of the daily returns in the resamples,
+a block never crosses from a ticker to the next one."""
+import multiprocessing
+
+import numpy as np
+
+REGRESSION_METRICS = ("MAE", "MSE", "MAPE", "directional_accuracy")
+CLASSIFICATION_METRICS = ("accuracy", "precision", "recall")
+
+
+def _mae(predictions, targets):
+    return np.mean(np.abs(predictions - targets), axis=-1)
+
+
+def _mse(predictions, targets):
+    return np.mean(np.square(predictions - targets), axis=-1)
+
+
+def _mape(predictions, targets):
+    # the rows with a zero target are skipped, they have no relative error
+    with np.errstate(divide="ignore", invalid="ignore"):
+        errors = np.abs((predictions - targets) / targets)
+    errors[~np.isfinite(errors)] = np.nan
+    return np.nanmean(errors, axis=-1) * 100.
+
+
+def _directional_accuracy(predictions, targets):
+    return np.mean(np.sign(predictions) == np.sign(targets), axis=-1)
+
+
+def _accuracy(predictions, targets):
+    return np.mean(predictions == targets, axis=-1)
+
+
+def _precision(predictions, targets):
+    predicted = predictions == 1
+    return np.sum(predicted & (targets == 1), axis=-1) / np.maximum(np.sum(predicted, axis=-1), 1)
+
+
+def _recall(predictions, targets):
+    positives = targets == 1
+    return np.sum(positives & (predictions == 1), axis=-1) / np.maximum(np.sum(positives, axis=-1), 1)
+
+
+METRIC_FNS = {"MAE": _mae,
+              "MSE": _mse,
+              "MAPE": _mape,
+              "directional_accuracy": _directional_accuracy,
+              "accuracy": _accuracy,
+              "precision": _precision,
+              "recall": _recall}
+
+
+def metric_names(e_type):
+    '''
+    :param e_type: type of the experiment "classification" or "regression"
+    '''
+    if "reg" in e_type:
+        return REGRESSION_METRICS
+    elif "clas" in e_type:
+        return CLASSIFICATION_METRICS
+    else:
+        raise ValueError("Wrong experiment type")
+
+
+def block_bootstrap_indices(num_rows, num_resamples, block_size, random_state):
+    '''
+    circular moving block bootstrap: every resample concatenates blocks of block_size consecutive rows
+    starting at random rows, wrapping around the end
+    :return: array [num_resamples, num_rows] of row indices
+    '''
+    block_size = max(1, min(block_size, num_rows))
+    num_blocks = -(-num_rows // block_size)
+    starts = random_state.randint(0, num_rows, size=(num_resamples, num_blocks))
+    indices = (starts[:, :, np.newaxis] + np.arange(block_size)) % num_rows
+    return indices.reshape(num_resamples, -1)[:, :num_rows]
+
+
+def group_sizes(groups):
+    '''
+    :param groups: array [rows] with the group of every row, the rows of a group are contiguous
+    :return: list with the number of rows of every group, in order
+    '''
+    groups = np.asarray(groups)
+    if len(groups) == 0:
+        return []
+    boundaries = np.flatnonzero(groups[1:] != groups[:-1]) + 1
+    sizes = np.diff(np.concatenate([[0], boundaries, [len(groups)]]))
+    if len(sizes) != len(np.unique(groups)):
+        raise ValueError("The rows of every group have to be contiguous")
+    return sizes.tolist()
+
+
+def grouped_block_bootstrap_indices(sizes, num_resamples, block_size, random_state):
+    '''
+    circular block bootstrap within every group: the rows of a group are resampled from the same group only,
+    so a resample keeps the number of rows of every group and no block crosses two groups
+    :param sizes: number of rows of every group, the groups are contiguous
+    :return: array [num_resamples, sum(sizes)] of row indices
+    '''
+    offsets = np.cumsum([0] + list(sizes[:-1]))
+    return np.concatenate([offset + block_bootstrap_indices(size, num_resamples, block_size, random_state)
+                           for offset, size in zip(offsets, sizes)], axis=1)
+
+
+def compute_metrics(predictions, targets, names):
+    '''
+    :param predictions: array [models, ..., rows]
+    :param targets: array [..., rows] broadcastable with predictions
+    :return: dictionary metric -> array [models, ...]
+    '''
+    return {name: METRIC_FNS[name](predictions, targets) for name in names}
+
+
+def _bootstrap_chunk(args):
+    predictions, targets, names, sizes, num_resamples, block_size, seed = args
+    indices = grouped_block_bootstrap_indices(sizes, num_resamples, block_size, np.random.RandomState(seed))
+    # [models, resamples, rows]: all the models are evaluated on the same resamples
+    return compute_metrics(predictions[:, indices], targets[indices], names)
+
+
+def bootstrap(predictions, targets, names, groups=None, num_resamples=1000, block_size=20, seed=0, num_workers=1,
+              chunk_size=100):
+    '''
+    bootstrap distribution of the metrics of every model
+    :param predictions: array [models, rows], the rows of a group in time order
+    :param targets: array [rows]
+    :param names: metrics to compute, keys of METRIC_FNS
+    :param groups: array [rows] with the ticker of every row, the rows of a ticker contiguous.
+        The blocks are drawn within every ticker. None if all the rows are a single series
+    :param num_resamples: number of bootstrap resamples
+    :param block_size: consecutive rows per block
+    :param seed: seed of the resamples, chunk i uses seed + i
+    :param num_workers: processes computing the chunks, 1 to run in this process
+    :param chunk_size: resamples per chunk, bounds the memory of the index matrices
+    :return: dictionary metric -> array [models, num_resamples]
+    '''
+    predictions = np.asarray(predictions, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    sizes = [len(targets)] if groups is None else group_sizes(groups)
+    chunks = [(predictions, targets, names, sizes, min(chunk_size, num_resamples - start), block_size, seed + idx)
+              for idx, start in enumerate(range(0, num_resamples, chunk_size))]
+
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            results = pool.map(_bootstrap_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_bootstrap_chunk(chunk) for chunk in chunks]
+    return {name: np.concatenate([result[name] for result in results], axis=1) for name in names}
+
+
+def confidence_interval(samples, confidence=0.95):
+    '''
+    percentile interval of the bootstrap samples
+    :param samples: array [..., resamples]
+    :return: lower, upper arrays [...]
+    '''
+    alpha = (1. - confidence) / 2.
+    return np.nanpercentile(samples, 100. * alpha, axis=-1), np.nanpercentile(samples, 100. * (1. - alpha), axis=-1)
+
+
+def paired_difference(samples, baseline=0, confidence=0.95):
+    '''
+    difference of every model with the baseline on the same resamples
+    :param samples: array [models, resamples] of a metric
+    :return: lower, upper arrays [models] of the interval of the difference;
+        array [models] with the two-sided bootstrap p-value of a zero difference
+    '''
+    differences = samples - samples[baseline]
+    lower, upper = confidence_interval(differences, confidence)
+    at_least = np.mean(differences >= 0, axis=-1)
+    at_most = np.mean(differences <= 0, axis=-1)
+    return lower, upper, np.minimum(1., 2. * np.minimum(at_least, at_most))
@@ -0,0 +1,225 @@
+import glob
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import tensorflow as tf
+
+STATS_FILE = "checkpoint_stats.json"
+
+CheckpointPolicy = namedtuple(
+    "CheckpointPolicy",
+    [
+        "every_n_secs",     # save a checkpoint every this many seconds, None to disable
+        "every_n_steps",    # save a checkpoint every this many global steps, None to disable
+        "keep_latest",      # most recent checkpoints kept, at least 2 so the one under evaluation is not removed
+        "keep_best"         # checkpoints with the best validation metric kept
+    ])
+
+
+def checkpoint_step(checkpoint_path):
+    '''
+    :return: global step of a <prefix>-<step> checkpoint path
+    '''
+    return int(checkpoint_path.rsplit("-", 1)[1])
+
+
+class AsyncCheckpointHook(tf.train.SessionRunHook):
+    """Save checkpoints without stopping the training.
+    The training thread only copies the variables in host memory, a background thread writes the copy
+    from its own graph and session. If the writer is still busy with the previous copy the save is skipped.
+    Only the keep_latest most recent checkpoints and the keep_best checkpoints with the best validation metric,
+    reported by CheckpointValidationMonitor, are kept on disk.
+    Use it with RunConfig(save_checkpoints_secs=None), so the estimator does not save checkpoints too."""
+
+    def __init__(self, model_dir, policy, minimize=True, checkpoint_basename="model.ckpt"):
+        if policy.keep_latest < 2:
+            raise ValueError("keep_latest has to be at least 2")
+        if not policy.every_n_secs and not policy.every_n_steps:
+            raise ValueError("Set every_n_secs or every_n_steps")
+        self.model_dir = model_dir
+        self.policy = policy
+        self.minimize = minimize
+        self._prefix = os.path.join(model_dir, checkpoint_basename)
+
+        self._lock = threading.Lock()
+        self._checkpoints = {}          # step -> checkpoint path
+        self._metrics = {}              # step -> validation metric
+        self._snapshot_secs = []
+        self._write_secs = []
+        self._skipped = 0
+        self._error = None
+
+    def begin(self):
+        self._global_step = tf.contrib.framework.get_global_step()
+        if self._global_step is None:
+            raise RuntimeError("Global step should be created to use AsyncCheckpointHook")
+        self._variables = tf.global_variables()
+
+        # the copies are written by a Saver of a separate graph, with the names of the training variables
+        self._writer_graph = tf.Graph()
+        with self._writer_graph.as_default():
+            self._placeholders = [tf.placeholder(variable.dtype.base_dtype, variable.get_shape())
+                                  for variable in self._variables]
+            copies = [tf.Variable(placeholder, trainable=False, collections=[]) for placeholder in self._placeholders]
+            self._initializers = [copy.initializer for copy in copies]
+            self._saver = tf.train.Saver({variable.op.name: copy for variable, copy in zip(self._variables, copies)},
+                                         max_to_keep=0)
+
+        # checkpoints of a resumed or warm-started model are subject to the retention too
+        state = tf.train.get_checkpoint_state(self.model_dir)
+        if state is not None:
+            for checkpoint_path in state.all_model_checkpoint_paths:
+                self._checkpoints[checkpoint_step(checkpoint_path)] = checkpoint_path
+
+        self._last_step = None
+        self._last_time = time.time()
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name="checkpoint_writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def before_run(self, run_context):
+        return tf.train.SessionRunArgs(self._global_step)
+
+    def after_run(self, run_context, run_values):
+        if self._error is not None:
+            raise self._error
+        step = run_values.results
+        if self._due(step):
+            self._snapshot(run_context.session, step)
+
+    def end(self, session):
+        step = session.run(self._global_step)
+        if step != self._last_step:
+            # the final checkpoint is always written
+            self._snapshot(session, step, block=True)
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+        stats = self.stats()
+        with open(os.path.join(self.model_dir, STATS_FILE), "w") as f:
+            json.dump(stats, f, indent=2)
+        tf.logging.info("checkpoints: {} saved, {} skipped, snapshot {:.1f} ms, write {:.1f} ms".format(
+            stats["saves"], stats["skipped"], stats["snapshot_ms_mean"], stats["write_ms_mean"]))
+
+    def report(self, step, value):
+        '''
+        record the validation metric of the checkpoint of a global step
+        '''
+        with self._lock:
+            self._metrics[step] = value
+            self._apply_retention()
+
+    def stats(self):
+        '''
+        :return: dictionary with the number of saved and skipped checkpoints, the time the training thread
+            was blocked copying the variables, the time of the background writes and the kept checkpoints
+        '''
+        with self._lock:
+            snapshot_ms = np.array(self._snapshot_secs) * 1000.
+            write_ms = np.array(self._write_secs) * 1000.
+            return {"saves": len(self._write_secs),
+                    "skipped": self._skipped,
+                    "snapshot_ms_mean": float(snapshot_ms.mean()) if len(snapshot_ms) else 0.,
+                    "snapshot_ms_max": float(snapshot_ms.max()) if len(snapshot_ms) else 0.,
+                    "write_ms_mean": float(write_ms.mean()) if len(write_ms) else 0.,
+                    "write_ms_max": float(write_ms.max()) if len(write_ms) else 0.,
+                    "kept": [self._checkpoints[step] for step in sorted(self._checkpoints)]}
+
+    def _due(self, step):
+        if self._last_step is None:
+            return True
+        if self.policy.every_n_steps and step - self._last_step >= self.policy.every_n_steps:
+            return True
+        return bool(self.policy.every_n_secs) and time.time() - self._last_time >= self.policy.every_n_secs
+
+    def _snapshot(self, session, step, block=False):
+        start_time = time.time()
+        values = session.run(self._variables)
+        self._snapshot_secs.append(time.time() - start_time)
+        self._last_step = step
+        self._last_time = time.time()
+        try:
+            self._queue.put((step, values), block=block)
+        except queue.Full:
+            # the writer is behind, the next save will have newer values anyway
+            self._skipped += 1
+
+    def _run(self):
+        try:
+            with tf.Session(graph=self._writer_graph) as session:
+                while True:
+                    item = self._queue.get()
+                    if item is None:
+                        return
+                    step, values = item
+                    start_time = time.time()
+                    session.run(self._initializers, feed_dict=dict(zip(self._placeholders, values)))
+                    checkpoint_path = self._saver.save(session, self._prefix, global_step=step,
+                                                       write_meta_graph=False)
+                    with self._lock:
+                        self._write_secs.append(time.time() - start_time)
+                        self._checkpoints[step] = checkpoint_path
+                        self._apply_retention()
+        except Exception as error:
+            self._error = error
+
+    def _apply_retention(self):
+        # called with the lock held
+        steps = sorted(self._checkpoints)
+        keep = set(steps[-self.policy.keep_latest:])
+        scored = [step for step in steps if step in self._metrics and not math.isnan(self._metrics[step])]
+        scored.sort(key=lambda step: self._metrics[step], reverse=not self.minimize)
+        keep.update(scored[:self.policy.keep_best])
+
+        for step in steps:
+            if step not in keep:
+                for file_name in glob.glob(self._checkpoints.pop(step) + ".*"):
+                    os.remove(file_name)
+        kept = [self._checkpoints[step] for step in sorted(self._checkpoints)]
+        tf.train.update_checkpoint_state(self.model_dir, kept[-1], all_model_checkpoint_paths=kept)
+
+
+class _RecordingEstimator(object):
+    """Forward the results of every evaluation to a callback."""
+
+    def __init__(self, estimator, callback):
+        self._estimator = estimator
+        self._callback = callback
+
+    def __getattr__(self, name):
+        return getattr(self._estimator, name)
+
+    def evaluate(self, *args, **kwargs):
+        results = self._estimator.evaluate(*args, **kwargs)
+        self._callback(results)
+        return results
+
+
+class CheckpointValidationMonitor(tf.contrib.learn.monitors.ValidationMonitor):
+    """ValidationMonitor reporting the metric of every evaluated checkpoint to an AsyncCheckpointHook."""
+
+    def __init__(self, checkpoint_hook, metric="loss", **kwargs):
+        '''
+        :param checkpoint_hook: AsyncCheckpointHook deciding which checkpoints to keep
+        :param metric: validation metric used to rank the checkpoints
+        :param kwargs: arguments of the ValidationMonitor
+        '''
+        super(CheckpointValidationMonitor, self).__init__(**kwargs)
+        self.checkpoint_hook = checkpoint_hook
+        self.metric = metric
+
+    def set_estimator(self, estimator):
+        super(CheckpointValidationMonitor, self).set_estimator(_RecordingEstimator(estimator, self._record))
+
+    def _record(self, results):
+        if self.metric in results:
+            self.checkpoint_hook.report(int(results["global_step"]), float(results[self.metric]))
@@ -0,0 +1,62 @@
+import glob
+import os
+import shutil
+
+import tensorflow as tf
+
+VERSION_PREFIX = "v"
+
+
+def global_step(model_dir):
+    '''
+    :return: global step of the latest checkpoint of a model, 0 if it has no checkpoint
+    '''
+    checkpoint_path = tf.train.latest_checkpoint(model_dir)
+    if checkpoint_path is None:
+        return 0
+    return int(tf.contrib.framework.load_variable(checkpoint_path, "global_step"))
+
+
+def warm_start(source_dir, target_dir):
+    '''
+    copy the latest checkpoint of a model in a new model directory: the estimator of the new directory restores
+    the weights, the optimizer slots and the global step. A target with its own checkpoint is resumed instead
+    :param source_dir: directory of the trained model
+    :param target_dir: directory of the new model
+    :return: global step the target starts from
+    '''
+    if tf.train.latest_checkpoint(target_dir) is not None:
+        return global_step(target_dir)
+
+    checkpoint_path = tf.train.latest_checkpoint(source_dir)
+    if checkpoint_path is None:
+        raise ValueError("No checkpoint found in {}".format(source_dir))
+
+    os.makedirs(target_dir, exist_ok=True)
+    # model.ckpt-<step>.index, .meta and the .data-* shards
+    for file_name in glob.glob(checkpoint_path + ".*"):
+        shutil.copy(file_name, target_dir)
+    tf.train.update_checkpoint_state(target_dir, os.path.join(target_dir, os.path.basename(checkpoint_path)))
+    return global_step(target_dir)
+
+
+def version_dir(root_dir, version):
+    '''
+    :return: model directory of a version, <root_dir>/v<version>
+    '''
+    return os.path.join(root_dir, "{}{}".format(VERSION_PREFIX, version))
+
+
+def latest_version(root_dir, finished_file=None):
+    '''
+    :param finished_file: file written when a version is complete, the versions without it are ignored
+    :return: highest version with a checkpoint in root_dir, None if there is none
+    '''
+    versions = []
+    for path in glob.glob(os.path.join(root_dir, VERSION_PREFIX + "*")):
+        suffix = os.path.basename(path)[len(VERSION_PREFIX):]
+        if not suffix.isdigit() or tf.train.latest_checkpoint(path) is None:
+            continue
+        if finished_file is None or os.path.exists(os.path.join(path, finished_file)):
+            versions.append(int(suffix))
+    return max(versions) if versions else None
@@ -2,11 +2,46 @@ import tensorflow as tf
 from tensorflow.contrib.learn.python.learn.metric_spec import MetricSpec
 from tensorflow.python.ops import math_ops, metrics_impl
 
+def _flatten(predictions, labels):
+    return tf.reshape(tf.to_float(predictions), [-1]), tf.reshape(tf.to_float(labels), [-1])
+
+
 def _streaming_mean_absolute_persentace_error(predictions, labels):
-    absolute_errors = math_ops.abs((predictions - labels)/labels)
-    mean_t, update_op = metrics_impl.mean(absolute_errors, None, None, None, 'mean_absolute_persentace_error')
+    predictions, labels = _flatten(predictions, labels)
+    # the examples with a zero return have no percentage error, they get a zero weight
+    non_zero = tf.not_equal(labels, 0.)
+    safe_labels = tf.where(non_zero, labels, tf.ones_like(labels))
+    absolute_errors = math_ops.abs((predictions - labels)/safe_labels)
+    mean_t, update_op = metrics_impl.mean(absolute_errors, tf.to_float(non_zero), None, None,
+                                          'mean_absolute_persentace_error')
     return tf.multiply(mean_t, 100.), update_op
 
+
+def _streaming_directional_accuracy(predictions, labels):
+    '''
+    fraction of the examples where the predicted return has the sign of the realized one
+    '''
+    predictions, labels = _flatten(predictions, labels)
+    hits = tf.to_float(tf.equal(tf.sign(predictions), tf.sign(labels)))
+    return metrics_impl.mean(hits, None, None, None, 'directional_accuracy')
+
+
+def _streaming_information_coefficient(predictions, labels):
+    '''
+    pearson correlation of the predicted and realized returns, accumulated with running co-moments
+    '''
+    predictions, labels = _flatten(predictions, labels)
+    return tf.contrib.metrics.streaming_pearson_correlation(predictions, labels, name='information_coefficient')
+
+
+def _streaming_sign_weighted_return(predictions, labels):
+    '''
+    mean return of going long when the prediction is positive and short when it is negative
+    '''
+    predictions, labels = _flatten(predictions, labels)
+    return metrics_impl.mean(tf.sign(predictions) * labels, None, None, None, 'sign_weighted_return')
+
+
 def create_evaluation_metrics(e_type):
     """
     Create the appropriate eval metric according to the experiment type
@@ -16,9 +51,9 @@ def create_evaluation_metrics(e_type):
     if "reg" in e_type:
         return _create_evaluation_metrics_regression()
     elif "clas" in e_type:
-        return _create_evaluation_metrics_classify
+        return _create_evaluation_metrics_classify()
     else:
-        return ValueError("Wrong experiment type")
+        raise ValueError("Wrong experiment type")
 
 
 def _create_evaluation_metrics_classify():
@@ -41,4 +76,12 @@ def _create_evaluation_metrics_regression():
                                      prediction_key="predictions")
     eval_metrics['MSE'] = MetricSpec(metric_fn=tf.contrib.metrics.streaming_mean_squared_error,
                                      prediction_key="predictions")
+    eval_metrics['MAPE'] = MetricSpec(metric_fn=_streaming_mean_absolute_persentace_error,
+                                      prediction_key="predictions")
+    eval_metrics['directional_accuracy'] = MetricSpec(metric_fn=_streaming_directional_accuracy,
+                                                      prediction_key="predictions")
+    eval_metrics['IC'] = MetricSpec(metric_fn=_streaming_information_coefficient,
+                                    prediction_key="predictions")
+    eval_metrics['sign_weighted_return'] = MetricSpec(metric_fn=_streaming_sign_weighted_return,
+                                                      prediction_key="predictions")
     return eval_metrics
\ No newline at end of file
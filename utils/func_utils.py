@@ -6,6 +6,9 @@ import csv
 import os
 import pandas as pd
 
+# collection of the final state of the recurrent layer, used to carry it between calls
+RNN_STATE_COLLECTION = "rnn_final_state"
+
 BNParams = namedtuple(
     "BNParams",
     [
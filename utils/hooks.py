@@ -0,0 +1,39 @@
+import time
+
+import tensorflow as tf
+
+
+class ThroughputHook(tf.train.SessionRunHook):
+    """Measure the training throughput of a process.
+    The first warm_up_steps are not timed, so the graph setup and the filling of the input queues
+    do not bias the examples/sec."""
+
+    def __init__(self, batch_size, warm_up_steps=20):
+        self.batch_size = batch_size
+        self.warm_up_steps = warm_up_steps
+        self.steps = 0
+        self.timed_steps = 0
+        self._start_time = None
+        self._end_time = None
+
+    def after_run(self, run_context, run_values):
+        self.steps += 1
+        if self.steps == self.warm_up_steps:
+            self._start_time = time.time()
+        elif self.steps > self.warm_up_steps:
+            self.timed_steps += 1
+            self._end_time = time.time()
+
+    def stats(self):
+        '''
+        :return: dictionary with the timed steps, their duration and the examples/sec
+        '''
+        if self._start_time is None or self.timed_steps == 0:
+            elapsed_secs = 0.
+        else:
+            elapsed_secs = self._end_time - self._start_time
+        examples = self.timed_steps * self.batch_size
+        return {"steps": self.steps,
+                "timed_steps": self.timed_steps,
+                "elapsed_secs": elapsed_secs,
+                "examples_per_sec": examples / elapsed_secs if elapsed_secs > 0 else 0.}
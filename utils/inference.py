@@ -0,0 +1,143 @@
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import model_helper as model
+import net_hparams
+from models import registry
+
+FROZEN_GRAPH_FILE = "frozen_graph.pb"
+SIGNATURE_FILE = "frozen_graph.json"
+
+# graph_transforms applied after the freezing: constant folding first, so the batch norm of the inference graph
+# becomes a multiplication by a constant that fold_batch_norms can merge in the weights of the MatMul/Conv2D before it
+TRANSFORMS = ["strip_unused_nodes",
+              "fold_constants(ignore_errors=true)",
+              "fold_batch_norms",
+              "fold_old_batch_norms",
+              "fold_constants(ignore_errors=true)",
+              "sort_by_execution_order"]
+
+
+def freeze_graph(hparams, checkpoint_path):
+    '''
+    build the inference graph of the model and replace its variables with the values of the checkpoint
+    :param hparams: hiper-parameters of the model
+    :param checkpoint_path: checkpoint to restore
+    :return: GraphDef, list of input names, list of output names
+    '''
+    with tf.Graph().as_default() as graph:
+        inputs, outputs = model.create_inference_graph(hparams, registry.get_model(hparams.model_type))
+        saver = tf.train.Saver()
+        with tf.Session(graph=graph) as sess:
+            saver.restore(sess, checkpoint_path)
+            output_names = [tensor.op.name for _, tensor in sorted(outputs.items())]
+            # only the nodes needed by the outputs are kept
+            graph_def = tf.graph_util.convert_variables_to_constants(sess, graph.as_graph_def(), output_names)
+
+    node_names = set(node.name for node in graph_def.node)
+    input_names = [tensor.op.name for _, tensor in sorted(inputs.items()) if tensor.op.name in node_names]
+    return graph_def, input_names, output_names
+
+def optimize_graph(graph_def, input_names, output_names, transforms=TRANSFORMS):
+    '''
+    fold the constants and the batch norms of a frozen graph
+    :return: optimized GraphDef, the frozen one if graph_transforms is not available in this tensorflow version
+    '''
+    try:
+        from tensorflow.tools.graph_transforms import TransformGraph
+    except ImportError:
+        tf.logging.warning("graph_transforms not available, the frozen graph is not optimized")
+        return graph_def
+    return TransformGraph(graph_def, input_names, output_names, transforms)
+
+
+def export_frozen_graph(hparams, model_dir, export_dir, checkpoint_path=None):
+    '''
+    export a frozen and optimized inference graph with a JSON signature describing its inputs and outputs
+    :param hparams: hiper-parameters of the model
+    :param model_dir: directory of the model checkpoints
+    :param export_dir: directory of the exported graph
+    :param checkpoint_path: checkpoint to export, default to the latest one of model_dir
+    :return: path of the exported graph
+    '''
+    if not net_hparams.is_sequential(hparams.model_type):
+        raise ValueError("Only the sequential models can be exported, not {}".format(hparams.model_type))
+    checkpoint_path = checkpoint_path or tf.train.latest_checkpoint(model_dir)
+    if checkpoint_path is None:
+        raise ValueError("No checkpoint found in {}".format(model_dir))
+
+    frozen_graph_def, input_names, output_names = freeze_graph(hparams, checkpoint_path)
+    graph_def = optimize_graph(frozen_graph_def, input_names, output_names)
+    tf.logging.info("{} nodes after freezing, {} after the optimization".format(len(frozen_graph_def.node),
+                                                                               len(graph_def.node)))
+
+    os.makedirs(export_dir, exist_ok=True)
+    full_path = os.path.join(export_dir, FROZEN_GRAPH_FILE)
+    with open(full_path, "wb") as f:
+        f.write(graph_def.SerializeToString())
+
+    signature = {"inputs": input_names,
+                 "outputs": output_names,
+                 "checkpoint": checkpoint_path,
+                 "feature_keys": net_hparams.feature_keys(hparams),
+                 "hparams": hparams._asdict()}
+    with open(os.path.join(export_dir, SIGNATURE_FILE), "w") as f:
+        json.dump(signature, f, indent=2, sort_keys=True)
+    return full_path
+
+
+class FrozenPredictor(object):
+    """Run an exported frozen graph. The graph has no variables to restore, so it is ready as soon as it is imported;
+    a first run on a dummy batch is done in the constructor to move also the allocations out of the first request."""
+
+    def __init__(self, export_dir, intra_op_threads=0, inter_op_threads=0, warm_up=True):
+        with open(os.path.join(export_dir, SIGNATURE_FILE)) as f:
+            self.signature = json.load(f)
+        self.hparams = net_hparams.create_hparams()._replace(**{key: value for key, value in self.signature["hparams"].items()
+                                                                if key in net_hparams.HParams._fields})
+
+        graph_def = tf.GraphDef()
+        with open(os.path.join(export_dir, FROZEN_GRAPH_FILE), "rb") as f:
+            graph_def.ParseFromString(f.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name="")
+        self.inputs = {name: self.graph.get_tensor_by_name(name + ":0") for name in self.signature["inputs"]}
+        self.outputs = {name: self.graph.get_tensor_by_name(name + ":0") for name in self.signature["outputs"]}
+
+        config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                                inter_op_parallelism_threads=inter_op_threads)
+        self.session = tf.Session(graph=self.graph, config=config)
+
+        if warm_up:
+            start_time = time.time()
+            self.predict(np.zeros([1, self.hparams.sequence_length, self.hparams.input_size], dtype=np.float32),
+                         ticker=np.zeros(1, dtype=np.int64))
+            tf.logging.info("warm-up run in {:.3f}s".format(time.time() - start_time))
+
+    def predict(self, features, length=None, ticker=None):
+        '''
+        :param features: array [batch, sequence_length, input_size], features in the order of signature["feature_keys"]
+        :param length: valid time stamps of every example, default to the full sequence
+        :param ticker: ticker id of every example, required by the multi-task models and the input normalization.
+            Default to the ticker 0 for the other models
+        :return: dictionary output name -> array
+        '''
+        if ticker is None and self.hparams.input_normalization != "none":
+            raise ValueError("The ticker ids are needed to normalize the features")
+        if ticker is None and self.hparams.multi_task:
+            raise ValueError("The ticker ids are needed to choose the output layer of the multi-task model")
+        batch_size = len(features)
+        values = {'features': features,
+                  'length': length if length is not None else np.full(batch_size, self.hparams.sequence_length, dtype=np.int64),
+                  'ticker': ticker if ticker is not None else np.zeros(batch_size, dtype=np.int64)}
+        feed_dict = {tensor: values[name] for name, tensor in self.inputs.items()}
+        return self.session.run(self.outputs, feed_dict=feed_dict)
+
+    def close(self):
+        self.session.close()
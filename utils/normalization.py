@@ -0,0 +1,171 @@
+"""Per-feature normalization of the raw inputs (prices, Volume, A/D, ...).
+The statistics are computed at export time on the training split and stored in the manifest of the dataset,
+the transform is applied once per example in the input pipeline instead of batch normalizing every time_stamp.
+Tensorflow is only imported by normalize_features, the numpy inference uses normalize_array."""
+import json
+import os
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+NORMALIZATIONS = ("none", "zscore", "robust")
+IQR_TO_STD = 1.349          # interquartile range of a standard normal
+
+
+class FeatureStats(object):
+    """Mean, std and quantiles of the features in a single pass over chunks of rows.
+    The moments of every chunk are merged in the running ones, the quantiles come from a uniform
+    reservoir sample of sample_size rows."""
+
+    def __init__(self, keys, sample_size=100000, seed=0):
+        self.keys = list(keys)
+        self.sample_size = sample_size
+        self.count = 0
+        self.mean = np.zeros(len(self.keys))
+        self.m2 = np.zeros(len(self.keys))
+        self._sample = np.empty((sample_size, len(self.keys)))
+        self._random_state = np.random.RandomState(seed)
+
+    def update(self, values):
+        '''
+        :param values: array [rows, features]
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        num_rows = len(values)
+        if num_rows == 0:
+            return
+
+        chunk_mean = values.mean(axis=0)
+        chunk_m2 = np.square(values - chunk_mean).sum(axis=0)
+        total = self.count + num_rows
+        delta = chunk_mean - self.mean
+        self.mean += delta * num_rows / total
+        self.m2 += chunk_m2 + np.square(delta) * self.count * num_rows / total
+
+        # reservoir sampling: the row with global index i replaces a random slot with probability sample_size / (i + 1)
+        idx = self.count + np.arange(num_rows)
+        filling = idx < self.sample_size
+        self._sample[idx[filling]] = values[filling]
+        slots = (self._random_state.random_sample(num_rows) * (idx + 1)).astype(np.int64)
+        replacing = ~filling & (slots < self.sample_size)
+        self._sample[slots[replacing]] = values[replacing]
+        self.count = total
+
+    def result(self):
+        '''
+        :return: dictionary feature -> dictionary with count, mean, std, q25, median and q75
+        '''
+        sample = self._sample[:min(self.count, self.sample_size)]
+        std = np.sqrt(self.m2 / max(self.count, 1))
+        q25, median, q75 = np.percentile(sample, [25, 50, 75], axis=0) if len(sample) else np.zeros((3, len(self.keys)))
+        return {key: {"count": int(self.count),
+                      "mean": float(self.mean[idx]),
+                      "std": float(std[idx]),
+                      "q25": float(q25[idx]),
+                      "median": float(median[idx]),
+                      "q75": float(q75[idx])}
+                for idx, key in enumerate(self.keys)}
+
+
+def compute_feature_stats(data, keys, sequence_length, sequential, chunk_size=10000):
+    '''
+    statistics of the features of the exported rows, every day counted once
+    :param data: DataFrame of the split, with the layout read by the dataset_extraction example functions
+    :param keys: features of the examples
+    :param sequence_length: time_stamps of the sequential rows
+    :param sequential: True if a row holds sequence_length time_stamps of keys + label, most recent first
+    :param chunk_size: rows processed at once
+    '''
+    stats = FeatureStats(keys)
+    for start in range(0, len(data), chunk_size):
+        chunk = data.iloc[start:start + chunk_size]
+        if sequential:
+            values = chunk.values.reshape(len(chunk), sequence_length, len(keys) + 1)[:, 0, :len(keys)]
+        else:
+            values = chunk[keys].values
+        stats.update(values)
+    return stats.result()
+
+
+def write_manifest(path, feature_stats, **info):
+    '''
+    write the manifest of an exported dataset
+    :param path: directory of the dataset of a ticker
+    :param feature_stats: statistics of the training split, from compute_feature_stats
+    :param info: other fields of the manifest, e.g. the number of rows of every split
+    '''
+    manifest = dict(info)
+    manifest["feature_stats"] = feature_stats
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def normalization_params(input_dir, tickers, keys, method):
+    '''
+    shift and scale of every ticker and feature, from the manifests of the exported datasets
+    :param input_dir: root directory of the exported datasets
+    :param tickers: tickers, in the order of the ticker ids
+    :param keys: features, in the order of the features tensor
+    :param method: zscore (mean, std) or robust (median, interquartile range)
+    :return: shift, scale as lists [tickers][features]
+    '''
+    if method not in NORMALIZATIONS[1:]:
+        raise ValueError("Wrong normalization {}. Available: {}".format(method, NORMALIZATIONS))
+
+    shift = np.zeros((len(tickers), len(keys)))
+    scale = np.ones((len(tickers), len(keys)))
+    for ticker_id, ticker in enumerate(tickers):
+        full_path = os.path.join(input_dir, ticker, MANIFEST_FILE)
+        if not os.path.exists(full_path):
+            # a dataset exported before the manifests: export it again to normalize its features
+            raise ValueError("No manifest {} with the feature statistics of {}".format(full_path, ticker))
+        with open(full_path) as f:
+            feature_stats = json.load(f)["feature_stats"]
+        for idx, key in enumerate(keys):
+            stats = feature_stats[key]
+            if method == "zscore":
+                shift[ticker_id, idx], scale[ticker_id, idx] = stats["mean"], stats["std"]
+            else:
+                shift[ticker_id, idx], scale[ticker_id, idx] = stats["median"], (stats["q75"] - stats["q25"]) / IQR_TO_STD
+
+    # constant features are only centered
+    scale[~(scale > 0)] = 1.
+    return shift.tolist(), scale.tolist()
+
+
+def normalize_array(features, ticker, shift, scale):
+    '''
+    numpy version of normalize_features
+    :param features: array [batch, features] or [batch, time_stamps, features]
+    :param ticker: array [batch] of ticker ids
+    '''
+    shift = np.asarray(shift, dtype=np.float32)
+    inv_scale = 1. / np.asarray(scale, dtype=np.float32)
+    shift, inv_scale = shift[np.asarray(ticker)], inv_scale[np.asarray(ticker)]
+    if np.ndim(features) == 3:
+        shift, inv_scale = shift[:, np.newaxis], inv_scale[:, np.newaxis]
+    return (features - shift) * inv_scale
+
+
+def normalize_features(features, ticker, h_params):
+    '''
+    normalize the features of the examples with the statistics of their ticker
+    :param features: tensor [batch, features] or [batch, time_stamps, features]
+    :param ticker: tensor [batch] of ticker ids
+    :param h_params: hiper-parameters with input_normalization, feature_shift and feature_scale
+    :return: normalized features, the same tensor if input_normalization is none
+    '''
+    if h_params.input_normalization == "none":
+        return features
+    if h_params.feature_shift is None:
+        raise ValueError("input_normalization {} without the statistics of the features".format(h_params.input_normalization))
+    import tensorflow as tf
+
+    with tf.name_scope("normalize_features"):
+        shift = tf.constant(np.asarray(h_params.feature_shift, dtype=np.float32))
+        inv_scale = tf.constant(1. / np.asarray(h_params.feature_scale, dtype=np.float32))
+        shift, inv_scale = tf.gather(shift, ticker), tf.gather(inv_scale, ticker)
+        if features.get_shape().ndims == 3:
+            shift, inv_scale = tf.expand_dims(shift, 1), tf.expand_dims(inv_scale, 1)
+        return (features - shift) * inv_scale
@@ -0,0 +1,203 @@
+"""NumPy-only forward pass of the deep_rnn model.
+The weights are exported once from a checkpoint (the only part that needs tensorflow, imported lazily),
+scoring processes only import numpy."""
+import json
+
+import numpy as np
+
+from utils.normalization import normalize_array
+
+BN_EPSILON = 0.001          # default epsilon of tf.contrib.layers.batch_norm
+LEAKINESS = .1              # utils.func_utils.leaky_relu used by deep_rnn
+NUMPY_MODELS = ("deep_rnn",)
+META_KEY = "__meta__"
+
+
+def _find(names, prefix, suffixes):
+    '''
+    name of the checkpoint variable under the prefix scope ending with one of the suffixes
+    '''
+    matches = [name for name in names
+               if name.startswith(prefix + "/") and any(name.endswith(suffix) for suffix in suffixes)]
+    if len(matches) != 1:
+        raise ValueError("Expected one variable {}/*{}, found {}".format(prefix, suffixes, matches))
+    return matches[0]
+
+def _fold_batch_norm(reader, names, W, prefix, bn_suffix):
+    '''
+    fold the inference batch norm applied after x * W in the weights: BN(x * W) = x * (W * scale) + offset
+    :return: folded weights, offset
+    '''
+    mean = reader.get_tensor(_find(names, prefix, [bn_suffix + "/moving_mean"]))
+    variance = reader.get_tensor(_find(names, prefix, [bn_suffix + "/moving_variance"]))
+    gamma = reader.get_tensor(_find(names, prefix, [bn_suffix + "/gamma"]))
+    beta = reader.get_tensor(_find(names, prefix, [bn_suffix + "/beta"]))
+    scale = gamma / np.sqrt(variance + BN_EPSILON)
+    return W * scale, beta - mean * scale
+
+
+def _export_dense_ot(reader, names, scope, weights, batch_norm):
+    W = reader.get_tensor(scope + "/weight_filter")
+    if batch_norm:
+        weights[scope + "/W"], weights[scope + "/b"] = _fold_batch_norm(reader, names, W, scope, "_bn")
+    else:
+        weights[scope + "/W"], weights[scope + "/b"] = W, reader.get_tensor(scope + "/bias_filter")
+    return {"type": "dense", "scope": scope}
+
+def _export_gated_ot(reader, names, scope, weights, batch_norm, is_highway=False):
+    W = reader.get_tensor(scope + "/weight_filter")
+    if batch_norm:
+        weights[scope + "/W"], weights[scope + "/b"] = _fold_batch_norm(reader, names, W, scope, "_filter_bn")
+        # as in gated_dense_layer_ot the gate batch norm is applied to the filter pre-activation
+        weights[scope + "/W_t"], weights[scope + "/b_t"] = _fold_batch_norm(reader, names, W, scope, "_gate_bn")
+    else:
+        weights[scope + "/W"], weights[scope + "/b"] = W, reader.get_tensor(scope + "/bias_filter")
+        weights[scope + "/W_t"] = reader.get_tensor(scope + "/weight_gate")
+        weights[scope + "/b_t"] = reader.get_tensor(scope + "/bias_gate")
+    return {"type": "highway" if is_highway else "gated", "scope": scope}
+
+def _export_hidden_layer(reader, names, layer_type, scope, weights, batch_norm):
+    if layer_type == "dense_layer_ot":
+        return [_export_dense_ot(reader, names, scope, weights, batch_norm)]
+    elif layer_type == "gated_dense_layer_ot":
+        return [_export_gated_ot(reader, names, scope, weights, batch_norm)]
+    elif layer_type == "highway_dense_layer_ot":
+        return [_export_dense_ot(reader, names, scope + "/sub_1", weights, batch_norm),
+                _export_gated_ot(reader, names, scope + "/sub_2", weights, batch_norm, is_highway=True)]
+    elif layer_type == "gated_res_net_layer_ot":
+        return [{"type": "residual_start", "scope": scope},
+                _export_dense_ot(reader, names, scope + "/sub_1", weights, batch_norm),
+                _export_gated_ot(reader, names, scope + "/sub_2", weights, batch_norm),
+                {"type": "residual_end", "scope": scope}]
+    raise ValueError("Hidden layer {} not supported by the numpy inference".format(layer_type))
+
+
+def export_weights(hparams, checkpoint_path, output_file):
+    '''
+    dump the weights of a trained deep_rnn, with the batch norms folded in the dense weights, in a npz file.
+    The statistics of the input normalization are exported with the weights
+    :param hparams: hiper-parameters of the model
+    :param checkpoint_path: checkpoint to export
+    :param output_file: path of the npz file
+    '''
+    if hparams.model_type not in NUMPY_MODELS:
+        raise ValueError("Model {} not supported by the numpy inference".format(hparams.model_type))
+    import tensorflow as tf
+    from net_hparams import feature_keys
+
+    reader = tf.train.NewCheckpointReader(checkpoint_path)
+    names = sorted(reader.get_variable_to_shape_map())
+    weights = {}
+
+    layers = []
+    for layer_idx in range(len(hparams.h_layer_size) - 1):
+        layers.extend(_export_hidden_layer(reader, names, hparams.hidden_layer_type,
+                                           'gated_dense_{}'.format(layer_idx), weights, hparams.batch_norm))
+
+    for gate in ["gates", "candidate"]:
+        weights["rnn/" + gate + "/W"] = reader.get_tensor(_find(names, "rnn", [gate + "/weights", gate + "/kernel"]))
+        weights["rnn/" + gate + "/b"] = reader.get_tensor(_find(names, "rnn", [gate + "/biases", gate + "/bias"]))
+
+    if hparams.multi_task:
+        weights["logits/W"] = reader.get_tensor("logits/ticker_weights")
+        weights["logits/b"] = reader.get_tensor("logits/ticker_bias")
+    else:
+        weights["logits/W"] = reader.get_tensor("logits/weights")
+        weights["logits/b"] = reader.get_tensor("logits/bias")
+
+    meta = {"layers": layers,
+            "model_type": hparams.model_type,
+            "e_type": hparams.e_type,
+            "multi_task": hparams.multi_task,
+            "sequence_length": hparams.sequence_length,
+            "input_size": hparams.input_size,
+            "feature_keys": feature_keys(hparams),
+            "checkpoint": checkpoint_path}
+    if hparams.input_normalization != "none":
+        weights["feature_shift"], weights["feature_scale"] = hparams.feature_shift, hparams.feature_scale
+    weights[META_KEY] = np.array(json.dumps(meta))
+    np.savez(output_file, **{key: np.asarray(value, dtype=np.float32) if key != META_KEY else value
+                             for key, value in weights.items()})
+
+
+def leaky_relu(x):
+    return np.where(x < 0., LEAKINESS * x, x)
+
+def sigmoid(x):
+    return 1. / (1. + np.exp(-x))
+
+
+class NumpyModel(object):
+    """Forward pass of an exported deep_rnn, vectorized over the examples (e.g. all the tickers of a day)."""
+
+    def __init__(self, weights_file):
+        with np.load(weights_file) as data:
+            self.weights = {key: data[key] for key in data.files if key != META_KEY}
+            self.meta = json.loads(str(data[META_KEY]))
+
+    def _hidden_layers(self, x):
+        # the hidden layers use the same weights at every time_stamp: one matmul over [batch, time, features]
+        residual = None
+        for layer in self.meta["layers"]:
+            scope = layer["scope"]
+            if layer["type"] == "residual_start":
+                residual = x
+            elif layer["type"] == "residual_end":
+                x = x + residual
+            elif layer["type"] == "dense":
+                x = leaky_relu(np.dot(x, self.weights[scope + "/W"]) + self.weights[scope + "/b"])
+            else:
+                H = leaky_relu(np.dot(x, self.weights[scope + "/W"]) + self.weights[scope + "/b"])
+                T = sigmoid(np.dot(x, self.weights[scope + "/W_t"]) + self.weights[scope + "/b_t"])
+                if layer["type"] == "highway":
+                    x = H * T + (1. - T) * x
+                else:
+                    x = H * T
+        return x
+
+    def _gru(self, x, length):
+        W_gates, b_gates = self.weights["rnn/gates/W"], self.weights["rnn/gates/b"]
+        W_candidate, b_candidate = self.weights["rnn/candidate/W"], self.weights["rnn/candidate/b"]
+        num_units = b_candidate.shape[0]
+        batch_size, sequence_length, _ = x.shape
+
+        state = np.zeros([batch_size, num_units], dtype=np.float32)
+        output = state
+        for t in range(sequence_length):
+            gates = sigmoid(np.dot(np.concatenate([x[:, t, :], state], axis=1), W_gates) + b_gates)
+            r, u = gates[:, :num_units], gates[:, num_units:]
+            c = np.tanh(np.dot(np.concatenate([x[:, t, :], r * state], axis=1), W_candidate) + b_candidate)
+            new_state = u * state + (1. - u) * c
+            # as static_rnn with sequence_length: the state is copied and the output is zero after the sequence end
+            valid = (t < length)[:, np.newaxis]
+            state = np.where(valid, new_state, state)
+            output = np.where(valid, new_state, 0.)
+        return output
+
+    def predict(self, features, length=None, ticker=None):
+        '''
+        :param features: array [batch, sequence_length, input_size], raw features in the order of meta["feature_keys"]
+        :param length: valid time_stamps of every example, default to the full sequence
+        :param ticker: ticker id of every example, used by the multi-task models and the input normalization
+        :return: predictions
+        '''
+        if ticker is None and self.meta["multi_task"]:
+            raise ValueError("The ticker ids are needed to choose the output layer of the multi-task model")
+        features = np.asarray(features, dtype=np.float32)
+        if "feature_shift" in self.weights:
+            if ticker is None:
+                raise ValueError("The ticker ids are needed to normalize the features")
+            features = normalize_array(features, ticker, self.weights["feature_shift"], self.weights["feature_scale"])
+        if length is None:
+            length = np.full(len(features), features.shape[1])
+        output = self._gru(self._hidden_layers(features), np.asarray(length))
+
+        if self.meta["multi_task"]:
+            ticker = np.asarray(ticker)
+            logits = np.einsum("bi,bio->bo", output, self.weights["logits/W"][ticker]) + self.weights["logits/b"][ticker]
+        else:
+            logits = np.dot(output, self.weights["logits/W"]) + self.weights["logits/b"]
+
+        if "class" in self.meta["e_type"]:
+            return np.argmax(logits, axis=1)
+        return logits[:, 0]
@@ -0,0 +1,151 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+CACHE_PREFIX = "predictions_"
+CACHE_SUFFIX = ".csv"
+COVERAGE_PREFIX = "coverage_"
+COVERAGE_SUFFIX = ".json"
+INDEX = ["ticker", "date"]
+
+
+def checkpoint_fingerprint(model_dir):
+    '''
+    fingerprint of the latest checkpoint of a model: a new checkpoint gives a new fingerprint
+    :param model_dir: directory of the model
+    :return: fingerprint, checkpoint path
+    '''
+    checkpoint_path = tf.train.latest_checkpoint(model_dir)
+    if checkpoint_path is None:
+        raise ValueError("No checkpoint found in {}".format(model_dir))
+    fingerprint = hashlib.sha1(os.path.basename(checkpoint_path).encode("utf-8"))
+    # the index file lists the variables with the checksums of their values
+    for file_name in sorted(glob.glob(checkpoint_path + ".index")):
+        with open(file_name, "rb") as f:
+            fingerprint.update(f.read())
+    return fingerprint.hexdigest()[:16], checkpoint_path
+
+
+class PredictionCache(object):
+    """Persistent predictions of a model indexed by (ticker, date), one file per checkpoint fingerprint.
+    The cache of a fingerprint only grows, the files of the old checkpoints are removed by invalidate."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._tables = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, fingerprint):
+        return os.path.join(self.cache_dir, CACHE_PREFIX + fingerprint + CACHE_SUFFIX)
+
+    def _coverage_path(self, fingerprint):
+        return os.path.join(self.cache_dir, COVERAGE_PREFIX + fingerprint + COVERAGE_SUFFIX)
+
+    def _coverage(self, fingerprint):
+        # ticker -> list of [split, start_date, end_date] whose windows are all in the cache, None for no bound
+        path = self._coverage_path(fingerprint)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def covered(self, fingerprint, split, tickers, start_date=None, end_date=None):
+        '''
+        :return: True if all the windows of the split for the tickers between the dates were already predicted,
+            so the query can be answered without reading the dataset
+        '''
+        coverage = self._coverage(fingerprint)
+        start = pd.Timestamp.min if start_date is None else pd.Timestamp(start_date)
+        end = pd.Timestamp.max if end_date is None else pd.Timestamp(end_date)
+        for ticker in tickers:
+            if not any(range_split == split and
+                       (range_start is None or pd.Timestamp(range_start) <= start) and
+                       (range_end is None or pd.Timestamp(range_end) >= end)
+                       for range_split, range_start, range_end in coverage.get(ticker, [])):
+                return False
+        return True
+
+    def add_coverage(self, fingerprint, split, tickers, start_date=None, end_date=None):
+        '''
+        record that all the windows of the split for the tickers between the dates are in the cache
+        '''
+        coverage = self._coverage(fingerprint)
+        for ticker in tickers:
+            coverage.setdefault(ticker, []).append([split, start_date, end_date])
+        with open(self._coverage_path(fingerprint), "w") as f:
+            json.dump(coverage, f, indent=2)
+
+    def table(self, fingerprint):
+        '''
+        :return: DataFrame indexed by (ticker, date) with the cached predictions of the checkpoint
+        '''
+        if fingerprint not in self._tables:
+            path = self._path(fingerprint)
+            if os.path.exists(path):
+                table = pd.read_csv(path, parse_dates=["date"]).set_index(INDEX).sort_index()
+            else:
+                table = pd.DataFrame(columns=INDEX + ["predictions", "targets"]).set_index(INDEX)
+            self._tables[fingerprint] = table
+        return self._tables[fingerprint]
+
+    def invalidate(self, fingerprint):
+        '''
+        remove the predictions and the coverage of every checkpoint but the given one
+        :return: removed fingerprints
+        '''
+        removed = []
+        for path in glob.glob(os.path.join(self.cache_dir, CACHE_PREFIX + "*" + CACHE_SUFFIX)):
+            other = os.path.basename(path)[len(CACHE_PREFIX):-len(CACHE_SUFFIX)]
+            if other != fingerprint:
+                os.remove(path)
+                self._tables.pop(other, None)
+                removed.append(other)
+        for path in glob.glob(os.path.join(self.cache_dir, COVERAGE_PREFIX + "*" + COVERAGE_SUFFIX)):
+            if os.path.basename(path)[len(COVERAGE_PREFIX):-len(COVERAGE_SUFFIX)] != fingerprint:
+                os.remove(path)
+        return removed
+
+    def missing(self, fingerprint, tickers, dates):
+        '''
+        :param tickers: ticker of every requested prediction
+        :param dates: date of every requested prediction
+        :return: boolean mask of the requests not in the cache
+        '''
+        requested = pd.MultiIndex.from_arrays([np.asarray(tickers), pd.to_datetime(dates)], names=INDEX)
+        return ~requested.isin(self.table(fingerprint).index)
+
+    def add(self, fingerprint, tickers, dates, predictions, targets):
+        '''
+        add new predictions to the cache of a checkpoint and persist it
+        '''
+        new = pd.DataFrame({"ticker": np.asarray(tickers),
+                            "date": pd.to_datetime(dates),
+                            "predictions": predictions,
+                            "targets": targets}).set_index(INDEX)
+        table = pd.concat([self.table(fingerprint), new])
+        table = table[~table.index.duplicated(keep="last")].sort_index()
+        self._tables[fingerprint] = table
+        table.reset_index().to_csv(self._path(fingerprint), index=False)
+
+    def query(self, fingerprint, tickers=None, start_date=None, end_date=None):
+        '''
+        cached predictions of the tickers between two dates, included
+        :param tickers: list of tickers, None for all
+        :param start_date: first date, None for no bound
+        :param end_date: last date, None for no bound
+        :return: DataFrame with ticker, date, predictions and targets
+        '''
+        table = self.table(fingerprint).reset_index()
+        mask = np.ones(len(table), dtype=bool)
+        if tickers is not None:
+            mask &= table["ticker"].isin(tickers).values
+        if start_date is not None:
+            mask &= (table["date"] >= pd.Timestamp(start_date)).values
+        if end_date is not None:
+            mask &= (table["date"] <= pd.Timestamp(end_date)).values
+        return table[mask]
@@ -0,0 +1,100 @@
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+EXPORT_FORMATS = ("csv", "npz")
+
+
+def iterate_batches(iterable, batch_size):
+    '''
+    group the rows yielded by an iterable in lists of batch_size rows, the last one can be smaller
+    '''
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def collect_predictions(predictions, num_rows, keys, batch_size, log_every_n_batches=100):
+    '''
+    consume the rows yielded by estimator.predict into arrays allocated once
+    :param predictions: iterable of dictionaries, one per example
+    :param num_rows: number of examples, e.g. from data_set_helper.count_records
+    :param keys: keys of the rows to collect
+    :param batch_size: rows copied at once in the arrays
+    :param log_every_n_batches: log the progress every this many batches
+    :return: dictionary key -> array of num_rows values
+    '''
+    columns = None
+    start_time = time.time()
+    idx = 0
+    for batch_idx, batch in enumerate(iterate_batches(predictions, batch_size)):
+        if columns is None:
+            columns = {key: np.empty((num_rows,) + np.shape(batch[0][key]), dtype=np.asarray(batch[0][key]).dtype)
+                       for key in keys}
+        if idx + len(batch) > num_rows:
+            raise ValueError("More than the {} expected predictions".format(num_rows))
+
+        for key in keys:
+            columns[key][idx:idx + len(batch)] = [row[key] for row in batch]
+        idx += len(batch)
+
+        if (batch_idx + 1) % log_every_n_batches == 0:
+            tf.logging.info("{} / {} predictions ({:.1f} rows/sec)".format(idx, num_rows,
+                                                                          idx / (time.time() - start_time)))
+
+    if columns is None:
+        return {key: np.empty((0,)) for key in keys}
+    if idx < num_rows:
+        tf.logging.warning("{} predictions instead of the {} expected".format(idx, num_rows))
+    return {key: values[:idx] for key, values in columns.items()}
+
+
+def to_dates(date_ids):
+    '''
+    convert the YYYYMMDD dates of the examples, 0 for unknown dates becomes NaT
+    '''
+    return pd.to_datetime(pd.Series(date_ids).astype(str), format="%Y%m%d", errors="coerce").values
+
+
+def export_predictions(columns, full_path, export_format="csv"):
+    '''
+    write all the predictions at once
+    :param columns: dictionary column name -> array
+    :param full_path: path of the file without the extension
+    :param export_format: csv or npz, a compressed numpy file with an array per column
+    :return: path of the written file
+    '''
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError("Wrong export format {}. Available: {}".format(export_format, EXPORT_FORMATS))
+    full_path = "{}.{}".format(full_path, export_format)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    if export_format == "csv":
+        pd.DataFrame(columns).to_csv(full_path, index=False)
+    else:
+        np.savez_compressed(full_path, **{key: np.asarray(values) for key, values in columns.items()})
+    return full_path
+
+
+def load_predictions(file_name):
+    '''
+    load a file written by export_predictions
+    :param file_name: csv or npz file
+    :return: DataFrame, without the rows of unknown date
+    '''
+    if file_name.endswith(".npz"):
+        with np.load(file_name) as data:
+            table = pd.DataFrame({key: data[key] for key in data.files})
+    else:
+        table = pd.read_csv(file_name, parse_dates=["date"])
+    if "ticker" not in table:
+        # files exported before the ticker column: <company>_<model>_<return_type>
+        table["ticker"] = os.path.basename(file_name).split("_")[0]
+    return table.dropna(subset=["date"])
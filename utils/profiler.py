@@ -0,0 +1,115 @@
+import os
+from collections import defaultdict
+
+import pandas as pd
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+OP_TABLE_FILE = "op_costs.csv"
+SCOPE_TABLE_FILE = "scope_costs.csv"
+TRACE_FILE = "timeline_{}.json"
+
+
+class ProfilerHook(tf.train.SessionRunHook):
+    """Capture a full trace of a session.run every every_n_steps steps.
+    Every trace is written as a Chrome trace (open it in chrome://tracing) and its per-op cost is
+    aggregated over all the traced steps; at the end of the session a per-op and a per-scope table are written."""
+
+    def __init__(self, output_dir, every_n_steps=100, first_step=10):
+        '''
+        :param output_dir: directory of the traces and of the tables
+        :param every_n_steps: trace a step every this many steps
+        :param first_step: first step traced, the first steps are slower because of the input queues filling
+        '''
+        self.output_dir = output_dir
+        self.every_n_steps = every_n_steps
+        self.first_step = first_step
+        self._steps = 0
+        self._traced_steps = 0
+        self._ops = defaultdict(lambda: {"calls": 0, "cpu_micros": 0, "bytes": 0})
+
+    def begin(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._graph = tf.get_default_graph()
+
+    def before_run(self, run_context):
+        self._trace = self._steps >= self.first_step and (self._steps - self.first_step) % self.every_n_steps == 0
+        if self._trace:
+            return tf.train.SessionRunArgs(None,
+                                           options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE))
+        return None
+
+    def after_run(self, run_context, run_values):
+        if self._trace:
+            step_stats = run_values.run_metadata.step_stats
+            trace = timeline.Timeline(step_stats, graph=self._graph)
+            with open(os.path.join(self.output_dir, TRACE_FILE.format(self._steps)), "w") as f:
+                f.write(trace.generate_chrome_trace_format(show_memory=True))
+            self._aggregate(step_stats)
+            self._traced_steps += 1
+        self._steps += 1
+
+    def end(self, session):
+        if self._traced_steps == 0:
+            tf.logging.warning("no step traced, run at least {} steps".format(self.first_step + 1))
+            return
+        op_table = self.op_table()
+        op_table.to_csv(os.path.join(self.output_dir, OP_TABLE_FILE), index=False)
+        scope_table(op_table).to_csv(os.path.join(self.output_dir, SCOPE_TABLE_FILE), index=False)
+        tf.logging.info("Wrote {} traces and the cost tables to {}".format(self._traced_steps, self.output_dir))
+
+    def _aggregate(self, step_stats):
+        for device_stats in step_stats.dev_stats:
+            for node_stats in device_stats.node_stats:
+                op = self._ops[(node_stats.node_name, device_stats.device)]
+                op["calls"] += 1
+                op["cpu_micros"] += node_stats.op_end_rel_micros - node_stats.op_start_rel_micros
+                op["bytes"] += sum(memory.total_bytes for memory in node_stats.memory)
+
+    def op_table(self):
+        '''
+        :return: DataFrame with the cost of every op averaged over the traced steps, sorted by scope
+        '''
+        rows = []
+        for (name, device), cost in self._ops.items():
+            scope, _, _ = name.rpartition("/")
+            rows.append({"scope": scope,
+                         "name": name,
+                         "op_type": self._op_type(name),
+                         "device": device,
+                         "calls": cost["calls"],
+                         "cpu_micros": cost["cpu_micros"] / self._traced_steps,
+                         "bytes": cost["bytes"] / self._traced_steps})
+        return pd.DataFrame(rows, columns=["scope", "name", "op_type", "device", "calls", "cpu_micros", "bytes"])\
+            .sort_values(["scope", "name"])
+
+    def _op_type(self, name):
+        try:
+            return self._graph.get_operation_by_name(name).type
+        except (KeyError, ValueError):
+            # nodes added by the runtime (_SOURCE, _Send, _Recv, ...) are not in the graph
+            return ""
+
+
+def scope_table(op_table):
+    '''
+    cost of every variable scope, including the ops of its sub-scopes.
+    Every prefix of a scope gets a row, so e.g. rnn, rnn/gated_dense_0 and logits can be compared directly
+    :param op_table: DataFrame returned by ProfilerHook.op_table
+    :return: DataFrame with scope, depth, number of ops, cpu_micros and bytes per step, sorted by scope
+    '''
+    costs = defaultdict(lambda: {"ops": 0, "cpu_micros": 0., "bytes": 0.})
+    for row in op_table.itertuples():
+        parts = row.scope.split("/") if row.scope else []
+        for depth in range(len(parts) + 1):
+            cost = costs["/".join(parts[:depth])]
+            cost["ops"] += 1
+            cost["cpu_micros"] += row.cpu_micros
+            cost["bytes"] += row.bytes
+
+    rows = [{"scope": scope, "depth": scope.count("/") + 1 if scope else 0,
+             "ops": cost["ops"], "cpu_micros": cost["cpu_micros"], "bytes": cost["bytes"]}
+            for scope, cost in costs.items()]
+    table = pd.DataFrame(rows, columns=["scope", "depth", "ops", "cpu_micros", "bytes"]).sort_values("scope")
+    table["cpu_fraction"] = table["cpu_micros"] / table.loc[table["depth"] == 0, "cpu_micros"].sum()
+    return table
@@ -0,0 +1,129 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+Request = collections.namedtuple(
+    "Request",
+    [
+        "features",         # array [windows, sequence_length, input_size]
+        "length",           # array [windows]
+        "ticker",           # array [windows]
+        "future",
+        "arrival_time"
+    ])
+
+
+class LatencyStats(object):
+    """Latencies of the last window_size requests, thread safe."""
+
+    def __init__(self, window_size=10000):
+        self._latencies = collections.deque(maxlen=window_size)
+        self._batch_sizes = collections.deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self.num_requests = 0
+        self.num_batches = 0
+
+    def add_batch(self, latencies, batch_size):
+        with self._lock:
+            self._latencies.extend(latencies)
+            self._batch_sizes.append(batch_size)
+            self.num_requests += len(latencies)
+            self.num_batches += 1
+
+    def summary(self):
+        '''
+        :return: dictionary with the counters and the p50/p99 latency in milliseconds
+        '''
+        with self._lock:
+            latencies = np.array(self._latencies)
+            batch_sizes = np.array(self._batch_sizes)
+            summary = {"requests": self.num_requests,
+                       "batches": self.num_batches}
+        if len(latencies):
+            summary.update({"p50_ms": float(np.percentile(latencies, 50) * 1000.),
+                            "p99_ms": float(np.percentile(latencies, 99) * 1000.),
+                            "mean_batch_size": float(batch_sizes.mean())})
+        return summary
+
+
+class MicroBatcher(object):
+    """Coalesce the concurrent requests in micro-batches.
+    A batch is run as soon as it has max_batch_size windows or its oldest request waited max_latency_ms,
+    so under low load a request is never delayed more than max_latency_ms."""
+
+    def __init__(self, predict_fn, max_batch_size=256, max_latency_ms=5.):
+        '''
+        :param predict_fn: function(features, length, ticker) -> array of predictions, e.g. FrozenPredictor.predict
+        :param max_batch_size: max windows in a batch
+        :param max_latency_ms: max time a request waits for other requests
+        '''
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.
+        self.stats = LatencyStats()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro_batcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, features, length, ticker):
+        '''
+        queue a request
+        :return: Future with the predictions of the windows of the request
+        '''
+        future = Future()
+        self._queue.put(Request(features=features, length=length, ticker=ticker,
+                                future=future, arrival_time=time.time()))
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _next_batch(self):
+        try:
+            requests = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        num_windows = len(requests[0].features)
+        deadline = requests[0].arrival_time + self.max_latency
+        while num_windows < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            requests.append(request)
+            num_windows += len(request.features)
+        return requests
+
+    def _run(self):
+        while not self._stop.is_set():
+            requests = self._next_batch()
+            if not requests:
+                continue
+            try:
+                predictions = self.predict_fn(np.concatenate([request.features for request in requests]),
+                                              np.concatenate([request.length for request in requests]),
+                                              np.concatenate([request.ticker for request in requests]))
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+
+            end_time = time.time()
+            idx = 0
+            for request in requests:
+                request.future.set_result(predictions[idx:idx + len(request.features)])
+                idx += len(request.features)
+            self.stats.add_batch([end_time - request.arrival_time for request in requests], idx)
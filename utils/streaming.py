@@ -0,0 +1,124 @@
+import numpy as np
+import tensorflow as tf
+
+import model_helper as model
+from models import registry
+
+
+class StreamingPredictor(object):
+    """Stateful inference of the recurrent models: the rnn state of every ticker is kept between the calls
+    and advanced by one time_stamp per new observation, instead of re-feeding the whole window every day."""
+
+    def __init__(self, hparams, checkpoint_path, intra_op_threads=0, inter_op_threads=0):
+        self.hparams = hparams
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            self.inputs, self.outputs = model.create_streaming_graph(hparams, registry.get_model(hparams.model_type))
+            saver = tf.train.Saver()
+        config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                                inter_op_parallelism_threads=inter_op_threads)
+        self.session = tf.Session(graph=self.graph, config=config)
+        saver.restore(self.session, checkpoint_path)
+        self.states = {}            # ticker id -> rnn state
+
+    def zero_state(self, num_tickers=1):
+        return np.zeros([num_tickers, self.hparams.h_layer_size[-1]], dtype=np.float32)
+
+    def reset(self, tickers=None):
+        '''
+        forget the state of the given tickers, of all the tickers if None
+        '''
+        if tickers is None:
+            self.states = {}
+        else:
+            for ticker in tickers:
+                self.states.pop(ticker, None)
+
+    def step(self, states, observations, tickers):
+        '''
+        advance the given states by one time_stamp, without touching the stored ones
+        :param states: array [examples, state_size]
+        :param observations: array [examples, input_size] with the new time_stamp, features in feature_keys order
+        :param tickers: ticker id of every example
+        :return: predictions, new states
+        '''
+        feed_dict = {self.inputs['features']: np.asarray(observations, dtype=np.float32)[:, np.newaxis, :],
+                     self.inputs['initial_state']: states,
+                     self.inputs['ticker']: np.asarray(tickers, dtype=np.int64)}
+        return self.session.run([self.outputs['predictions'], self.outputs['state']], feed_dict=feed_dict)
+
+    def update(self, tickers, observations):
+        '''
+        advance the stored state of the tickers by one time_stamp, vectorized over the tickers
+        :param tickers: list of ticker ids, each at most once
+        :param observations: array [tickers, input_size] with the new time_stamp
+        :return: predictions after the new observation, one per ticker
+        '''
+        states = np.stack([self.states[ticker] if ticker in self.states else self.zero_state()[0]
+                           for ticker in tickers])
+        predictions, new_states = self.step(states, observations, tickers)
+        for ticker, state in zip(tickers, new_states):
+            self.states[ticker] = state
+        return predictions
+
+    def run_windows(self, windows, tickers):
+        '''
+        stream whole windows starting from a zero state, the result has to match the windowed inference
+        :param windows: array [examples, sequence_length, input_size]
+        :param tickers: ticker id of every window
+        :return: predictions after the last time_stamp of the windows
+        '''
+        states = self.zero_state(len(windows))
+        for t in range(windows.shape[1]):
+            predictions, states = self.step(states, windows[:, t, :], tickers)
+        return predictions
+
+    def close(self):
+        self.session.close()
+
+
+class WindowedPredictor(object):
+    """Full-window inference graph, the reference of the streaming inference."""
+
+    def __init__(self, hparams, checkpoint_path):
+        self.hparams = hparams
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            self.inputs, self.outputs = model.create_inference_graph(hparams, registry.get_model(hparams.model_type))
+            saver = tf.train.Saver()
+        self.session = tf.Session(graph=self.graph)
+        saver.restore(self.session, checkpoint_path)
+
+    def predict(self, windows, tickers, length=None):
+        '''
+        :param windows: array [examples, sequence_length, input_size]
+        :param tickers: ticker id of every window
+        :param length: valid time_stamps of every window, default to the full window
+        :return: predictions
+        '''
+        if length is None:
+            length = np.full(len(windows), self.hparams.sequence_length, dtype=np.int64)
+        return self.session.run(self.outputs['predictions'], feed_dict={self.inputs['features']: windows,
+                                                                        self.inputs['length']: length,
+                                                                        self.inputs['ticker']: tickers})
+
+    def close(self):
+        self.session.close()
+
+
+def consistency_check(predictor, reference, features, tickers, batch_size=256):
+    '''
+    stream every window from a zero state and compare the result with the windowed inference
+    :param predictor: StreamingPredictor
+    :param reference: windowed predictions of the same windows
+    :param features: windows [examples, sequence_length, input_size], all of full length
+    :param tickers: ticker id of every window
+    :param batch_size: windows streamed together
+    :return: max absolute difference
+    '''
+    max_diff = 0.
+    for start in range(0, len(features), batch_size):
+        end = start + batch_size
+        streamed = predictor.run_windows(features[start:end], tickers[start:end])
+        max_diff = max(max_diff, float(np.max(np.abs(streamed - reference[start:end]))))
+    return max_diff
@@ -1,9 +1,61 @@
 import tensorflow as tf
 from tensorflow.python.ops import nn
 
+# verbosity of the summaries: "off" -> nothing, "scalars" -> only the cheap scalar summaries,
+# "full" -> also per-timestep activations, histograms and images
+SUMMARY_LEVELS = {"off": 0,
+                  "scalars": 1,
+                  "full": 2}
+
+_summary_level = SUMMARY_LEVELS["full"]
+
+
+def set_summary_level(level):
+    '''
+    set the verbosity of all the summaries created trough this module
+    :param level: one of the SUMMARY_LEVELS keys
+    '''
+    global _summary_level
+    if level not in SUMMARY_LEVELS:
+        raise ValueError("Wrong summary level {}".format(level))
+    _summary_level = SUMMARY_LEVELS[level]
+
+def is_enabled(level):
+    '''
+    check if the summaries of the given level have to be created
+    :param level: one of the SUMMARY_LEVELS keys
+    '''
+    return _summary_level >= SUMMARY_LEVELS[level]
+
+def optimizer_summaries():
+    '''
+    summaries to request to tf.contrib.layers.optimize_loss according to the current level
+    '''
+    if is_enabled("full"):
+        return ["loss", "learning_rate", "gradient_norm", "gradients"]
+    elif is_enabled("scalars"):
+        return ["loss", "learning_rate", "gradient_norm"]
+    else:
+        return []
+
+def scalar(name, tensor):
+    if is_enabled("scalars"):
+        return tf.summary.scalar(name, tensor)
+
+def histogram(name, values):
+    if is_enabled("full"):
+        return tf.summary.histogram(name, values)
+
+def image(name, tensor, max_outputs=3):
+    if is_enabled("full"):
+        return tf.summary.image(name, tensor, max_outputs=max_outputs)
 
 
 def add_kernel_summary(kernel, tag):
+    # one norm per filter plus the images are expensive, create them only at full verbosity
+    if not is_enabled("full"):
+        return
+
     # visualization
     # scale weights to [0 1], type is still float
     x_min = tf.reduce_min(kernel)
@@ -15,10 +67,10 @@ def add_kernel_summary(kernel, tag):
 
     for row_idx, in_channel in enumerate(tf.unstack(W_transposed, axis=3)):
         for col_idx, filter in enumerate(tf.unstack(in_channel, axis=0)):
-            tf.summary.scalar("{}_filters_in-channel-{}_out-channel-{}_norm".format(tag, row_idx, col_idx), tf.norm(filter))
+            scalar("{}_filters_in-channel-{}_out-channel-{}_norm".format(tag, row_idx, col_idx), tf.norm(filter))
 
         in_channel_norm = (in_channel - x_min) / (x_max - x_min)
-        tf.summary.image(tag + '_filters_row_{}'.format(row_idx), tf.expand_dims(in_channel_norm, -1), max_outputs=col_idx+1)
+        image(tag + '_filters_row_{}'.format(row_idx), tf.expand_dims(in_channel_norm, -1), max_outputs=col_idx+1)
 
 def add_hidden_layers_summary(tensors, name, weight=None):
     '''
@@ -32,7 +84,7 @@ def add_hidden_layers_summary(tensors, name, weight=None):
     return [add_hidden_layer_summary(activation=tensor, name=name+"_{}".format(i)) for i, tensor in enumerate(tensors)]
 
 def _norm_summary(weight, name):
-    tf.summary.scalar("%s_weight_norm" % name, tf.norm(weight))
+    scalar("%s_weight_norm" % name, tf.norm(weight))
 
 def add_hidden_layer_summary(activation, name, weight=None):
     '''
@@ -43,7 +95,8 @@ def add_hidden_layer_summary(activation, name, weight=None):
     :param name: name of the tensor
     :return: zero_fraction, histogram, norm
     '''
-    tf.summary.scalar("%s_fraction_of_zero_values" % name, nn.zero_fraction(activation))
-    tf.summary.histogram("%s_activation" % name, activation)
+    if is_enabled("full"):
+        scalar("%s_fraction_of_zero_values" % name, nn.zero_fraction(activation))
+        histogram("%s_activation" % name, activation)
     if weight is not None:
-        _norm_summary(weight=weight, name=name)
\ No newline at end of file
+        _norm_summary(weight=weight, name=name)
@@ -0,0 +1,76 @@
+import math
+
+
+class SuccessiveHalving(object):
+    """Asynchronous successive halving (ASHA) scheduler.
+    The budget of a trial grows by reduction_factor at every rung, from min_steps up to max_steps.
+    When a worker is free the scheduler promotes to the next rung a trial in the top 1/reduction_factor
+    of the trials evaluated in its rung, otherwise it starts a new trial from the first rung.
+    Promoted trials resume from their last checkpoint, so the budgets are total training steps."""
+
+    def __init__(self, num_trials, min_steps, max_steps, reduction_factor=3, minimize=True):
+        if min_steps <= 0 or max_steps < min_steps:
+            raise ValueError("Wrong budget: min_steps {} max_steps {}".format(min_steps, max_steps))
+        if reduction_factor < 2:
+            raise ValueError("reduction_factor has to be at least 2")
+
+        self.num_trials = num_trials
+        self.reduction_factor = reduction_factor
+        self.minimize = minimize
+
+        self.rung_steps = []
+        steps = min_steps
+        while steps < max_steps:
+            self.rung_steps.append(steps)
+            steps *= reduction_factor
+        self.rung_steps.append(max_steps)
+
+        self._results = [{} for _ in self.rung_steps]      # trial_id -> metric, for every rung
+        self._promoted = [set() for _ in self.rung_steps]
+        self._next_trial = 0
+
+    def next_job(self):
+        '''
+        choose the next job to run
+        :return: (trial_id, rung) or None if nothing can be scheduled until a running job reports
+        '''
+        # promote from the highest rung first, so good trials reach the full budget as soon as possible
+        for rung in reversed(range(len(self.rung_steps) - 1)):
+            for trial_id in self._top_k(rung):
+                if trial_id not in self._promoted[rung]:
+                    self._promoted[rung].add(trial_id)
+                    return trial_id, rung + 1
+
+        if self._next_trial < self.num_trials:
+            trial_id = self._next_trial
+            self._next_trial += 1
+            return trial_id, 0
+        return None
+
+    def report(self, trial_id, rung, value):
+        '''
+        record the validation metric of a trial at the end of a rung
+        :param trial_id: id of the trial
+        :param rung: rung the trial was trained for
+        :param value: validation metric. None or NaN for failed trials, that are never promoted
+        '''
+        if value is None or math.isnan(value):
+            value = float("inf") if self.minimize else float("-inf")
+        self._results[rung][trial_id] = value
+
+    def best(self):
+        '''
+        :return: (trial_id, rung, value) of the best trial of the highest rung reached
+        '''
+        for rung in reversed(range(len(self.rung_steps))):
+            top = self._top_k(rung, k=1)
+            if top:
+                return top[0], rung, self._results[rung][top[0]]
+        return None
+
+    def _top_k(self, rung, k=None):
+        results = self._results[rung]
+        if k is None:
+            k = len(results) // self.reduction_factor
+        ordered = sorted(results, key=lambda trial_id: results[trial_id], reverse=not self.minimize)
+        return [trial_id for trial_id in ordered[:k] if not math.isinf(results[trial_id])]
@@ -0,0 +1,196 @@
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from collections import namedtuple
+
+import pandas as pd
+import tensorflow as tf
+
+import data_set_helper as data_set
+import model_helper as model
+import model_train
+import net_hparams
+import sweep
+from models import registry
+from utils import checkpoints
+from utils.eval_metric import create_evaluation_metrics
+
+tf.flags.DEFINE_string("folds_dir", './data/walk_forward', "Directory of the folds exported by dataset_extraction.run_walk_forward")
+tf.flags.DEFINE_string("warm_start", "previous", "Fold k starts from fold k-1 (previous, sequential) or from fold 0 (base, folds in parallel)")
+tf.flags.DEFINE_integer("fine_tune_steps", 2000, "Training steps of every warm-started fold")
+tf.flags.DEFINE_string("init_model_dir", None, "Trained model fold 0 starts from. Fold 0 is trained for train_steps from scratch if not given")
+tf.flags.DEFINE_string("run_dir", None, "Directory of the fold models. Defaults to a new directory in ./debug")
+FLAGS = tf.flags.FLAGS
+
+RUN_DIR = os.path.abspath("./debug/walk_forward_{}")
+SUMMARY_FILE = "summary.csv"
+FOLDS_FILE = "folds.json"           # written by dataset_extraction.run_walk_forward
+WARM_START_MODES = ("previous", "base")
+
+Fold = namedtuple(
+    "Fold",
+    [
+        "fold",
+        "input_dir",        # root of the fold datasets, as input_dir of model_train.train
+        "model_dir",
+        "test_start",
+        "test_end"
+    ])
+
+
+def load_folds(folds_dir, run_dir):
+    '''
+    :return: list of Fold sorted by test period
+    '''
+    with open(os.path.join(folds_dir, FOLDS_FILE)) as f:
+        folds = json.load(f)
+    return [Fold(fold=fold["fold"],
+                 input_dir=os.path.join(folds_dir, "fold_{}".format(fold["fold"])),
+                 model_dir=os.path.join(run_dir, "fold_{}".format(fold["fold"])),
+                 test_start=fold["test_start"],
+                 test_end=fold["test_end"])
+            for fold in sorted(folds, key=lambda fold: fold["test_start"])]
+
+
+def evaluate_test(hparams, model_dir, input_dir, config):
+    '''
+    metrics of the fold model on its out-of-sample test period
+    '''
+    estimator = tf.contrib.learn.Estimator(
+        model_fn=model.create_model_fn(hparams, model_impl=registry.get_model(hparams.model_type)),
+        model_dir=model_dir,
+        config=config)
+    input_fn_test = data_set.create_input_fn(
+        mode=tf.contrib.learn.ModeKeys.EVAL,
+        input_files=data_set.input_files(input_dir, model_train.COMPANY_NAME, "test", hparams,
+                                         model_train.OUTPUT_NAME_SUFFIX),
+        batch_size=hparams.eval_batch_size,
+        num_epochs=1,
+        h_params=hparams)
+    return estimator.evaluate(input_fn=input_fn_test, metrics=create_evaluation_metrics(hparams.e_type))
+
+
+def run_fold(fold, hparams, train_args, init_dir, steps):
+    '''
+    train the model of a fold, warm-started from the checkpoint of init_dir
+    :param fold: Fold to train
+    :param hparams: hiper-parameters shared by all the folds, the checkpoints have the same variables
+    :param train_args: sweep.TrainArgs
+    :param init_dir: model directory to warm-start from, None to train from scratch
+    :param steps: training steps of the fold
+    :return: a row of the summary table
+    '''
+    config = model.create_run_config(hparams,
+                                     save_checkpoints_secs=None if train_args.checkpoint_policy else FLAGS.checkpoint_every_secs,
+                                     intra_op_threads=train_args.intra_op_threads,
+                                     inter_op_threads=train_args.inter_op_threads)
+    row = {"fold": fold.fold, "model_dir": fold.model_dir, "init_dir": init_dir,
+           "test_start": fold.test_start, "test_end": fold.test_end}
+    start_time = time.time()
+    try:
+        start_step = checkpoints.warm_start(init_dir, fold.model_dir) if init_dir else checkpoints.global_step(fold.model_dir)
+        # the statistics of the fold train split, used by both the training and the test evaluation.
+        # The ones of a warm-start model are dropped, so every fold is normalized the same way with or without it
+        hparams = data_set.load_normalization(fold.input_dir, hparams._replace(feature_shift=None, feature_scale=None))
+        metrics = model_train.train(hparams, fold.model_dir,
+                                    input_dir=fold.input_dir,
+                                    eval_every=train_args.eval_every,
+                                    num_epochs=train_args.num_epochs,
+                                    config=config,
+                                    max_steps=start_step + steps,
+                                    early_stopping_rounds=train_args.early_stopping_rounds,
+                                    early_stopping_metric=train_args.early_stopping_metric,
+                                    early_stopping_metric_minimize=train_args.early_stopping_metric_minimize,
+                                    checkpoint_policy=train_args.checkpoint_policy)
+        row.update({"valid_" + key: value.item() if hasattr(value, "item") else value for key, value in metrics.items()})
+        metrics = evaluate_test(hparams, fold.model_dir, fold.input_dir, config)
+        row.update({"test_" + key: value.item() if hasattr(value, "item") else value for key, value in metrics.items()})
+        row["start_step"] = start_step
+    except Exception:
+        row["error"] = traceback.format_exc()
+    row["train_secs"] = time.time() - start_time
+    return row
+
+def _run_fold(args):
+    return run_fold(*args)
+
+
+def run_walk_forward(folds, hparams, train_args, fine_tune_steps, warm_start, init_model_dir, max_workers):
+    '''
+    train the folds in order. The first fold starts from init_model_dir or from scratch,
+    in previous mode every other fold fine-tunes the model of the fold before it, one at a time;
+    in base mode they all fine-tune the first fold model, in a pool of max_workers processes
+    :param train_args: sweep.TrainArgs, the steps are used by a first fold trained from scratch
+    :param fine_tune_steps: training steps of the warm-started folds
+    :return: DataFrame with one row per fold
+    '''
+    if warm_start not in WARM_START_MODES:
+        raise ValueError("Wrong warm start {}. Available: {}".format(warm_start, WARM_START_MODES))
+
+    # every fold runs in a new process, as the sweep trials
+    pool = multiprocessing.Pool(processes=max_workers if warm_start == "base" else 1, maxtasksperchild=1)
+    rows = []
+    try:
+        first_steps = train_args.steps if init_model_dir is None else fine_tune_steps
+        rows.append(pool.apply(_run_fold, ((folds[0], hparams, train_args, init_model_dir, first_steps),)))
+        tf.logging.info("fold {} finished in {:.1f}s".format(folds[0].fold, rows[-1]["train_secs"]))
+        if "error" in rows[-1]:
+            tf.logging.error("fold {} failed, the following folds can not be warm-started".format(folds[0].fold))
+            folds = folds[:1]
+
+        if warm_start == "previous":
+            for previous, fold in zip(folds[:-1], folds[1:]):
+                rows.append(pool.apply(_run_fold, ((fold, hparams, train_args, previous.model_dir,
+                                                    fine_tune_steps),)))
+                tf.logging.info("fold {} finished in {:.1f}s".format(fold.fold, rows[-1]["train_secs"]))
+                if "error" in rows[-1]:
+                    tf.logging.error("fold {} failed, the following folds can not be warm-started".format(fold.fold))
+                    break
+        else:
+            jobs = [(fold, hparams, train_args, folds[0].model_dir, fine_tune_steps) for fold in folds[1:]]
+            for row in pool.imap_unordered(_run_fold, jobs):
+                tf.logging.info("fold {} finished in {:.1f}s".format(row["fold"], row["train_secs"]))
+                rows.append(row)
+    finally:
+        pool.close()
+        pool.join()
+    return pd.DataFrame(rows).sort_values("fold")
+
+
+def main(unused_argv):
+    tf.logging.set_verbosity(FLAGS.loglevel)
+    run_dir = FLAGS.run_dir or RUN_DIR.format(int(time.time()))
+    folds = load_folds(FLAGS.folds_dir, run_dir)
+
+    # a warm-started model keeps the hiper-parameters of its checkpoint
+    if FLAGS.init_model_dir:
+        hparams = net_hparams.load_hparams(FLAGS.init_model_dir)
+    else:
+        hparams = net_hparams.create_hparams()._replace(multi_task=FLAGS.multi_task,
+                                                        input_normalization=FLAGS.input_normalization,
+                                                        batch_norm=FLAGS.batch_norm)
+
+    max_workers = FLAGS.max_workers if FLAGS.warm_start == "base" else 1
+    train_args = sweep.TrainArgs(input_dir=FLAGS.folds_dir,
+                                 steps=FLAGS.train_steps,
+                                 eval_every=FLAGS.eval_every,
+                                 num_epochs=FLAGS.num_epochs,
+                                 intra_op_threads=sweep.thread_budget(max_workers, FLAGS.intra_op_threads),
+                                 inter_op_threads=sweep.thread_budget(max_workers, FLAGS.inter_op_threads),
+                                 early_stopping_rounds=FLAGS.early_stopping_rounds or None,
+                                 early_stopping_metric=FLAGS.sweep_metric,
+                                 early_stopping_metric_minimize=FLAGS.sweep_metric_minimize,
+                                 checkpoint_policy=model_train.create_checkpoint_policy())
+
+    summary = run_walk_forward(folds, hparams, train_args, FLAGS.fine_tune_steps, FLAGS.warm_start,
+                               FLAGS.init_model_dir, max_workers)
+    full_path = os.path.join(run_dir, SUMMARY_FILE)
+    summary.to_csv(full_path, index=False)
+    print(summary.to_string(index=False))
+    print("Wrote to {}".format(full_path))
+
+
+if __name__ == "__main__":
+    tf.app.run()